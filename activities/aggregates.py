@@ -0,0 +1,14 @@
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_per(queryset, lookup):
+    """
+    The number of rows of ``queryset`` whose ``lookup`` is the outer row, as
+    a correlated subquery for ``annotate()`` or ``update()``; 0 for none.
+    """
+    return Coalesce(Subquery(
+        queryset.filter(**{lookup: OuterRef('pk')}).order_by().values(lookup)
+        .annotate(total=Count('*')).values('total'),
+        output_field=IntegerField(),
+    ), 0)
@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class ActivitiesConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'activities'
+
+    def ready(self):
+        from . import checks, signals
+
+        post_migrate.connect(signals.ensure_room_fts, sender=self)
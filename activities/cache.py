@@ -0,0 +1,86 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+KEY_PREFIX = 'activities'
+DEFAULT_TIMEOUT = getattr(settings, 'ACTIVITIES_CACHE_TIMEOUT', 300)
+# Previous values are kept this many times longer than fresh ones
+STALE_FACTOR = 10
+# How long one process may hold the right to recompute a key
+LOCK_TIMEOUT = 10
+# How long a reader with nothing to serve waits for that process
+LOCK_WAIT = 2.0
+
+_MISSING = object()
+
+
+def _version_key(namespace):
+    return f'{KEY_PREFIX}:{namespace}:version'
+
+
+def get_version(namespace):
+    version = cache.get(_version_key(namespace))
+    if version is None:
+        # Seed from the clock so a cache flush never resurrects old keys
+        cache.add(_version_key(namespace), time.time_ns(), None)
+        version = cache.get(_version_key(namespace))
+    return version
+
+
+def bump_version(namespace):
+    """Invalidate every key built on ``namespace``; the old entries simply expire."""
+    try:
+        cache.incr(_version_key(namespace))
+    except ValueError:
+        cache.add(_version_key(namespace), time.time_ns(), None)
+
+
+def _digest(parts):
+    return hashlib.md5(repr(parts).encode()).hexdigest() if parts else 'all'
+
+
+def make_key(name, namespaces, *parts):
+    versions = '.'.join(str(get_version(namespace)) for namespace in namespaces)
+    return f'{KEY_PREFIX}:{name}:{versions}:{_digest(parts)}'
+
+
+def get_or_compute(name, namespaces, compute, *parts, timeout=DEFAULT_TIMEOUT):
+    """
+    Return the cached value for ``name``/``parts`` at the current versions of
+    ``namespaces``, computing it on a miss.
+
+    After an invalidation only one caller recomputes: it takes a short lock
+    while everyone else keeps serving the previous value (kept under a
+    version-less key). Callers with no previous value wait briefly for the
+    winner before giving up and computing it themselves.
+    """
+    key = make_key(name, namespaces, *parts)
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    stale_key = f'{KEY_PREFIX}:{name}:stale:{_digest(parts)}'
+    lock_key = f'{key}:lock'
+    if cache.add(lock_key, 1, LOCK_TIMEOUT):
+        try:
+            value = compute()
+            cache.set(key, value, timeout)
+            # Outlive the fresh entry so there is always something to serve
+            cache.set(stale_key, value, timeout and timeout * STALE_FACTOR)
+        finally:
+            cache.delete(lock_key)
+        return value
+
+    value = cache.get(stale_key, _MISSING)
+    if value is not _MISSING:
+        return value
+
+    deadline = time.monotonic() + LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+    return compute()
@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Warning, register
+
+
+@register()
+def like_buffer_cache(app_configs, **kwargs):
+    """Write-behind likes live only in the cache, which must outlast the process and not cull them."""
+    if not getattr(settings, 'ACTIVITIES_LIKE_WRITE_BEHIND', False) or not isinstance(caches['default'], LocMemCache):
+        return []
+    return [Warning(
+        'ACTIVITIES_LIKE_WRITE_BEHIND is enabled with LocMemCache.',
+        hint=(
+            'Each process buffers its toggles in its own memory, where flush_like_buffer and the other '
+            'workers never see them, and entries past MAX_ENTRIES are culled. Buffered likes will be lost '
+            'with more than one process: use a shared cache (Redis, Memcached, database cache).'
+        ),
+        id='activities.W001',
+    )]
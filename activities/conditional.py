@@ -0,0 +1,91 @@
+"""
+Conditional GET for the feed pages.
+
+A page's validator is built from inputs that cost O(1) to read, however big
+the tables get: the versions of the cache namespaces (see activities.cache)
+that activities.signals and the like toggles bump whenever something a page
+shows changes, and for a room page the room row's denormalized ``updated``,
+``last_message_id``, ``message_count``, ``participant_count`` and
+``like_count``, read by primary key. They are hashed with the user and the
+static manifest. A client whose ``If-None-Match`` matches gets a ``304``
+before the view runs any of its feed queries or renders a template.
+
+Namespaces live in the cache, so with several processes the cache must be
+shared, as it already must be for the sidebar fragments.
+"""
+import hashlib
+from functools import wraps
+
+from django.contrib.messages import get_messages
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+from .cache import get_version
+from .models import Room
+
+# Room names and descriptions, bumped on every Room save and delete
+ROOMS = 'rooms'
+# What room cards show besides the room's own fields: counts, likes, joins
+FEED = 'feed'
+TRENDING = 'trending'
+RELATED = 'related'
+ROOM_FIELDS = ('updated', 'last_message_id', 'message_count', 'participant_count', 'like_count')
+
+
+def room_namespace(pk):
+    """Bumped for what a room page shows beyond its row: message likes and participants."""
+    return f'room:{pk}'
+
+
+def home_scope():
+    return [ROOMS, FEED, TRENDING, 'topics', 'activity'], None
+
+
+def room_scope(pk):
+    # Related rooms are shown by name, hence every room's ROOMS version
+    return [ROOMS, RELATED, 'topics', room_namespace(pk)], Room.objects.filter(pk=pk).values_list(*ROOM_FIELDS)
+
+
+def activities_scope():
+    # Room and topic names are covered: their changes bump 'activity' too
+    return ['activity'], None
+
+
+def page_etag(request, scope):
+    """Weak ETag for ``request`` from the namespaces and the optional row of ``scope``."""
+    namespaces, row = scope
+    parts = (
+        [get_version(namespace) for namespace in namespaces],
+        row.first() if row is not None else None,
+        request.user.pk, request.user.get_username(),
+        # New static file names mean new HTML
+        getattr(staticfiles_storage, 'manifest_hash', ''),
+    )
+    return 'W/"%s"' % hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def conditional_page(scope):
+    """
+    Answer ``GET``/``HEAD`` with ``304 Not Modified`` when nothing the page
+    shows has changed. ``scope`` receives the view's URL kwargs and returns
+    ``(namespaces, row queryset or None)``.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            # Pending flash messages are only shown by a fresh render
+            if request.method not in ('GET', 'HEAD') or len(get_messages(request)):
+                return view(request, *args, **kwargs)
+
+            etag = page_etag(request, scope(*args, **kwargs))
+            response = get_conditional_response(request, etag=etag)
+            if response is None:
+                response = view(request, *args, **kwargs)
+                if response.status_code != 200:
+                    return response
+            response['ETag'] = etag
+            # Per-user HTML: browsers may keep it, but must ask before reusing it
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
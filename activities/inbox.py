@@ -0,0 +1,128 @@
+"""
+Per-user activity inboxes, fanned out on write.
+
+Posting a message copies a pointer to it into the inbox of everyone following
+the room (host, participants and likers, not the author), ``FANOUT_BATCH`` rows per
+insert. A user's feed is then one range scan of the (user, created, message)
+index, newest first, instead of a join of participants, likes and messages on
+every read. Inboxes keep their newest ``ACTIVITIES_INBOX_CAP`` entries:
+``trim_inboxes`` drops the rest, from ``python manage.py trim_inboxes --loop
+SECONDS``, so posting never pays for it.
+
+Rooms followed by more than ``ACTIVITIES_INBOX_PULL_THRESHOLD`` people (going
+by ``participant_count + like_count``) would write that many rows per message.
+Their messages are not fanned out: ``read_inbox`` pulls them from the room's
+(room, created, id) index at read time and merges them in. New followers only
+see messages posted after they joined, unless the room is a pull room.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, F, Q
+
+from .models import InboxEntry, Message, Room, RoomLike
+from .pagination import CursorPage, after_cursor, encode_cursor
+
+FANOUT_BATCH = 500
+
+
+def inbox_cap():
+    return getattr(settings, 'ACTIVITIES_INBOX_CAP', 500)
+
+
+def pull_threshold():
+    return getattr(settings, 'ACTIVITIES_INBOX_PULL_THRESHOLD', 1000)
+
+
+def pull_rooms():
+    """Rooms too big to fan out."""
+    return Room.objects.alias(followers=F('participant_count') + F('like_count')).filter(followers__gt=pull_threshold())
+
+
+def followers(room_id):
+    participants = Room.participants.through.objects.filter(room_id=room_id).values_list('user_id')
+    likers = RoomLike.objects.filter(room_id=room_id).values_list('user_id')
+    host = Room.objects.filter(pk=room_id, host__isnull=False).order_by().values_list('host_id')
+    return {user_id for user_id, in participants.union(likers, host)}
+
+
+def fan_out(message):
+    """Write ``message`` to the inboxes of its room's followers. Returns the number of entries."""
+    if pull_rooms().filter(pk=message.room_id).exists():
+        return 0
+    recipients = followers(message.room_id) - {message.user_id}
+    InboxEntry.objects.bulk_create(
+        (InboxEntry(user_id=user_id, message_id=message.pk, created=message.created) for user_id in recipients),
+        batch_size=FANOUT_BATCH, ignore_conflicts=True,
+    )
+    return len(recipients)
+
+
+def read_inbox(user, cursor=None, per_page=10):
+    """One page of messages for ``user``, newest first: their inbox merged with the pull rooms they follow."""
+    entries = (
+        InboxEntry.objects.filter(user=user)
+        .select_related('message__user', 'message__room__topic')
+        .order_by('-created', '-message_id')
+    )
+    if cursor:
+        entries = entries.filter(after_cursor(cursor, 'created', 'message_id'))
+    messages = {entry.message_id: entry.message for entry in entries[:per_page + 1]}
+
+    followed = (
+        Q(host=user)
+        | Q(pk__in=Room.participants.through.objects.filter(user=user).values('room'))
+        | Q(pk__in=RoomLike.objects.filter(user=user).values('room'))
+    )
+    rooms = list(pull_rooms().filter(followed).values_list('id', flat=True))
+    if rooms:
+        pulled = Message.objects.for_activity().filter(room_id__in=rooms).exclude(user=user).order_by('-created', '-id')
+        if cursor:
+            pulled = pulled.filter(after_cursor(cursor))
+        # A room that became a pull room may also have older entries in the inbox
+        for message in pulled[:per_page + 1]:
+            messages.setdefault(message.id, message)
+
+    rows = sorted(messages.values(), key=lambda message: (message.created, message.id), reverse=True)[:per_page + 1]
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        next_cursor = encode_cursor(rows[-1].created, rows[-1].id)
+    return CursorPage(rows, next_cursor)
+
+
+def trim_inboxes(cap=None):
+    """Cut every inbox down to its newest ``cap`` entries. Returns the number of entries deleted."""
+    cap = inbox_cap() if cap is None else cap
+    over = list(
+        InboxEntry.objects.order_by().values('user').annotate(total=Count('*'))
+        .filter(total__gt=cap).values_list('user', flat=True)
+    )
+    deleted = 0
+    for user_id in over:
+        inbox = InboxEntry.objects.filter(user_id=user_id)
+        # The newest entry past the cap, and everything older
+        created, message_id = inbox.order_by('-created', '-message_id').values_list('created', 'message_id')[cap]
+        deleted += inbox.filter(Q(created__lt=created) | Q(created=created, message_id__lte=message_id)).delete()[0]
+    return deleted
+
+
+def build_inboxes(cap=None):
+    """Refill every inbox from the messages of the rooms each user follows, then trim. Returns the entries kept."""
+    qn = connection.ops.quote_name
+    inbox, message, room = (qn(model._meta.db_table) for model in (InboxEntry, Message, Room))
+    participants, likes = qn(Room.participants.through._meta.db_table), qn(RoomLike._meta.db_table)
+    with transaction.atomic():
+        InboxEntry.objects.all().delete()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {inbox} (user_id, message_id, created) '
+                f'SELECT f.user_id, m.id, m.created FROM {message} m '
+                f'JOIN (SELECT room_id, user_id FROM {participants} UNION SELECT room_id, user_id FROM {likes} '
+                f'UNION SELECT id, host_id FROM {room} WHERE host_id IS NOT NULL) f '
+                f'ON f.room_id = m.room_id '
+                f'JOIN {room} r ON r.id = m.room_id '
+                f'WHERE f.user_id <> m.user_id AND r.participant_count + r.like_count <= %s',
+                [pull_threshold()],
+            )
+        trim_inboxes(cap)
+    return InboxEntry.objects.count()
@@ -0,0 +1,218 @@
+"""
+Write-behind buffer for like toggles (``ACTIVITIES_LIKE_WRITE_BEHIND``).
+
+A toggle only reads: it counts the click in the cache with an atomic
+``incr`` and answers optimistically, from a row and a counter read between
+two flushes. ``flush()`` later flips every (user,
+target) pair clicked an odd number of times since the previous flush with one
+bulk insert and a few bulk deletes, subtracts the clicks it applied, then
+recounts the touched targets, so a storm of clicks costs one short write
+transaction instead of one per click. The cache is only ever written with
+``add``, ``incr`` and ``decr``, so concurrent toggles of the same pair never
+overwrite each other.
+
+The dirty pairs are found through a sequence counter: each toggle takes the
+next number and stores its pair under a slot key for that number, and a flush
+walks the slots from the last flushed number up. For several processes the
+cache must be shared (Redis, Memcached, database cache); flushes run from a
+timer in the process that buffered the toggle and from ``manage.py
+flush_like_buffer``. Buffered toggles live only in the cache, so an eviction
+or a cache flush before the next flush loses them. ``LocMemCache`` is private
+to each process and culls entries past ``MAX_ENTRIES``: ``activities.checks``
+warns when write-behind is enabled with it.
+"""
+import threading
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.dispatch import Signal
+
+from .aggregates import count_per
+from .cache import KEY_PREFIX
+from .models import Message, MessageLike, Room, RoomLike
+from .realtime import publish_room_event
+
+KINDS = {
+    'room': (RoomLike, Room, 'room'),
+    'message': (MessageLike, Message, 'message'),
+}
+# How long one process may hold the right to flush
+LOCK_TIMEOUT = 60
+# Pairs per DELETE, well below SQLite's expression depth limit
+DELETE_BATCH = 200
+# Idle click counters expire after this long; flushes run every few seconds
+PENDING_TIMEOUT = 24 * 60 * 60
+# Reads of a toggle retried while flushes write, before answering anyway
+SNAPSHOT_TRIES = 3
+
+# Sent inside a flush's transaction with the users whose likes of
+# ``target_ids`` were written, since bulk writes send no model signals
+likes_flushed = Signal()
+
+
+def enabled():
+    return getattr(settings, 'ACTIVITIES_LIKE_WRITE_BEHIND', False)
+
+
+def flush_interval():
+    return getattr(settings, 'ACTIVITIES_LIKE_FLUSH_INTERVAL', 2)
+
+
+def _key(*parts):
+    return ':'.join([KEY_PREFIX, 'likes', *map(str, parts)])
+
+
+def _incr(key, timeout=None):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout)
+        return cache.incr(key)
+
+
+def toggle(kind, user, pk):
+    """
+    Buffer ``user``'s toggle on the ``kind`` target ``pk`` and return the
+    optimistic ``(liked, like_count)``. Raises ``DoesNotExist`` for a missing
+    target. Other users' buffered toggles are not in the count yet.
+    """
+    like_model, target_model, field = KINDS[kind]
+    key = _key('pending', kind, user.pk, pk)
+    _incr(key, PENDING_TIMEOUT)
+    cache.touch(key, PENDING_TIMEOUT)
+    row = (
+        target_model.objects.filter(pk=pk)
+        .annotate(stored=Exists(like_model.objects.filter(user=user, **{field: OuterRef('pk')})))
+        .values_list('like_count', 'stored')
+    )
+    # Read the row and the clicks not flushed yet (an odd number flips the
+    # stored state) between two flushes, or a flush in between counts twice or
+    # not at all; flushes make the generation odd while they write
+    for _ in range(SNAPSHOT_TRIES):
+        generation = cache.get(_key('generation'), 0)
+        like_count, stored = row.first() or (None, None)
+        clicks = cache.get(key, 0)
+        if generation % 2 == 0 and cache.get(_key('generation'), 0) == generation:
+            break
+    if like_count is None:
+        cache.decr(key)
+        raise target_model.DoesNotExist
+    liked = stored != (clicks % 2 == 1)
+    seq = _incr(_key('seq'))
+    cache.add(_key('slot', seq), (kind, user.pk, pk), None)
+    schedule_flush()
+    return liked, like_count + liked - stored
+
+
+def schedule_flush():
+    interval = flush_interval()
+    if interval and cache.add(_key('flush-scheduled'), 1, interval):
+        timer = threading.Timer(interval, _flush_in_background)
+        timer.daemon = True
+        timer.start()
+
+
+def _flush_in_background():
+    try:
+        flush()
+    finally:
+        connection.close()
+
+
+def flush():
+    """
+    Apply the buffered toggles. Returns the number of (user, target) pairs
+    written, or ``None`` when another process is already flushing.
+    """
+    if not cache.add(_key('flush-lock'), 1, LOCK_TIMEOUT):
+        return None
+    generation = 0
+    try:
+        start, end = cache.get(_key('flushed'), 0), cache.get(_key('seq'), 0)
+        if end <= start:
+            return 0
+        slots = cache.get_many([_key('slot', seq) for seq in range(start + 1, end + 1)])
+        # A missing slot is normally a toggle between taking its number and
+        # storing its pair: stop before it, unless the last flush stopped
+        # there too and it was evicted instead
+        gap = cache.get(_key('gap'))
+        for seq in range(start + 1, end + 1):
+            if _key('slot', seq) not in slots and seq != gap:
+                cache.set(_key('gap'), seq, None)
+                end = seq - 1
+                break
+        slot_keys = [_key('slot', seq) for seq in range(start + 1, end + 1)]
+        pairs = {slots[key] for key in slot_keys if key in slots}
+        pending_keys = {pair: _key('pending', *pair) for pair in pairs}
+        clicks = cache.get_many(list(pending_keys.values()))
+
+        touched = {kind: set() for kind in KINDS}
+        # Odd while flips are written and their clicks taken off, see toggle()
+        generation = _incr(_key('generation'))
+        with transaction.atomic():
+            for kind, (like_model, target_model, field) in KINDS.items():
+                flips = [pair[1:] for pair, key in pending_keys.items() if pair[0] == kind and clicks.get(key, 0) % 2]
+                stored = set()
+                if flips:
+                    stored = set(
+                        like_model.objects.filter(
+                            user_id__in={user_id for user_id, _ in flips},
+                            **{f'{field}_id__in': {pk for _, pk in flips}},
+                        ).values_list('user_id', f'{field}_id')
+                    )
+                adds = [pair for pair in flips if pair not in stored]
+                removes = [pair for pair in flips if pair in stored]
+                # Targets or users deleted in the meantime would fail the foreign keys
+                if adds:
+                    targets = set(target_model.objects.filter(pk__in={pk for _, pk in adds}).values_list('pk', flat=True))
+                    users = set(User.objects.filter(pk__in={user_id for user_id, _ in adds}).values_list('pk', flat=True))
+                    adds = [(user_id, pk) for user_id, pk in adds if pk in targets and user_id in users]
+                like_model.objects.bulk_create(
+                    [like_model(user_id=user_id, **{f'{field}_id': pk}) for user_id, pk in adds],
+                    ignore_conflicts=True,
+                )
+                for i in range(0, len(removes), DELETE_BATCH):
+                    batch = removes[i:i + DELETE_BATCH]
+                    like_model.objects.filter(
+                        reduce(or_, (Q(user_id=user_id, **{f'{field}_id': pk}) for user_id, pk in batch))
+                    ).delete()
+                touched[kind] = {pk for _, pk in adds + removes}
+                if touched[kind]:
+                    target_model.objects.filter(pk__in=touched[kind]).update(
+                        like_count=count_per(like_model.objects, field),
+                    )
+                    likes_flushed.send(
+                        sender=like_model, user_ids={user_id for user_id, _ in adds + removes}, target_ids=touched[kind],
+                    )
+
+        # Take off only the clicks applied: those made since they were read
+        # have slots past ``end`` and get picked up by the next flush
+        for key, count in clicks.items():
+            try:
+                cache.decr(key, count)
+            except ValueError:
+                # Expired or evicted since it was read
+                pass
+        generation = _incr(_key('generation'))
+        cache.delete_many(slot_keys)
+        cache.set(_key('flushed'), end, None)
+    finally:
+        if generation % 2:
+            _incr(_key('generation'))
+        cache.delete(_key('flush-lock'))
+
+    _publish_counts(touched)
+    return len(clicks)
+
+
+def _publish_counts(touched):
+    for pk, like_count in Room.objects.filter(pk__in=touched['room']).values_list('pk', 'like_count'):
+        publish_room_event(pk, 'room-like', id=pk, like_count=like_count)
+    messages = Message.objects.filter(pk__in=touched['message']).values_list('pk', 'room_id', 'like_count')
+    for pk, room_id, like_count in messages:
+        publish_room_event(room_id, 'message-like', id=pk, like_count=like_count)
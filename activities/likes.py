@@ -0,0 +1,138 @@
+from asgiref.sync import sync_to_async
+from django.db import connections, router, transaction
+from django.db.models import F
+from django.dispatch import Signal
+from django.utils import timezone
+
+from . import likebuffer
+from .aggregates import count_per
+from .cache import bump_version
+from .conditional import FEED, room_namespace
+from .models import Message, MessageLike, Room, RoomLike
+from .realtime import publish_room_event
+
+# Sent inside a toggle's transaction when it added (``delta`` 1) or removed
+# (-1) a like of ``user_id`` on something owned by ``owner_id``
+like_toggled = Signal()
+
+
+def supports_returning(connection):
+    """Backends that take ``INSERT ... ON CONFLICT DO NOTHING`` and ``UPDATE ... RETURNING``."""
+    return connection.vendor in ('sqlite', 'postgresql') and connection.features.can_return_columns_from_insert
+
+
+def _toggle(like_model, target_model, target_field, user, pk, owner, returning=()):
+    """
+    Flip ``user``'s like on the ``pk`` target and adjust the denormalized
+    ``like_count`` in the same transaction, announcing the change through
+    ``like_toggled``. ``owner`` names the target's user field. Returns
+    ``(liked, like_count, *returning)`` and raises ``DoesNotExist`` for a
+    missing target.
+    """
+    connection = connections[router.db_for_write(like_model)]
+    with transaction.atomic(using=connection.alias):
+        if supports_returning(connection):
+            liked, delta, row = _toggle_returning(connection, like_model, target_model, target_field, user, pk, (*returning, owner))
+        else:
+            liked, delta, row = _toggle_orm(like_model, target_model, target_field, user, pk, (*returning, owner))
+        *row, owner_id = row
+        if delta:
+            like_toggled.send(sender=like_model, user_id=user.pk, owner_id=owner_id, delta=delta)
+    return (liked, *row)
+
+
+def _toggle_orm(like_model, target_model, target_field, user, pk, returning):
+    lookup = {'user': user, target_field: target_model.objects.get(pk=pk)}
+    deleted, _ = like_model.objects.filter(**lookup).delete()
+    if deleted:
+        delta, liked = -deleted, False
+    else:
+        like_model.objects.create(**lookup)
+        delta, liked = 1, True
+
+    counter = target_model.objects.filter(pk=pk)
+    counter.update(like_count=F('like_count') + delta)
+    return liked, delta, counter.values_list('like_count', *returning).get()
+
+
+def _toggle_returning(connection, like_model, target_model, target_field, user, pk, returning):
+    # No reads: the DELETE's row count says whether the like existed, the
+    # INSERT only adds it if the target exists (and a racing duplicate is
+    # ignored), and the counter UPDATE hands back the new count, or nothing
+    # when the target is missing.
+    quote = connection.ops.quote_name
+    likes, targets = quote(like_model._meta.db_table), quote(target_model._meta.db_table)
+    column = quote(like_model._meta.get_field(target_field).column)
+    created_at = like_model._meta.get_field('created_at').get_db_prep_value(timezone.now(), connection)
+    columns = ', '.join(quote(target_model._meta.get_field(name).column) for name in ('like_count', *returning))
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {likes} WHERE user_id = %s AND {column} = %s', [user.pk, pk])
+        if cursor.rowcount:
+            delta, liked = -cursor.rowcount, False
+        else:
+            cursor.execute(
+                f'INSERT INTO {likes} (user_id, {column}, created_at) '
+                f'SELECT %s, id, %s FROM {targets} WHERE id = %s ON CONFLICT DO NOTHING',
+                [user.pk, created_at, pk],
+            )
+            delta, liked = cursor.rowcount, True
+        cursor.execute(
+            f'UPDATE {targets} SET like_count = like_count + %s WHERE id = %s RETURNING {columns}',
+            [delta, pk],
+        )
+        row = cursor.fetchone()
+
+    if row is None:
+        raise target_model.DoesNotExist
+    return liked, delta, row
+
+
+# The toggles also push the new count to the room's live viewers and move the
+# page validators on (activities.conditional). In write-behind mode they only
+# buffer the click (see activities.likebuffer) and the count goes out when the
+# buffer is flushed.
+
+def toggle_room_like(user, room_id):
+    if likebuffer.enabled():
+        return likebuffer.toggle('room', user, room_id)
+    liked, like_count = _toggle(RoomLike, Room, 'room', user, room_id, owner='host')
+    bump_version(FEED)
+    publish_room_event(room_id, 'room-like', id=room_id, like_count=like_count)
+    return liked, like_count
+
+
+def toggle_message_like(user, message_id):
+    if likebuffer.enabled():
+        return likebuffer.toggle('message', user, message_id)
+    liked, like_count, room_id = _toggle(MessageLike, Message, 'message', user, message_id, owner='user', returning=['room'])
+    bump_version(room_namespace(room_id))
+    publish_room_event(room_id, 'message-like', id=message_id, like_count=like_count)
+    return liked, like_count
+
+
+# For async views: the toggle runs as one unit in a worker thread, since
+# transactions don't span the async ORM's individual calls
+atoggle_room_like = sync_to_async(toggle_room_like)
+atoggle_message_like = sync_to_async(toggle_message_like)
+
+
+def rebuild_like_counts():
+    """Recompute every ``like_count`` from the like tables."""
+    with transaction.atomic():
+        rooms = Room.objects.update(like_count=count_per(RoomLike.objects, 'room'))
+        messages = Message.objects.update(like_count=count_per(MessageLike.objects, 'message'))
+    return rooms, messages
+
+
+def drifted_like_counts():
+    """Return the rooms and messages whose stored counter disagrees with the like tables."""
+    rooms = (
+        Room.objects.annotate(actual=count_per(RoomLike.objects, 'room'))
+        .exclude(like_count=F('actual'))
+    )
+    messages = (
+        Message.objects.annotate(actual=count_per(MessageLike.objects, 'message'))
+        .exclude(like_count=F('actual'))
+    )
+    return rooms, messages
@@ -0,0 +1,21 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+
+class LoopCommand(BaseCommand):
+    """A command whose ``run_once`` runs once, or every ``--loop SECONDS``."""
+    loop_help = "Keep running every SECONDS."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', type=float, metavar='SECONDS', help=self.loop_help)
+
+    def handle(self, *args, **options):
+        while True:
+            self.run_once(**options)
+            if not options['loop']:
+                return
+            time.sleep(options['loop'])
+
+    def run_once(self, **options):
+        raise NotImplementedError('subclasses of LoopCommand must provide a run_once() method')
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from activities.roomstats import recount_room_activity
+
+
+class Command(BaseCommand):
+    help = "Recompute Room.message_count, participant_count, last_message_at and last_message_id."
+
+    def add_arguments(self, parser):
+        parser.add_argument('rooms', nargs='*', type=int, help="Room ids; every room when omitted.")
+
+    def handle(self, *args, **options):
+        count = recount_room_activity(options['rooms'] or None)
+        self.stdout.write(self.style.SUCCESS(f"Backfilled activity for {count} rooms."))
@@ -0,0 +1,393 @@
+import asyncio
+import json
+import random
+import re
+import statistics
+import tempfile
+import threading
+import time
+from http.cookiejar import CookieJar
+from io import StringIO
+from pathlib import Path
+from urllib.error import HTTPError
+from urllib.parse import urlencode, urlsplit
+from urllib.request import HTTPCookieProcessor, Request, build_opener
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, Client, override_settings
+from django.urls import Resolver404, resolve, reverse
+
+from activities.models import Message, Room
+
+DEFAULT_MIX = 'home=30,room=30,all-activities=10,like-room=10,like-message=10,user-profile=10'
+# Synthetic requests for these need a logged-in user
+LOGIN_REQUIRED = {'all-activities', 'like-room', 'like-message', 'user-profile'}
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return None
+    return values[max(0, min(len(values) - 1, round(p / 100 * len(values)) - 1))]
+
+
+def url_name(path):
+    try:
+        return resolve(urlsplit(path).path).url_name or path
+    except Resolver404:
+        return 'unresolved'
+
+
+class SQLRecorder:
+    """``connection.execute_wrapper`` hook counting queries and the time spent in them."""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.seconds += time.perf_counter() - started
+
+
+class ClientSession:
+    """In-process requests through the Django test client, with SQL stats."""
+
+    sql_stats = True
+
+    def __init__(self, username=None):
+        self.client = Client(raise_request_exception=False)
+        if username:
+            self.client.force_login(User.objects.get(username=username))
+
+    def request(self, method, path, data):
+        recorder = SQLRecorder()
+        with connection.execute_wrapper(recorder):
+            started = time.perf_counter()
+            response = self.client.generic(
+                method, path, urlencode(data or {}),
+                content_type='application/x-www-form-urlencoded',
+            )
+            elapsed = time.perf_counter() - started
+        return response.status_code, elapsed, recorder.queries, recorder.seconds
+
+
+class AsyncClientSession:
+    """
+    In-process requests through Django's ASGI handler, as under ``asgi.py``.
+    Queries run in per-request worker threads, out of reach of SQL stats.
+    """
+
+    sql_stats = False
+
+    def __init__(self, username=None):
+        self.client = AsyncClient(raise_request_exception=False)
+        self.username = username
+
+    async def login(self):
+        if self.username:
+            await self.client.aforce_login(await User.objects.aget(username=self.username))
+        return self
+
+    async def request(self, method, path, data):
+        started = time.perf_counter()
+        response = await self.client.generic(
+            method, path, urlencode(data or {}),
+            content_type='application/x-www-form-urlencoded',
+        )
+        return response.status_code, time.perf_counter() - started, None, None
+
+
+class ServerSession:
+    """Requests over HTTP to a running server; the database is out of sight there."""
+
+    sql_stats = False
+
+    def __init__(self, base_url, username=None, password=None):
+        self.base_url = base_url.rstrip('/')
+        self.cookies = CookieJar()
+        self.opener = build_opener(HTTPCookieProcessor(self.cookies))
+        if username:
+            self.request('GET', reverse('users:login'), None)
+            status = self.request('POST', reverse('users:login'), {'username': username, 'password': password})[0]
+            if not any(cookie.name == 'sessionid' for cookie in self.cookies):
+                raise CommandError(f"Could not log in as {username!r} (status {status}).")
+
+    def csrf_token(self):
+        return next((cookie.value for cookie in self.cookies if cookie.name == 'csrftoken'), '')
+
+    def request(self, method, path, data):
+        body = None
+        headers = {'Referer': self.base_url + '/'}
+        if method != 'GET':
+            body = urlencode({'csrfmiddlewaretoken': self.csrf_token(), **(data or {})}).encode()
+            headers['X-CSRFToken'] = self.csrf_token()
+        request = Request(self.base_url + path, data=body, headers=headers, method=method)
+        started = time.perf_counter()
+        try:
+            with self.opener.open(request) as response:
+                response.read()
+                status = response.status
+        except HTTPError as error:
+            status = error.code
+        return status, time.perf_counter() - started, None, None
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay a JSONL request trace, or a synthetic mix over the main pages, with "
+        "concurrent workers and report latency percentiles, throughput and SQL cost per "
+        "URL name as JSON. By default it runs on a throwaway database filled by "
+        "generate_fake_data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--trace',
+            help='JSONL file, one request per line: {"path": "/room/3", "method": "GET", "user": "alice", "data": {}}.',
+        )
+        parser.add_argument('--requests', type=int, default=1000, help="Synthetic requests to send.")
+        parser.add_argument('--mix', default=DEFAULT_MIX, help="Weights of URL names in the synthetic mix.")
+        parser.add_argument(
+            '--authenticated', type=float, default=0.5,
+            help="Share of synthetic page views made by a logged-in user.",
+        )
+        parser.add_argument(
+            '--interface', choices=['wsgi', 'asgi'], default='wsgi',
+            help="wsgi: one thread per concurrent request; asgi: concurrent tasks on one event loop.",
+        )
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--warmup', type=int, default=20, help="Untimed requests sent first to warm caches.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--live', action='store_true',
+            help="Use the configured database as it is instead of a seeded throwaway copy.",
+        )
+        parser.add_argument('--server', help="Send requests to a running server at this URL (implies --live).")
+        parser.add_argument('--password', default='password123', help="Password used to log in with --server.")
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--rooms', type=int, default=100)
+        parser.add_argument('--messages', type=int, default=5000)
+        parser.add_argument('--likes', type=int, default=2000)
+        parser.add_argument('--output', help="Write the JSON report here instead of stdout.")
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(options['seed'])
+
+        if options['server']:
+            report = self.run()
+        else:
+            # The test client talks to the app as 'testserver'
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                report = self.run() if options['live'] else self.run_on_throwaway_database()
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            Path(options['output']).write_text(output + '\n', encoding='utf-8')
+        else:
+            self.stdout.write(output)
+
+    def run_on_throwaway_database(self):
+        with tempfile.TemporaryDirectory() as directory:
+            # A file rather than shared memory, so concurrent writers lock like they do in production
+            if connection.vendor == 'sqlite':
+                connection.settings_dict.setdefault('TEST', {})['NAME'] = str(Path(directory) / 'bench.sqlite3')
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                started = time.perf_counter()
+                call_command(
+                    'generate_fake_data', stdout=StringIO(), seed=self.options['seed'],
+                    **{key: self.options[key] for key in ('users', 'rooms', 'messages', 'likes')},
+                )
+                self.stderr.write(f"Seeded the throwaway database in {time.perf_counter() - started:.1f}s")
+                return self.run()
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def run(self):
+        if self.options['trace']:
+            workload = self.load_trace(self.options['trace'])
+        else:
+            workload = self.synthetic_workload(self.options['requests'])
+        if not workload:
+            raise CommandError("Nothing to replay.")
+
+        warmup, concurrency = self.options['warmup'], max(1, self.options['concurrency'])
+        if self.options['interface'] == 'asgi' and not self.options['server']:
+            results, elapsed = asyncio.run(self.run_async(workload, warmup, concurrency))
+            return self.report(results, elapsed, concurrency)
+
+        self.replay(workload[:warmup], {})
+
+        shards = [workload[i::concurrency] for i in range(concurrency)]
+        results = [[] for _ in shards]
+        started = time.perf_counter()
+        if concurrency == 1:
+            results[0] = self.replay(shards[0], {})
+        else:
+            threads = [
+                threading.Thread(target=self.worker, args=(shard, results[i]))
+                for i, shard in enumerate(shards)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        elapsed = time.perf_counter() - started
+
+        return self.report([row for rows in results for row in rows], elapsed, concurrency)
+
+    def worker(self, shard, results):
+        try:
+            results.extend(self.replay(shard, {}))
+        finally:
+            connection.close()
+
+    def replay(self, workload, sessions):
+        results = []
+        for item in workload:
+            user = item.get('user')
+            if user not in sessions:
+                sessions[user] = self.session(user)
+            status, elapsed, queries, sql_seconds = sessions[user].request(
+                item.get('method', 'GET').upper(), item['path'], item.get('data'),
+            )
+            results.append((url_name(item['path']), status, elapsed, queries, sql_seconds))
+        return results
+
+    async def run_async(self, workload, warmup, concurrency):
+        sessions = {}
+        await self.areplay(workload[:warmup], sessions, 1)
+        started = time.perf_counter()
+        results = await self.areplay(workload, sessions, concurrency)
+        return results, time.perf_counter() - started
+
+    async def areplay(self, workload, sessions, concurrency):
+        pending = iter(workload)
+        results = []
+
+        async def worker():
+            # Keeps ``concurrency`` requests in flight on the one event loop
+            for item in pending:
+                user = item.get('user')
+                if user not in sessions:
+                    sessions[user] = await AsyncClientSession(user).login()
+                status, elapsed, queries, sql_seconds = await sessions[user].request(
+                    item.get('method', 'GET').upper(), item['path'], item.get('data'),
+                )
+                results.append((url_name(item['path']), status, elapsed, queries, sql_seconds))
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return results
+
+    def session(self, username):
+        if self.options['server']:
+            return ServerSession(self.options['server'], username, self.options['password'])
+        return ClientSession(username)
+
+    def load_trace(self, path):
+        workload = []
+        with open(path, encoding='utf-8') as fileobj:
+            for number, line in enumerate(fileobj, 1):
+                if not line.strip():
+                    continue
+                try:
+                    item = json.loads(line)
+                except json.JSONDecodeError as error:
+                    raise CommandError(f"{path}:{number}: {error}")
+                if 'path' not in item and 'name' in item:
+                    item['path'] = reverse(item['name'], kwargs=item.get('kwargs'))
+                if 'path' not in item:
+                    raise CommandError(f"{path}:{number}: every request needs a 'path' or a URL 'name'.")
+                workload.append(item)
+        return workload
+
+    def synthetic_workload(self, count):
+        weights = {}
+        for part in self.options['mix'].split(','):
+            name, _, weight = part.partition('=')
+            if not re.fullmatch(r'\d+(\.\d+)?', weight.strip()):
+                raise CommandError(f"Bad --mix entry {part!r}, expected name=weight.")
+            weights[name.strip()] = float(weight)
+
+        usernames = list(User.objects.values_list('username', flat=True))
+        room_ids = list(Room.objects.values_list('id', flat=True))
+        message_ids = list(Message.objects.order_by('id').values_list('id', flat=True))
+        if not (usernames and room_ids and message_ids):
+            raise CommandError("The database needs users, rooms and messages for a synthetic mix.")
+
+        paths = {
+            'home': lambda: reverse('home'),
+            'room': lambda: reverse('room', args=[self.rng.choice(room_ids)]),
+            'all-activities': lambda: reverse('all-activities'),
+            'like-room': lambda: reverse('like-room', args=[self.rng.choice(room_ids)]),
+            'like-message': lambda: reverse('like-message', args=[self.rng.choice(message_ids)]),
+            'user-profile': lambda: reverse('users:user-profile', args=[self.rng.choice(usernames)]),
+            # A client polling for what arrived after one of the latest messages
+            'room-messages-since': lambda: (
+                reverse('room-messages-since', args=[self.rng.choice(room_ids)])
+                + f'?after={self.rng.choice(message_ids[-50:])}'
+            ),
+        }
+        unknown = set(weights) - set(paths)
+        if unknown:
+            raise CommandError(f"Unknown URL names in --mix: {', '.join(sorted(unknown))}.")
+
+        names = self.rng.choices(list(weights), weights=list(weights.values()), k=count)
+        workload = []
+        for name in names:
+            logged_in = name in LOGIN_REQUIRED or self.rng.random() < self.options['authenticated']
+            workload.append({
+                'method': 'POST' if name.startswith('like-') else 'GET',
+                'path': paths[name](),
+                # A small pool of active users, so sessions get reused like real ones
+                'user': self.rng.choice(usernames[:50]) if logged_in else None,
+            })
+        return workload
+
+    def report(self, results, elapsed, concurrency):
+        def summarize(rows):
+            latencies = sorted(row[2] * 1000 for row in rows)
+            statuses = {}
+            for row in rows:
+                statuses[str(row[1])] = statuses.get(str(row[1]), 0) + 1
+            summary = {
+                'requests': len(rows),
+                'errors': sum(1 for row in rows if row[1] >= 500),
+                'status': dict(sorted(statuses.items())),
+                'throughput_rps': round(len(rows) / elapsed, 1) if elapsed else None,
+                'mean_ms': round(statistics.fmean(latencies), 2),
+                'p50_ms': round(percentile(latencies, 50), 2),
+                'p95_ms': round(percentile(latencies, 95), 2),
+                'p99_ms': round(percentile(latencies, 99), 2),
+            }
+            if rows[0][3] is not None:
+                queries = sorted(row[3] for row in rows)
+                summary.update({
+                    'queries_mean': round(statistics.fmean(queries), 2),
+                    'queries_max': queries[-1],
+                    'sql_ms_mean': round(statistics.fmean(row[4] for row in rows) * 1000, 2),
+                    'sql_ms_total': round(sum(row[4] for row in rows) * 1000, 2),
+                })
+            return summary
+
+        by_name = {}
+        for row in results:
+            by_name.setdefault(row[0], []).append(row)
+        return {
+            'mode': 'server' if self.options['server'] else 'client',
+            'interface': None if self.options['server'] else self.options['interface'],
+            'concurrency': concurrency,
+            'seconds': round(elapsed, 3),
+            'total': summarize(results),
+            'urls': {name: summarize(rows) for name, rows in sorted(by_name.items())},
+        }
@@ -0,0 +1,100 @@
+import json
+import random
+import statistics
+import string
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from activities.models import Room, Topic
+from activities.search import match_expression
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark FTS5 room search against the icontains fallback. "
+        "Runs on a throwaway test database, never on the real one."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=1_000_000)
+        parser.add_argument('--topics', type=int, default=200)
+        parser.add_argument('--queries', type=int, default=25, help="Distinct search terms to time.")
+        parser.add_argument('--repeat', type=int, default=3, help="Timed runs per search term.")
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        vocabulary = self.vocabulary(rng, 5000)
+
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            started = time.perf_counter()
+            self.populate(rng, vocabulary, options)
+            load_seconds = time.perf_counter() - started
+            self.stderr.write(f"Loaded {options['rooms']} rooms in {load_seconds:.1f}s")
+
+            # Whole words and 4-letter prefixes, as typed into the search box
+            terms = [rng.choice(vocabulary) for _ in range(options['queries'])]
+            terms = [term if i % 2 else term[:4] for i, term in enumerate(terms)]
+
+            results = {
+                'rooms': options['rooms'],
+                'load_seconds': round(load_seconds, 2),
+                'fts5': self.time_queries(terms, options['repeat'], lambda q: Room.objects.search_fulltext(match_expression(q))),
+                'icontains': self.time_queries(terms, options['repeat'], lambda q: Room.objects.search_icontains(q)),
+            }
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        self.stdout.write(f"{'backend':<10} {'p50 ms':>10} {'p95 ms':>10} {'max ms':>10}")
+        for backend in ('fts5', 'icontains'):
+            row = results[backend]
+            self.stdout.write(f"{backend:<10} {row['p50_ms']:>10} {row['p95_ms']:>10} {row['max_ms']:>10}")
+
+    def vocabulary(self, rng, size):
+        words = set()
+        while len(words) < size:
+            words.add(''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 9))))
+        return sorted(words)
+
+    def populate(self, rng, vocabulary, options):
+        topics = Topic.objects.bulk_create(
+            Topic(name=f'{word.capitalize()} {i}') for i, word in enumerate(rng.sample(vocabulary, options['topics']))
+        )
+        remaining = options['rooms']
+        while remaining:
+            size = min(remaining, options['batch_size'])
+            with transaction.atomic():
+                Room.objects.bulk_create([
+                    Room(
+                        name=' '.join(rng.choices(vocabulary, k=3)),
+                        description=' '.join(rng.choices(vocabulary, k=12)),
+                        topic=rng.choice(topics),
+                    )
+                    for _ in range(size)
+                ])
+            remaining -= size
+
+    def time_queries(self, terms, repeat, search):
+        # What home() does with a search: count the matches, render the top ones
+        timings = []
+        for term in terms:
+            for _ in range(repeat):
+                started = time.perf_counter()
+                queryset = search(term)
+                queryset.count()
+                list(queryset.values_list('id', flat=True)[:50])
+                timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        return {
+            'p50_ms': round(statistics.median(timings), 2),
+            'p95_ms': round(timings[int(len(timings) * 0.95) - 1], 2),
+            'max_ms': round(timings[-1], 2),
+        }
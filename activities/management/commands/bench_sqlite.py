@@ -0,0 +1,149 @@
+import json
+import random
+import statistics
+import tempfile
+import threading
+import time
+from io import StringIO
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+
+from activities.likes import toggle_room_like
+from activities.models import Message, Room
+
+# What SQLite does when Django's settings ask for nothing
+BASELINE = {'OPTIONS': {}, 'CONN_MAX_AGE': 0, 'journal_mode': 'DELETE'}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure concurrent read/write throughput on SQLite with its default settings "
+        "and with the production profile from settings.DATABASES. Runs on a throwaway "
+        "database file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8, help="Threads rendering feed-like reads.")
+        parser.add_argument('--writers', type=int, default=2, help="Threads posting messages and toggling likes.")
+        parser.add_argument('--seconds', type=float, default=5.0, help="Duration of each run.")
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--rooms', type=int, default=200)
+        parser.add_argument('--messages', type=int, default=20000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', action='store_true', help="Print the results as JSON.")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError("bench_sqlite only runs against SQLite.")
+        self.options = options
+        configured = connection.settings_dict
+        production = {
+            'OPTIONS': dict(configured.get('OPTIONS', {})),
+            'CONN_MAX_AGE': configured.get('CONN_MAX_AGE', 0),
+            'journal_mode': 'WAL',
+        }
+
+        with tempfile.TemporaryDirectory() as directory:
+            configured.setdefault('TEST', {})['NAME'] = str(Path(directory) / 'bench.sqlite3')
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            original = {key: configured.get(key) for key in ('OPTIONS', 'CONN_MAX_AGE')}
+            try:
+                call_command(
+                    'generate_fake_data', stdout=StringIO(), seed=options['seed'], users=options['users'],
+                    rooms=options['rooms'], messages=options['messages'], likes=options['messages'],
+                )
+                self.users = list(User.objects.all()[:100])
+                self.room_ids = list(Room.objects.values_list('id', flat=True))
+                results = {
+                    'baseline': self.run_profile(configured, BASELINE),
+                    'production': self.run_profile(configured, production),
+                }
+            finally:
+                configured.update(original)
+                connection.close()
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        header = f"{'profile':<12} {'reads/s':>9} {'writes/s':>9} {'read p99':>9} {'write p99':>10} {'locked':>7}"
+        self.stdout.write(header)
+        for name, row in results.items():
+            self.stdout.write(
+                f"{name:<12} {row['reads_per_second']:>9} {row['writes_per_second']:>9} "
+                f"{row['read_p99_ms']:>9} {row['write_p99_ms']:>10} {row['locked_errors']:>7}"
+            )
+
+    def run_profile(self, settings_dict, profile):
+        settings_dict['OPTIONS'] = profile['OPTIONS']
+        settings_dict['CONN_MAX_AGE'] = profile['CONN_MAX_AGE']
+        connection.close()
+        # journal_mode is stored in the file, so set it for the baseline too
+        with connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA journal_mode={profile['journal_mode']}")
+        connection.close()
+
+        stop = time.monotonic() + self.options['seconds']
+        timings = {'read': [], 'write': []}
+        errors = []
+        threads = [
+            threading.Thread(target=self.worker, args=(kind, stop, timings[kind], errors, i))
+            for kind, count in (('read', self.options['readers']), ('write', self.options['writers']))
+            for i in range(count)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        seconds = self.options['seconds']
+
+        def p99(values):
+            values = sorted(values)
+            return round(values[int(len(values) * 0.99) - 1] * 1000, 2) if values else None
+
+        return {
+            'reads_per_second': round(len(timings['read']) / seconds, 1),
+            'writes_per_second': round(len(timings['write']) / seconds, 1),
+            'read_p50_ms': round(statistics.median(timings['read']) * 1000, 2) if timings['read'] else None,
+            'read_p99_ms': p99(timings['read']),
+            'write_p50_ms': round(statistics.median(timings['write']) * 1000, 2) if timings['write'] else None,
+            'write_p99_ms': p99(timings['write']),
+            'locked_errors': len(errors),
+        }
+
+    def worker(self, kind, stop, timings, errors, seed):
+        rng = random.Random(seed)
+        operation = self.read if kind == 'read' else self.write
+        try:
+            while time.monotonic() < stop:
+                started = time.perf_counter()
+                try:
+                    operation(rng)
+                except OperationalError:
+                    errors.append(kind)
+                    continue
+                finally:
+                    # What the end of a request does: close unless connections persist
+                    connections['default'].close_if_unusable_or_obsolete()
+                timings.append(time.perf_counter() - started)
+        finally:
+            connections['default'].close()
+
+    def read(self, rng):
+        # Roughly the home page: a feed page and the recent activity
+        list(Room.objects.for_feed()[:20])
+        list(Message.objects.for_activity()[:10])
+
+    def write(self, rng):
+        user = rng.choice(self.users)
+        room_id = rng.choice(self.room_ids)
+        if rng.random() < 0.5:
+            Message.objects.create(user=user, room_id=room_id, body='Benchmark message')
+        else:
+            toggle_room_like(user, room_id)
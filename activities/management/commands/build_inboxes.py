@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from activities.inbox import build_inboxes
+
+
+class Command(BaseCommand):
+    help = "Refill every activity inbox from the rooms each user takes part in or liked."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cap', type=int, help="Entries to keep per user (default: ACTIVITIES_INBOX_CAP).")
+
+    def handle(self, *args, **options):
+        count = build_inboxes(options['cap'])
+        self.stdout.write(self.style.SUCCESS(f"Built inboxes with {count} entries."))
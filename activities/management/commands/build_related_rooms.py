@@ -0,0 +1,31 @@
+import time
+
+from activities.recommendations import TOP_K, build_related_rooms, refresh_related_rooms
+
+from ._loop import LoopCommand
+
+
+class Command(LoopCommand):
+    help = (
+        "Precompute each room's related rooms from co-participation, co-likes and topic. "
+        "Only refreshes rooms that changed since the last run unless --full is given."
+    )
+    loop_help = "Keep refreshing every SECONDS."
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--full', action='store_true', help="Rebuild every room's neighbours.")
+        parser.add_argument('--top', type=int, default=TOP_K, help="Neighbours kept per room.")
+
+    def handle(self, *args, **options):
+        self.full = options['full']
+        super().handle(*args, **options)
+
+    def run_once(self, **options):
+        started = time.perf_counter()
+        count = build_related_rooms(top_k=options['top']) if self.full else refresh_related_rooms(options['top'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Refreshed related rooms for {count} rooms in {time.perf_counter() - started:.2f}s."
+        ))
+        # With --loop, only the first run is a full build
+        self.full = False
@@ -0,0 +1,17 @@
+import time
+
+from activities.trending import build_trending
+
+from ._loop import LoopCommand
+
+
+class Command(LoopCommand):
+    help = "Recompute the time-decayed trending scores behind the home page's ?sort=trending."
+    loop_help = "Keep recomputing every SECONDS."
+
+    def run_once(self, **options):
+        started = time.perf_counter()
+        count = build_trending()
+        self.stdout.write(self.style.SUCCESS(
+            f"Scored {count} trending rooms in {time.perf_counter() - started:.2f}s."
+        ))
@@ -0,0 +1,21 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from activities.exports import compact
+
+
+class Command(BaseCommand):
+    help = "Merge the partitions written by `export_dataset --incremental` into DIR/snapshot/."
+
+    def add_arguments(self, parser):
+        parser.add_argument('directory')
+
+    def handle(self, *args, **options):
+        directory = Path(options['directory'])
+        if not directory.is_dir():
+            raise CommandError(f"{directory} is not a directory.")
+        results = compact(directory)
+        for name, (partitions, rows) in results.items():
+            self.stdout.write(f"{name}: merged {partitions} partitions, {rows} rows in snapshot")
+        self.stdout.write(self.style.SUCCESS("Nothing to compact." if not results else "Compaction complete."))
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+class Command(BaseCommand):
+    help = (
+        "Switch an SQLite database to WAL journaling. The mode is stored in the database file, "
+        "so this runs once per database, e.g. after the first migrate."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help="Database alias (default: 'default').")
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            raise CommandError("enable_wal only applies to SQLite.")
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=WAL')
+            mode = cursor.fetchone()[0]
+        if mode != 'wal':
+            raise CommandError(f"{connection.settings_dict['NAME']} stayed in {mode} mode.")
+        self.stdout.write(self.style.SUCCESS(f"{connection.settings_dict['NAME']} uses WAL journaling."))
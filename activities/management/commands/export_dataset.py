@@ -0,0 +1,64 @@
+from datetime import timedelta
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from activities.exports import CHUNK_SIZE, TABLES, export_incremental, write_combined, write_table
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream the dataset to CSV. By default writes the flat connection_dataset.csv; "
+        "--normalized writes one file per table instead, --incremental only what changed since the last run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default='connection_dataset.csv', help="File for the flat export.")
+        parser.add_argument(
+            '--normalized', metavar='DIR',
+            help="Write users.csv, rooms.csv, messages.csv, ... into DIR instead of one flat file.",
+        )
+        parser.add_argument(
+            '--incremental', metavar='DIR',
+            help=(
+                "Append timestamped partitions of the rows created or changed since the previous "
+                "run to DIR, tracking progress in DIR/_watermarks.json. Merge them with compact_exports."
+            ),
+        )
+        parser.add_argument(
+            '--lag', type=float, default=5.0,
+            help="With --incremental, leave rows younger than this many seconds for the next run.",
+        )
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+
+        if options['incremental']:
+            if options['normalized']:
+                raise CommandError("--incremental and --normalized are mutually exclusive.")
+            counts = export_incremental(
+                options['incremental'], timezone.now(), timedelta(seconds=options['lag']), chunk_size,
+            )
+            for name, count in counts.items():
+                self.stdout.write(f"{name}: {count} rows")
+            self.stdout.write(self.style.SUCCESS(f"Incremental export saved to {options['incremental']}/"))
+            return
+
+        if options['normalized']:
+            directory = Path(options['normalized'])
+            directory.mkdir(parents=True, exist_ok=True)
+            for table in TABLES:
+                with open(directory / f'{table.name}.csv', 'w', newline='', encoding='utf-8') as fileobj:
+                    count = write_table(table, fileobj, chunk_size=chunk_size)
+                self.stdout.write(f"{table.name}.csv: {count} rows")
+            self.stdout.write(self.style.SUCCESS(f"Dataset saved to {directory}/"))
+            return
+
+        with open(options['output'], 'w', newline='', encoding='utf-8') as fileobj:
+            count = write_combined(fileobj, chunk_size)
+        if not count:
+            self.stdout.write("No data found in the database. Please populate the database and try again.")
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Dataset saved as {options['output']} ({count} rows)"))
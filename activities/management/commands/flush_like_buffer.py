@@ -0,0 +1,24 @@
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import CommandError
+
+from activities import likebuffer
+
+from ._loop import LoopCommand
+
+
+class Command(LoopCommand):
+    help = "Write the like toggles buffered in write-behind mode (ACTIVITIES_LIKE_WRITE_BEHIND) to the database."
+    loop_help = "Keep flushing every SECONDS instead of once."
+
+    def handle(self, *args, **options):
+        if isinstance(caches['default'], LocMemCache):
+            raise CommandError("The like buffer lives in the web processes' LocMemCache; use a shared cache.")
+        super().handle(*args, **options)
+
+    def run_once(self, **options):
+        flushed = likebuffer.flush()
+        if flushed is None:
+            self.stdout.write("Another flush is in progress.")
+        elif flushed or not options['loop']:
+            self.stdout.write(self.style.SUCCESS(f"Flushed {flushed} like toggles."))
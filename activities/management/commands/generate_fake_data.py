@@ -0,0 +1,203 @@
+import random
+import time
+from array import array
+from multiprocessing import Pool
+
+from django.conf import settings
+from django.contrib.admin.models import LogEntry
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from faker import Faker
+
+from activities.cache import bump_version
+from activities.conditional import FEED, ROOMS
+from activities.inbox import build_inboxes
+from activities.likes import rebuild_like_counts
+from activities.models import InboxEntry, Message, MessageLike, RelatedRoom, Room, RoomLike, Topic, TrendingRoom
+from activities.recommendations import build_related_rooms
+from activities.roomstats import recount_room_activity
+from activities.trending import build_trending
+from users.models import UserProfile, UserStats
+from users.stats import recount_user_stats
+
+PASSWORD = 'password123'
+
+
+def _sentences(args):
+    """Worker: message bodies for one chunk, seeded so output doesn't depend on --workers."""
+    seed, count = args
+    fake = Faker()
+    fake.seed_instance(seed)
+    return [fake.sentence() for _ in range(count)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with fake users, topics, rooms, messages and likes. "
+        "Rows are written with bulk_create in batched transactions, so production-sized "
+        "datasets take minutes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--topics', type=int, default=20)
+        parser.add_argument('--rooms', type=int, default=20)
+        parser.add_argument('--messages', type=int, default=200)
+        parser.add_argument('--likes', type=int, default=300, help="Room likes and message likes to create (each).")
+        parser.add_argument('--max-participants', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=None, help="Make the generated data reproducible.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help="Processes generating message text in parallel; rows are still written by this process.",
+        )
+        parser.add_argument('--reset', action='store_true', help="Delete all users, rooms, messages and likes first.")
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.fake = Faker()
+        self.fake.seed_instance(options['seed'])
+        self.batch_size = options['batch_size']
+        started = time.perf_counter()
+
+        if options['reset']:
+            self.step("Reset", self.reset)
+
+        users = self.step("Users", self.create_users, options['users'])
+        topics = self.step("Topics", self.create_topics, options['topics'])
+        rooms = self.step("Rooms", self.create_rooms, options['rooms'], users, topics, options['max_participants'])
+        messages = self.step("Messages", self.create_messages, options['messages'], users, rooms, options)
+        self.step("Room likes", self.create_likes, RoomLike, 'room_id', options['likes'], users, rooms)
+        self.step("Message likes", self.create_likes, MessageLike, 'message_id', options['likes'], users, messages)
+        self.step("Like counters", rebuild_like_counts)
+        self.step("Room activity", recount_room_activity)
+        self.step("Inboxes", build_inboxes)
+        self.step("User stats", recount_user_stats)
+        self.step("Trending", build_trending)
+        self.step("Related rooms", build_related_rooms)
+        self.step("Caches", self.invalidate_caches)
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Data generation complete in {time.perf_counter() - started:.1f}s"))
+
+    def step(self, label, func, *args):
+        started = time.perf_counter()
+        result = func(*args)
+        self.stdout.write(f"{label}: {time.perf_counter() - started:.1f}s")
+        return result
+
+    def batches(self, total):
+        for start in range(0, total, self.batch_size):
+            yield start, min(self.batch_size, total - start)
+
+    def reset(self):
+        # One raw DELETE per table, children first: no rows are fetched to
+        # collect cascades and no signal receivers run per row. The rebuild
+        # steps of handle() then recount everything once for the new data.
+        tables = (
+            InboxEntry, MessageLike, RoomLike, RelatedRoom, TrendingRoom, UserStats, Message,
+            Room.participants.through, Room, Topic, UserProfile,
+            User.groups.through, User.user_permissions.through, LogEntry, User,
+        )
+        with transaction.atomic():
+            for model in tables:
+                model.objects.all()._raw_delete(model.objects.db)
+
+    def invalidate_caches(self):
+        # bulk_create and raw deletes send no signals: drop the cached fragments and page ETags
+        for namespace in (ROOMS, FEED, 'topics', 'activity'):
+            bump_version(namespace)
+
+    def create_users(self, count):
+        # Hash once: PBKDF2 per user is what made large runs take hours
+        password = make_password(PASSWORD)
+        photos = sorted(
+            f'profile_photos/{path.name}' for path in (settings.MEDIA_ROOT / 'profile_photos').glob('*.jpg')
+        )
+        # A run-specific suffix keeps usernames unique without asking the database
+        suffix = self.rng.getrandbits(32)
+        ids = array('q')
+        for start, size in self.batches(count):
+            with transaction.atomic():
+                users = User.objects.bulk_create([
+                    User(
+                        username=f'{self.fake.user_name()}_{suffix:x}_{start + i}',
+                        email=self.fake.email(),
+                        password=password,
+                    )
+                    for i in range(size)
+                ])
+                UserProfile.objects.bulk_create([
+                    UserProfile(user=user, photo=photos[user.pk % len(photos)] if photos else None)
+                    for user in users
+                ])
+            ids.extend(user.pk for user in users)
+        return ids
+
+    def create_topics(self, count):
+        existing = set(Topic.objects.values_list('name', flat=True))
+        names = []
+        while len(names) < count:
+            name = self.fake.word().capitalize()
+            if name in existing:
+                name = f'{name} {len(names)}'
+            if name not in existing:
+                existing.add(name)
+                names.append(name)
+        return [topic.pk for topic in Topic.objects.bulk_create(Topic(name=name) for name in names)]
+
+    def create_rooms(self, count, users, topics, max_participants):
+        Participant = Room.participants.through
+        ids = array('q')
+        for start, size in self.batches(count):
+            with transaction.atomic():
+                rooms = Room.objects.bulk_create([
+                    Room(
+                        name=self.fake.word(),
+                        description=self.fake.sentence(),
+                        host_id=self.rng.choice(users),
+                        topic_id=self.rng.choice(topics),
+                    )
+                    for _ in range(size)
+                ])
+                Participant.objects.bulk_create([
+                    Participant(room_id=room.pk, user_id=user_id)
+                    for room in rooms
+                    for user_id in self.rng.sample(users, min(len(users), self.rng.randint(1, max_participants)))
+                ])
+            ids.extend(room.pk for room in rooms)
+        return ids
+
+    def create_messages(self, count, users, rooms, options):
+        seed = options['seed'] if options['seed'] is not None else self.rng.getrandbits(32)
+        chunks = [(seed + start, size) for start, size in self.batches(count)]
+        ids = array('q')
+
+        pool = Pool(options['workers']) if options['workers'] > 1 else None
+        try:
+            bodies = pool.imap(_sentences, chunks) if pool else map(_sentences, chunks)
+            for chunk in bodies:
+                with transaction.atomic():
+                    messages = Message.objects.bulk_create([
+                        Message(user_id=self.rng.choice(users), room_id=self.rng.choice(rooms), body=body)
+                        for body in chunk
+                    ])
+                ids.extend(message.pk for message in messages)
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+        return ids
+
+    def create_likes(self, model, field, count, users, targets):
+        # Duplicate (user, target) pairs are dropped by the unique constraint
+        # instead of being checked one by one, so a few less than --likes may land.
+        if not users or not targets:
+            return
+        for _, size in self.batches(count):
+            with transaction.atomic():
+                model.objects.bulk_create(
+                    [model(user_id=self.rng.choice(users), **{field: self.rng.choice(targets)}) for _ in range(size)],
+                    ignore_conflicts=True,
+                )
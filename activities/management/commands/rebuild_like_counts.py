@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from activities.likes import drifted_like_counts, rebuild_like_counts
+
+
+class Command(BaseCommand):
+    help = "Reconcile Room.like_count and Message.like_count with the like tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help="Rewrite every counter instead of only the ones that drifted.",
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help="Only report drifted counters, don't fix them.",
+        )
+
+    def handle(self, *args, **options):
+        if options['full'] and not options['dry_run']:
+            rooms, messages = rebuild_like_counts()
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt counters for {rooms} rooms and {messages} messages."))
+            return
+
+        rooms, messages = drifted_like_counts()
+        fixed = {'rooms': 0, 'messages': 0}
+        with transaction.atomic():
+            for label, queryset in (('rooms', rooms), ('messages', messages)):
+                for obj in queryset.only('id', 'like_count').iterator():
+                    self.stdout.write(f"{label[:-1]} {obj.id}: stored {obj.like_count}, actual {obj.actual}")
+                    if not options['dry_run']:
+                        type(obj).objects.filter(pk=obj.pk).update(like_count=obj.actual)
+                    fixed[label] += 1
+
+        verb = "Found" if options['dry_run'] else "Fixed"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {fixed['rooms']} drifted room counters and {fixed['messages']} drifted message counters."
+        ))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from activities.search import install_room_fts, rebuild_room_fts
+
+
+class Command(BaseCommand):
+    help = "Rebuild the FTS5 room search index from activities_room and activities_topic."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        with transaction.atomic(using=connection.alias):
+            if not install_room_fts(connection):
+                raise CommandError("This database does not support SQLite FTS5; search uses the icontains fallback.")
+            rebuild_room_fts(connection)
+        self.stdout.write(self.style.SUCCESS("Room search index rebuilt."))
@@ -0,0 +1,52 @@
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import connections
+
+from ._loop import LoopCommand
+
+
+def copy_sqlite(source, target):
+    """
+    Copy the SQLite database ``source`` into ``target`` through the online
+    backup API. Writers on the source aren't blocked, and the pages are written
+    into the live target file under its own locks, so connections that readers
+    keep open to the replica see the new data on their next transaction.
+    """
+    src = sqlite3.connect(source)
+    try:
+        # Wait for the replica's readers rather than failing with "database is locked"
+        dst = sqlite3.connect(target, timeout=30)
+        try:
+            src.backup(dst)
+        finally:
+            dst.close()
+    finally:
+        src.close()
+
+
+class Command(LoopCommand):
+    help = (
+        "Refresh the SQLite read replicas in DATABASE_REPLICAS from the default database. "
+        "Other backends replicate on their own."
+    )
+    loop_help = "Keep syncing every SECONDS."
+
+    def handle(self, *args, **options):
+        self.aliases = getattr(settings, 'DATABASE_REPLICAS', [])
+        if not self.aliases:
+            raise CommandError("No replicas configured in DATABASE_REPLICAS.")
+        for alias in ['default', *self.aliases]:
+            if connections[alias].vendor != 'sqlite':
+                raise CommandError(f"{alias!r} is not SQLite; use the database's own replication.")
+        super().handle(*args, **options)
+
+    def run_once(self, **options):
+        source = connections['default'].settings_dict['NAME']
+        started = time.perf_counter()
+        for alias in self.aliases:
+            connections[alias].close()
+            copy_sqlite(source, connections[alias].settings_dict['NAME'])
+        self.stdout.write(f"Synced {', '.join(self.aliases)} in {(time.perf_counter() - started) * 1000:.0f} ms")
@@ -0,0 +1,16 @@
+from activities.inbox import trim_inboxes
+
+from ._loop import LoopCommand
+
+
+class Command(LoopCommand):
+    help = "Cut every activity inbox down to its newest ACTIVITIES_INBOX_CAP entries."
+    loop_help = "Keep trimming every SECONDS."
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument('--cap', type=int, help="Entries to keep per user (default: ACTIVITIES_INBOX_CAP).")
+
+    def run_once(self, **options):
+        deleted = trim_inboxes(options['cap'])
+        self.stdout.write(self.style.SUCCESS(f"Trimmed {deleted} inbox entries."))
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.3 on 2026-10-18 04:36
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_like_counts(apps, schema_editor):
+    Room = apps.get_model('activities', 'Room')
+    Message = apps.get_model('activities', 'Message')
+    RoomLike = apps.get_model('activities', 'RoomLike')
+    MessageLike = apps.get_model('activities', 'MessageLike')
+
+    room_likes = (
+        RoomLike.objects.filter(room=OuterRef('pk'))
+        .order_by().values('room').annotate(total=Count('id')).values('total')
+    )
+    message_likes = (
+        MessageLike.objects.filter(message=OuterRef('pk'))
+        .order_by().values('message').annotate(total=Count('id')).values('total')
+    )
+    Room.objects.update(like_count=Coalesce(Subquery(room_likes), 0))
+    Message.objects.update(like_count=Coalesce(Subquery(message_likes), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0003_messagelike_roomlike'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_like_counts, migrations.RunPython.noop),
+    ]
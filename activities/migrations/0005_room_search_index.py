@@ -0,0 +1,42 @@
+# Generated by Django 5.2.3 on 2026-10-18 04:39
+
+import activities.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+from activities.search import drop_room_fts, install_room_fts
+
+
+def create_fts_index(apps, schema_editor):
+    install_room_fts(schema_editor.connection)
+
+
+def drop_fts_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        drop_room_fts(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0004_room_like_count_message_like_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomSearchIndex',
+            fields=[
+                ('room', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_index', serialize=False, to='activities.room')),
+                ('name', models.TextField()),
+                ('description', models.TextField()),
+                ('topic', models.TextField()),
+                ('document', activities.models.FullTextDocumentField(db_column='activities_room_fts')),
+                ('rank', models.FloatField()),
+            ],
+            options={
+                'db_table': 'activities_room_fts',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_fts_index, drop_fts_index),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-18 04:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0005_room_search_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['created', 'id'], name='message_created_id_idx'),
+        ),
+    ]
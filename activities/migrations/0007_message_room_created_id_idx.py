@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-18 04:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0006_message_created_id_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['room', 'created', 'id'], name='message_room_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.3 on 2026-10-18 05:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0008_page_validator_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RelatedRoom',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveSmallIntegerField()),
+                ('score', models.FloatField()),
+                ('computed', models.DateTimeField()),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommended_in', to='activities.room')),
+                ('room', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='activities.room')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('room', 'rank'), name='relatedroom_room_rank_uniq')],
+            },
+        ),
+    ]
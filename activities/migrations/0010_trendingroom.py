@@ -0,0 +1,25 @@
+# Generated by Django 5.2.3 on 2026-10-18 05:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0009_relatedroom'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingRoom',
+            fields=[
+                ('room', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='trend', serialize=False, to='activities.room')),
+                ('score', models.FloatField()),
+                ('computed', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-score'], name='trendingroom_score_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.3 on 2026-10-18 05:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0010_trendingroom'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['user', 'created', 'id'], name='message_user_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='messagelike',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='msglike_user_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='room',
+            index=models.Index(fields=['host', 'created', 'id'], name='room_host_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='roomlike',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='roomlike_user_created_idx'),
+        ),
+    ]
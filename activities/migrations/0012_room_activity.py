@@ -0,0 +1,79 @@
+# Generated by Django 5.2.3 on 2026-10-18 05:31
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from activities.search import drop_room_fts_triggers, install_room_fts
+
+
+def drop_fts_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        drop_room_fts_triggers(schema_editor.connection)
+
+
+def install_fts_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        install_room_fts(schema_editor.connection)
+
+
+def backfill_room_activity(apps, schema_editor):
+    Room = apps.get_model('activities', 'Room')
+    Message = apps.get_model('activities', 'Message')
+    Participant = Room.participants.through
+
+    messages = (
+        Message.objects.filter(room=OuterRef('pk'))
+        .order_by().values('room').annotate(total=Count('id')).values('total')
+    )
+    participants = (
+        Participant.objects.filter(room=OuterRef('pk'))
+        .order_by().values('room').annotate(total=Count('id')).values('total')
+    )
+    latest = Message.objects.filter(room=OuterRef('pk')).order_by('-created', '-id')
+    Room.objects.update(
+        message_count=Coalesce(Subquery(messages), 0),
+        participant_count=Coalesce(Subquery(participants), 0),
+        last_message_at=Subquery(latest.values('created')[:1]),
+        last_message_id=Subquery(latest.values('id')[:1]),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0011_profile_list_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # Rooms are remade below; the FTS triggers go back on afterwards
+        migrations.RunPython(drop_fts_triggers, install_fts_triggers),
+        migrations.AddField(
+            model_name='room',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='last_message_id',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='message_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='participant_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='room',
+            index=models.Index(fields=['last_message_at', 'id'], name='room_last_message_at_id_idx'),
+        ),
+        migrations.RunPython(backfill_room_activity, migrations.RunPython.noop),
+        migrations.RunPython(install_fts_triggers, drop_fts_triggers),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.3 on 2026-10-18 05:52
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0013_inboxentry'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='message',
+            name='message_updated_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='message',
+            name='message_room_updated_idx',
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.3 on 2026-10-18 06:28
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0014_drop_message_updated_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['updated', 'id'], name='message_updated_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='messagelike',
+            index=models.Index(fields=['created_at', 'id'], name='msglike_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='roomlike',
+            index=models.Index(fields=['created_at', 'id'], name='roomlike_created_id_idx'),
+        ),
+    ]
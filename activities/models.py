@@ -1,6 +1,9 @@
 from django.db import models
+from django.db.models import BooleanField, Exists, F, OuterRef, Q, Value
 from django.contrib.auth.models import User
 
+from .search import fts_available, match_expression
+
 # Create your models here.
 
 class Topic(models.Model):
@@ -13,30 +16,149 @@ class Topic(models.Model):
     def __str__(self):
         return self.name
     
+class RoomQuerySet(models.QuerySet):
+    def for_feed(self):
+        # Everything a room card in feed_component.html touches
+        return self.select_related('host__profile', 'topic')
+
+    def with_like_state(self, user):
+        """Annotate ``is_liked`` for ``user`` on just the rows being fetched."""
+        if not user.is_authenticated:
+            return self.annotate(is_liked=Value(False, output_field=BooleanField()))
+        return self.annotate(is_liked=Exists(RoomLike.objects.filter(user=user, room=OuterRef('pk'))))
+
+    def by_activity(self):
+        # Rooms without messages sort last, newest first
+        return self.order_by(F('last_message_at').desc(nulls_last=True), '-id')
+
+    def search(self, q):
+        """
+        Full-text search over name, description and topic, best matches
+        first. Falls back to icontains scans where FTS5 isn't available.
+        """
+        if not q:
+            return self
+        match = match_expression(q)
+        if match and fts_available(self.db):
+            return self.search_fulltext(match)
+        return self.search_icontains(q)
+
+    def search_fulltext(self, match):
+        return self.filter(search_index__document__match=match).order_by('search_index__rank')
+
+    def search_icontains(self, q):
+        return self.filter(
+            Q(topic__name__icontains=q) |
+            Q(name__icontains=q) |
+            Q(description__icontains=q)
+        )
+
+
 class Room(models.Model):
     host = models.ForeignKey(User, on_delete=models.SET_NULL, null=True)
     topic = models.ForeignKey(Topic, on_delete=models.SET_NULL, null=True)
     name = models.CharField(max_length=200)
     description = models.TextField(null=True, blank=True)
     participants = models.ManyToManyField(User, related_name='participants', blank=True)
+    # Denormalized RoomLike count, kept in sync by activities.likes
+    like_count = models.PositiveIntegerField(default=0)
+    # Denormalized activity, kept in sync by activities.roomstats. last_message_id
+    # is a plain column: a ForeignKey back to Message would make every message
+    # delete update rooms as well
+    message_count = models.PositiveIntegerField(default=0, editable=False)
+    participant_count = models.PositiveIntegerField(default=0, editable=False)
+    last_message_at = models.DateTimeField(null=True, blank=True, editable=False)
+    last_message_id = models.BigIntegerField(null=True, blank=True, editable=False)
     updated = models.DateTimeField(auto_now=True)
     created = models.DateTimeField(auto_now_add=True)
 
+    objects = RoomQuerySet.as_manager()
+
     class Meta:
         ordering = ['-updated', '-created']
+        indexes = [
+            # Rooms edited since the last related-rooms build, and the default ordering
+            models.Index(fields=['updated'], name='room_updated_idx'),
+            # Keyset pagination of a host's rooms on the profile page
+            models.Index(fields=['host', 'created', 'id'], name='room_host_created_id_idx'),
+            # Most recently active rooms first, see RoomQuerySet.by_activity
+            models.Index(fields=['last_message_at', 'id'], name='room_last_message_at_id_idx'),
+        ]
 
     def __str__(self):
         return self.name
     
+class FullTextMatch(models.Lookup):
+    lookup_name = 'match'
+
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+class FullTextDocumentField(models.TextField):
+    """FTS5's hidden column named after its table, used as the MATCH target."""
+
+
+FullTextDocumentField.register_lookup(FullTextMatch)
+
+
+class RoomSearchIndex(models.Model):
+    # Read-only view of the FTS5 table managed by activities.search
+    room = models.OneToOneField(
+        Room, primary_key=True, db_column='rowid', on_delete=models.DO_NOTHING,
+        db_constraint=False, related_name='search_index',
+    )
+    name = models.TextField()
+    description = models.TextField()
+    topic = models.TextField()
+    document = FullTextDocumentField(db_column='activities_room_fts')
+    rank = models.FloatField()
+
+    class Meta:
+        managed = False
+        db_table = 'activities_room_fts'
+
+
+class MessageQuerySet(models.QuerySet):
+    def for_activity(self):
+        # Everything activity_component.html touches for each message
+        return self.select_related('user', 'room__topic')
+
+    def for_room(self):
+        return self.select_related('user')
+
+    def with_like_state(self, user):
+        """Annotate ``is_liked`` for ``user`` on just the rows being fetched."""
+        if not user.is_authenticated:
+            return self.annotate(is_liked=Value(False, output_field=BooleanField()))
+        return self.annotate(is_liked=Exists(MessageLike.objects.filter(user=user, message=OuterRef('pk'))))
+
+
 class Message(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     room = models.ForeignKey(Room, on_delete=models.CASCADE)
     body = models.TextField()
+    # Denormalized MessageLike count, kept in sync by activities.likes
+    like_count = models.PositiveIntegerField(default=0)
     updated = models.DateTimeField(auto_now=True)
     created = models.DateTimeField(auto_now_add=True)
 
+    objects = MessageQuerySet.as_manager()
+
     class Meta:
         ordering = ['-updated', '-created']
+        indexes = [
+            # Keyset pagination of the activity stream, see activities.pagination
+            models.Index(fields=['created', 'id'], name='message_created_id_idx'),
+            # Keyset pagination inside a room
+            models.Index(fields=['room', 'created', 'id'], name='message_room_created_id_idx'),
+            # Keyset pagination of a user's messages on the profile page
+            models.Index(fields=['user', 'created', 'id'], name='message_user_created_id_idx'),
+            # Watermark of incremental exports, see activities.exports
+            models.Index(fields=['updated', 'id'], name='message_updated_id_idx'),
+        ]
 
     def __str__(self):
         return self.body[0:50]
@@ -48,6 +170,12 @@ class RoomLike(models.Model):
 
     class Meta:
         unique_together = ('user', 'room')
+        indexes = [
+            # Keyset pagination of a user's likes on the profile page
+            models.Index(fields=['user', 'created_at', 'id'], name='roomlike_user_created_idx'),
+            # Watermark of incremental exports, see activities.exports
+            models.Index(fields=['created_at', 'id'], name='roomlike_created_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} likes {self.room.name}"
@@ -59,6 +187,61 @@ class MessageLike(models.Model):
 
     class Meta:
         unique_together = ('user', 'message')
+        indexes = [
+            models.Index(fields=['user', 'created_at', 'id'], name='msglike_user_created_id_idx'),
+            models.Index(fields=['created_at', 'id'], name='msglike_created_id_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} likes message {self.message.id}"
+
+
+class RelatedRoom(models.Model):
+    """Top neighbours of each room, written by activities.recommendations."""
+    # The (room, rank) constraint below serves lookups by room
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='recommendations', db_index=False)
+    related = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='recommended_in')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+    computed = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['room', 'rank'], name='relatedroom_room_rank_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.room_id} -> {self.related_id} ({self.score:.3f})"
+
+
+class TrendingRoom(models.Model):
+    """Time-decayed activity score of recently active rooms, written by activities.trending."""
+    room = models.OneToOneField(Room, on_delete=models.CASCADE, primary_key=True, related_name='trend')
+    score = models.FloatField()
+    computed = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            # Top-N for home(?sort=trending)
+            models.Index(fields=['-score'], name='trendingroom_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.room_id}: {self.score:.3f}"
+
+
+class InboxEntry(models.Model):
+    """A message posted in a room the user follows, fanned out by activities.inbox."""
+    # The (user, created, message) constraint below serves reads by user
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='inbox', db_index=False)
+    message = models.ForeignKey(Message, on_delete=models.CASCADE, related_name='+')
+    # Copy of message.created, so a feed page is one range of the constraint's index
+    created = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'created', 'message'], name='inbox_user_created_message_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} <- message {self.message_id}"
@@ -0,0 +1,70 @@
+import base64
+import binascii
+from datetime import datetime
+
+from django.core.exceptions import BadRequest
+from django.db.models import Q
+
+
+class CursorPage:
+    """
+    One page of a keyset-paginated queryset. There is no total count and no
+    previous page: ``next_cursor`` is an opaque token for the rows after the
+    last one shown, or ``None`` on the last page.
+    """
+
+    def __init__(self, object_list, next_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __bool__(self):
+        return bool(self.object_list)
+
+
+def encode_cursor(value, pk):
+    raw = f'{value.isoformat()}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        value, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(value), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise BadRequest('Invalid cursor.')
+
+
+def after_cursor(cursor, field='created', pk_field='id'):
+    """Filter for the rows after ``cursor`` in ``(-field, -pk_field)`` order."""
+    value, pk = decode_cursor(cursor)
+    return Q(**{f'{field}__lte': value}) & (Q(**{f'{field}__lt': value}) | Q(**{f'{pk_field}__lt': pk}))
+
+
+def paginate_by_cursor(queryset, cursor=None, per_page=10, field='created'):
+    """
+    Return the page of ``queryset`` after ``cursor``, newest first, keyed on
+    ``(field, id)`` so ties on the timestamp never skip or repeat rows. Each
+    page is a single indexed range scan, however deep the client has scrolled.
+    """
+    queryset = queryset.order_by(f'-{field}', '-id')
+    if cursor:
+        queryset = queryset.filter(after_cursor(cursor, field))
+
+    rows = list(queryset[:per_page + 1])
+    next_cursor = None
+    if len(rows) > per_page:
+        rows = rows[:per_page]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, field), last.pk)
+    return CursorPage(rows, next_cursor)
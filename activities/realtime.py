@@ -0,0 +1,197 @@
+"""
+Live room updates.
+
+Writes publish small events on a per-room channel once their transaction
+commits; ``views.room_events`` streams them to everyone viewing the room as
+Server-Sent Events. Events only say what changed (``message`` with an id,
+``message-deleted``, like counts); the page fetches any HTML it needs through
+the existing endpoints, so nothing user-specific goes over the channel.
+
+The broker is picked with ``ACTIVITIES_PUBSUB_BACKEND``. ``LocalBroker``
+reaches the clients connected to the same process, which is all a single
+ASGI worker needs; ``RedisBroker`` fans out across processes.
+"""
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+# Events a slow client may fall behind by before it is told to resync
+QUEUE_SIZE = 100
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT = 15
+# Reconnect delay suggested to EventSource, in milliseconds
+RETRY = 5000
+
+
+class Subscription:
+    """
+    A listener's queue, bound to the event loop reading it. Brokers hand these
+    out from ``listen()``; use them as ``async with`` blocks.
+    """
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+        self.overflowed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        pass
+
+    def deliver(self, message):
+        """Hand ``message`` over from any thread."""
+        try:
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:
+            # The loop is gone: the client disconnected mid-publish
+            pass
+
+    def _put(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout=None):
+        return await asyncio.wait_for(self.queue.get(), timeout)
+
+
+class LocalSubscription(Subscription):
+    def __init__(self, broker, channel):
+        super().__init__()
+        self.broker = broker
+        self.channel = channel
+
+    async def __aenter__(self):
+        with self.broker._lock:
+            self.broker._channels.setdefault(self.channel, set()).add(self)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        with self.broker._lock:
+            subscriptions = self.broker._channels.get(self.channel, set())
+            subscriptions.discard(self)
+            if not subscriptions:
+                self.broker._channels.pop(self.channel, None)
+
+
+class LocalBroker:
+    """In-process fan-out; also the stand-in for Redis in tests."""
+
+    def __init__(self, **options):
+        self._lock = threading.Lock()
+        self._channels = {}
+
+    def publish(self, channel, message):
+        with self._lock:
+            subscriptions = list(self._channels.get(channel, ()))
+        for subscription in subscriptions:
+            subscription.deliver(message)
+
+    def listen(self, channel):
+        return LocalSubscription(self, channel)
+
+
+class RedisSubscription(Subscription):
+    def __init__(self, broker, channel):
+        super().__init__()
+        self.broker = broker
+        self.channel = channel
+
+    async def __aenter__(self):
+        from redis import asyncio as aioredis
+
+        self.client = aioredis.Redis.from_url(self.broker.url)
+        self.pubsub = self.client.pubsub()
+        await self.pubsub.subscribe(self.channel)
+        self.task = asyncio.create_task(self.pump())
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.task.cancel()
+        await self.pubsub.aclose()
+        await self.client.aclose()
+
+    async def pump(self):
+        async for item in self.pubsub.listen():
+            if item['type'] == 'message':
+                self._put(json.loads(item['data']))
+
+
+class RedisBroker:
+    """Fan-out across processes through Redis pub/sub. Needs the ``redis`` package."""
+
+    def __init__(self, url='redis://localhost:6379/0', prefix='activities'):
+        try:
+            import redis
+        except ImportError:
+            raise ImproperlyConfigured('RedisBroker requires the "redis" package.')
+        self.url = url
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+
+    def publish(self, channel, message):
+        self._client.publish(f'{self.prefix}:{channel}', json.dumps(message))
+
+    def listen(self, channel):
+        return RedisSubscription(self, f'{self.prefix}:{channel}')
+
+
+_broker = None
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        backend = getattr(settings, 'ACTIVITIES_PUBSUB_BACKEND', 'activities.realtime.LocalBroker')
+        _broker = import_string(backend)(**getattr(settings, 'ACTIVITIES_PUBSUB_OPTIONS', {}))
+    return _broker
+
+
+@receiver(setting_changed)
+def reset_broker(setting, **kwargs):
+    global _broker
+    if setting.startswith('ACTIVITIES_PUBSUB_'):
+        _broker = None
+
+
+def room_channel(room_id):
+    return f'room:{room_id}'
+
+
+def publish_room_event(room_id, event, **data):
+    """Publish ``event`` to the room's viewers once the current transaction commits."""
+    message = {'event': event, **data}
+    # robust: a broker outage must not turn a committed write into a 500
+    transaction.on_commit(lambda: get_broker().publish(room_channel(room_id), message), robust=True)
+
+
+def format_event(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+async def room_event_stream(room_id, heartbeat=HEARTBEAT):
+    """Yield a room's events in the ``text/event-stream`` format until the client goes away."""
+    async with get_broker().listen(room_channel(room_id)) as subscription:
+        yield f'retry: {RETRY}\n\n'
+        while True:
+            try:
+                message = await subscription.get(heartbeat)
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+                continue
+            if subscription.overflowed:
+                # Events were dropped: have the client re-fetch instead of trusting the stream
+                subscription.overflowed = False
+                yield format_event('resync', {})
+            message = dict(message)
+            yield format_event(message.pop('event'), message)
@@ -0,0 +1,258 @@
+"""
+Related rooms, precomputed.
+
+Each room is a sparse vector over users: ``1`` for a participant,
+``LIKE_WEIGHT`` for a like (both add up), damped for people active in many
+rooms so one busy account doesn't tie everything together. Two rooms are as
+similar as the cosine of their vectors, plus ``TOPIC_BONUS`` when they share
+a topic. The rooms-by-rooms product is taken sparsely with NumPy: a
+self-join of the (user, room) entries on user gives every co-occurring pair,
+and the pairs are summed by key, so the cost follows the interactions rather
+than rooms². Rooms with fewer than ``TOP_K`` such neighbours are topped up
+with the most recently updated rooms of their topic, which is what the room
+page used to show. The result lands in ``RelatedRoom``.
+
+``refresh_related_rooms`` only recomputes rooms touched since the last run
+(edited, liked or posted in) and the rooms that share a user with them. It
+only loads the interactions of the people in those rooms, and takes the
+norms of their neighbours from one aggregate query, so its cost follows the
+change rather than the whole table. Unlikes and topic top-ups of untouched
+rooms wait for the next full build.
+"""
+import json
+import math
+
+import numpy as np
+from django.db import connection, transaction
+from django.db.models import F, Max, Q, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+
+from .cache import bump_version
+from .conditional import RELATED
+from .models import Message, RelatedRoom, Room, RoomLike
+
+TOP_K = 5
+LIKE_WEIGHT = 2.0
+TOPIC_BONUS = 0.25
+# People in more rooms than this are left out of the pairs (k² each)
+MAX_ROOMS_PER_USER = 500
+
+
+def _pairs(rows):
+    return np.array(list(rows), dtype=np.int64).reshape(-1, 2)
+
+
+def load_interactions(room_ids=None):
+    """
+    ``(users, rooms, weights)`` arrays, one entry per (user, room). With
+    ``room_ids``, only the people in those rooms, with all their entries so
+    that they are damped as in a full load.
+    """
+    participants = Room.participants.through.objects.all()
+    likes = RoomLike.objects.all()
+    if room_ids is not None:
+        room_ids = list(room_ids)
+        people = (
+            Q(user_id__in=Room.participants.through.objects.filter(room_id__in=room_ids).values('user_id'))
+            | Q(user_id__in=RoomLike.objects.filter(room_id__in=room_ids).values('user_id'))
+        )
+        participants, likes = participants.filter(people), likes.filter(people)
+    participants = _pairs(participants.values_list('user_id', 'room_id'))
+    likes = _pairs(likes.values_list('user_id', 'room_id'))
+    entries = np.concatenate([participants, likes])
+    if not len(entries):
+        return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0)
+
+    # A participant who also liked the room counts once with both weights
+    stride = entries[:, 1].max() + 1
+    keys, inverse = np.unique(entries[:, 0] * stride + entries[:, 1], return_inverse=True)
+    weights = np.bincount(inverse, weights=np.concatenate([np.ones(len(participants)), np.full(len(likes), LIKE_WEIGHT)]))
+    users, rooms = keys // stride, keys % stride
+
+    _, user_index, per_user = np.unique(users, return_inverse=True, return_counts=True)
+    rooms_of_user = per_user[user_index]
+    weights = weights / np.log2(1 + rooms_of_user)
+    keep = rooms_of_user <= MAX_ROOMS_PER_USER
+    return users[keep], rooms[keep], weights[keep]
+
+
+def room_norms(room_ids):
+    """
+    ``{room id: norm}`` of the vectors of ``room_ids``, damped as in
+    ``load_interactions``. Summed in SQLite, so only one row per room comes
+    back however many people the rooms have.
+    """
+    qn = connection.ops.quote_name
+    participants, likes = qn(Room.participants.through._meta.db_table), qn(RoomLike._meta.db_table)
+    ids = json.dumps(list(room_ids))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'WITH people AS ('
+            f'SELECT user_id FROM {participants} WHERE room_id IN (SELECT value FROM json_each(%s)) '
+            f'UNION SELECT user_id FROM {likes} WHERE room_id IN (SELECT value FROM json_each(%s))'
+            f'), entries AS ('
+            f'SELECT user_id, room_id, SUM(weight) AS weight FROM ('
+            f'SELECT user_id, room_id, 1.0 AS weight FROM {participants} WHERE user_id IN (SELECT user_id FROM people) '
+            f'UNION ALL SELECT user_id, room_id, %s FROM {likes} WHERE user_id IN (SELECT user_id FROM people)'
+            f') GROUP BY user_id, room_id'
+            f'), damping AS ('
+            f'SELECT user_id, LN(1 + COUNT(*)) AS log FROM entries GROUP BY user_id HAVING COUNT(*) <= %s'
+            f') '
+            f'SELECT room_id, SUM(weight * weight / (log * log)) FROM entries JOIN damping USING (user_id) '
+            f'WHERE room_id IN (SELECT value FROM json_each(%s)) GROUP BY room_id',
+            [ids, ids, LIKE_WEIGHT, MAX_ROOMS_PER_USER, ids],
+        )
+        # w / log2(1 + n) = w * ln 2 / ln(1 + n)
+        return {room_id: math.sqrt(total) * math.log(2) for room_id, total in cursor.fetchall()}
+
+
+def recent_by_topic(topic_ids, top_k=TOP_K):
+    """``{topic id: [room id, ...]}``, the ``top_k + 1`` most recently updated rooms of each topic."""
+    position = Window(RowNumber(), partition_by=F('topic_id'), order_by=(F('updated').desc(), F('id').desc()))
+    rows = (
+        Room.objects.filter(topic_id__in=list(topic_ids)).annotate(position=position)
+        .filter(position__lte=top_k + 1).order_by('topic_id', 'position').values_list('topic_id', 'id')
+    )
+    recent = {}
+    for topic_id, room_id in rows:
+        recent.setdefault(topic_id, []).append(room_id)
+    return recent
+
+
+def cooccurrence(users, rooms, weights, size, left=None):
+    """
+    Sparse ``AᵀA`` for (user, room, weight) entries, rooms numbered
+    ``0..size-1``: returns ``(a, b, dot)`` for every pair of distinct rooms
+    sharing a user. With ``left``, a boolean mask over the entries, only the
+    rows ``a`` of those entries.
+    """
+    order = np.argsort(users, kind='stable')
+    users, rooms, weights = users[order], rooms[order], weights[order]
+    left = np.arange(len(users)) if left is None else np.flatnonzero(left[order])
+
+    starts = np.flatnonzero(np.r_[True, users[1:] != users[:-1]]) if len(users) else np.empty(0, np.int64)
+    sizes = np.diff(np.r_[starts, len(users)])
+    group_start = np.repeat(starts, sizes)[left]
+    group_size = np.repeat(sizes, sizes)[left]
+
+    # Entry i pairs with every entry of its user's group
+    i = np.repeat(left, group_size)
+    offsets = np.arange(group_size.sum()) - np.repeat(np.cumsum(group_size) - group_size, group_size)
+    j = np.repeat(group_start, group_size) + offsets
+    distinct = i != j
+    i, j = i[distinct], j[distinct]
+
+    keys, inverse = np.unique(rooms[i] * size + rooms[j], return_inverse=True)
+    dots = np.bincount(inverse, weights=weights[i] * weights[j])
+    return keys // size, keys % size, dots
+
+
+def top_neighbours(room_ids, users, rooms, weights, top_k=TOP_K, norms=None):
+    """
+    ``{room id: [(related id, score), ...]}``, best first, for ``room_ids``.
+    The norms come from the entries unless given (``{room id: norm}``), which
+    they must be when the entries only hold the people of ``room_ids``.
+    """
+    rows = Room.objects.order_by('id').values_list('id', 'topic_id')
+    if norms is not None:
+        rows = rows.filter(id__in=set(rooms.tolist()) | set(room_ids))
+    ids, topics = [], []
+    for room_id, topic_id in rows.iterator():
+        ids.append(room_id)
+        topics.append(-1 if topic_id is None else topic_id)
+    ids, topics = np.array(ids, dtype=np.int64), np.array(topics, dtype=np.int64)
+    topic_of = dict(zip(ids.tolist(), topics.tolist()))
+
+    # Number rooms 0..n-1; rooms deleted since the interactions were read drop out
+    known = np.isin(rooms, ids)
+    users, rooms, weights = users[known], np.searchsorted(ids, rooms[known]), weights[known]
+    if norms is None:
+        norms = np.sqrt(np.bincount(rooms, weights=weights ** 2, minlength=len(ids)))
+    else:
+        norms = np.array([norms.get(room_id, 0.0) for room_id in ids.tolist()])
+    targets = np.isin(ids, list(room_ids))
+
+    # Only the people in a target room pair it with anything: leave everyone
+    # else out of the self-join, which an incremental build would otherwise
+    # sort and group over every interaction
+    if not targets.all():
+        touching = np.isin(users, users[targets[rooms]])
+        users, rooms, weights = users[touching], rooms[touching], weights[touching]
+    a, b, dots = cooccurrence(users, rooms, weights, len(ids), left=targets[rooms])
+    scores = dots / (norms[a] * norms[b]) + TOPIC_BONUS * ((topics[a] == topics[b]) & (topics[a] >= 0))
+
+    # Best top_k of each row: sort by room, then score descending
+    order = np.lexsort((-scores, a))
+    a, b, scores = a[order], b[order], scores[order]
+    best = np.arange(len(a)) - np.searchsorted(a, a) < top_k
+
+    neighbours = {room_id: [] for room_id in ids[targets].tolist()}
+    recent = recent_by_topic({topic_of[room_id] for room_id in neighbours} - {-1}, top_k)
+    for room_id, related, score in zip(ids[a[best]].tolist(), ids[b[best]].tolist(), scores[best].tolist()):
+        neighbours[room_id].append((related, score))
+
+    for room_id, chosen in neighbours.items():
+        if len(chosen) < top_k:
+            taken = {related for related, _ in chosen} | {room_id}
+            chosen.extend((related, TOPIC_BONUS) for related in recent.get(topic_of[room_id], []) if related not in taken)
+            # Stable, so on equal scores co-occurrence beats recency
+            chosen.sort(key=lambda pair: -pair[1])
+            del chosen[top_k:]
+    return neighbours
+
+
+def build_related_rooms(room_ids=None, top_k=TOP_K):
+    """
+    Recompute the neighbours of ``room_ids`` and of the rooms sharing a user
+    with them, or of every room. Returns the number of rooms refreshed.
+    """
+    computed = timezone.now()
+    if room_ids is None:
+        users, rooms, weights = load_interactions()
+        targets = set(Room.objects.values_list('id', flat=True))
+        norms = None
+    else:
+        changed = set(Room.objects.filter(id__in=list(room_ids)).values_list('id', flat=True))
+        if not changed:
+            return 0
+        # The rooms of the people in the changed rooms
+        targets = changed | set(load_interactions(changed)[1].tolist())
+        # Scoring them needs their people's entries, and the norms of every room those reach
+        users, rooms, weights = load_interactions(targets)
+        norms = room_norms(set(rooms.tolist()) | targets)
+    if not targets:
+        return 0
+
+    neighbours = top_neighbours(targets, users, rooms, weights, top_k, norms)
+    with transaction.atomic():
+        stale = RelatedRoom.objects.all() if room_ids is None else RelatedRoom.objects.filter(room_id__in=targets)
+        stale.delete()
+        RelatedRoom.objects.bulk_create(
+            (
+                RelatedRoom(room_id=room_id, related_id=related, rank=rank, score=score, computed=computed)
+                for room_id, chosen in neighbours.items()
+                for rank, (related, score) in enumerate(chosen)
+            ),
+            batch_size=5000,
+        )
+    bump_version(RELATED)
+    return len(targets)
+
+
+def changed_rooms(since):
+    """Rooms edited, liked or posted in (which is how people join) since ``since``."""
+    return (
+        set(Room.objects.filter(updated__gte=since).values_list('id', flat=True))
+        | set(RoomLike.objects.filter(created_at__gte=since).values_list('room_id', flat=True))
+        | set(Message.objects.filter(created__gte=since).values_list('room_id', flat=True))
+    )
+
+
+def refresh_related_rooms(top_k=TOP_K):
+    """Incremental build from the last run; a full one when there is none."""
+    since = RelatedRoom.objects.aggregate(last=Max('computed'))['last']
+    if since is None:
+        return build_related_rooms(top_k=top_k)
+    changed = changed_rooms(since)
+    return build_related_rooms(changed, top_k) if changed else 0
@@ -0,0 +1,42 @@
+"""
+Denormalized room activity: ``Room.message_count``, ``participant_count``,
+``last_message_at`` and ``last_message_id``.
+
+Posting a message and joining a room bump the counters in place (see
+activities.signals), inside the transaction that writes the message or the
+participant row. Deletions and participant removals recount the rooms
+involved. ``recount_room_activity`` rebuilds everything from the message and
+participant tables.
+"""
+from django.db.models import BigIntegerField, Case, F, OuterRef, Q, Subquery, Value, When
+
+from .aggregates import count_per
+from .models import Message, Room
+
+
+def recount_room_activity(room_ids=None):
+    """Recompute the activity fields of ``room_ids``, or of every room. Returns the number of rooms."""
+    rooms = Room.objects.all() if room_ids is None else Room.objects.filter(pk__in=room_ids)
+    latest = Message.objects.filter(room=OuterRef('pk')).order_by('-created', '-id')
+    return rooms.update(
+        message_count=count_per(Message.objects, 'room'),
+        participant_count=count_per(Room.participants.through.objects, 'room'),
+        last_message_at=Subquery(latest.values('created')[:1]),
+        last_message_id=Subquery(latest.values('id')[:1]),
+    )
+
+
+def message_posted(message):
+    # Ids only grow, so a message committed late never replaces a newer one
+    newer = Q(last_message_id__isnull=True) | Q(last_message_id__lt=message.pk)
+    Room.objects.filter(pk=message.room_id).update(
+        message_count=F('message_count') + 1,
+        last_message_at=Case(When(newer, then=Value(message.created)), default=F('last_message_at')),
+        last_message_id=Case(
+            When(newer, then=Value(message.pk)), default=F('last_message_id'), output_field=BigIntegerField(),
+        ),
+    )
+
+
+def participants_added(room_ids, count=1):
+    Room.objects.filter(pk__in=room_ids).update(participant_count=F('participant_count') + count)
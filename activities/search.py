@@ -0,0 +1,136 @@
+import re
+
+from django.db import connections
+
+# FTS5 index over Room.name, Room.description and the room's Topic.name.
+# Its rowid is the room id; SQLite triggers keep it in sync with writes to
+# activities_room and activities_topic, including bulk_create()/update().
+FTS_TABLE = 'activities_room_fts'
+
+# bm25 column weights: name, description, topic
+FTS_RANK = 'bm25(10.0, 2.0, 5.0)'
+
+_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON activities_room BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, description, topic)
+        VALUES (
+            new.id, new.name, COALESCE(new.description, ''),
+            COALESCE((SELECT name FROM activities_topic WHERE id = new.topic_id), '')
+        );
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, description, topic_id ON activities_room
+    WHEN old.name IS NOT new.name OR old.description IS NOT new.description OR old.topic_id IS NOT new.topic_id
+    BEGIN
+        UPDATE {FTS_TABLE} SET
+            name = new.name,
+            description = COALESCE(new.description, ''),
+            topic = COALESCE((SELECT name FROM activities_topic WHERE id = new.topic_id), '')
+        WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON activities_room BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_topic_au AFTER UPDATE OF name ON activities_topic
+    WHEN old.name IS NOT new.name
+    BEGIN
+        UPDATE {FTS_TABLE} SET topic = new.name
+        WHERE rowid IN (SELECT id FROM activities_room WHERE topic_id = new.id);
+    END
+    """,
+]
+
+_POPULATE = f"""
+    INSERT INTO {FTS_TABLE}(rowid, name, description, topic)
+    SELECT r.id, r.name, COALESCE(r.description, ''), COALESCE(t.name, '')
+    FROM activities_room r LEFT JOIN activities_topic t ON t.id = r.topic_id
+"""
+
+_available = {}
+
+
+def supports_fts(connection):
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        if cursor.fetchone()[0]:
+            return True
+        # Some builds ship FTS5 without advertising the compile option.
+        try:
+            cursor.execute('CREATE VIRTUAL TABLE temp.fts5_probe USING fts5(x)')
+            cursor.execute('DROP TABLE temp.fts5_probe')
+        except Exception:
+            return False
+    return True
+
+
+def fts_table_exists(connection):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+        return cursor.fetchone() is not None
+
+
+def install_room_fts(connection):
+    """Create and populate the FTS index if missing, and (re)create its triggers."""
+    if not supports_fts(connection):
+        return False
+    with connection.cursor() as cursor:
+        if not fts_table_exists(connection):
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                "name, description, topic, tokenize = 'unicode61 remove_diacritics 2')"
+            )
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rank) VALUES ('rank', %s)", [FTS_RANK])
+            cursor.execute(_POPULATE)
+        # SQLite drops triggers whenever a later migration remakes
+        # activities_room, so this is also run after every migrate.
+        for trigger in _TRIGGERS:
+            cursor.execute(trigger)
+    _available.pop(connection.alias, None)
+    return True
+
+
+def drop_room_fts_triggers(connection):
+    # The activities_topic trigger names activities_room, which makes SQLite
+    # refuse the table swap of a migration that remakes activities_room
+    with connection.cursor() as cursor:
+        for suffix in ('ai', 'au', 'ad', 'topic_au'):
+            cursor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}')
+
+
+def drop_room_fts(connection):
+    drop_room_fts_triggers(connection)
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+    _available.pop(connection.alias, None)
+
+
+def rebuild_room_fts(connection):
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE}')
+        cursor.execute(_POPULATE)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+
+
+def fts_available(using='default'):
+    if using not in _available:
+        connection = connections[using]
+        _available[using] = connection.vendor == 'sqlite' and fts_table_exists(connection)
+    return _available[using]
+
+
+def match_expression(q):
+    """
+    Turn free-text input into an FTS5 query: every word must match as a
+    prefix, so "pyth dj" finds "Python and Django". Quoting each token keeps
+    user input from being parsed as FTS5 syntax.
+    """
+    tokens = re.findall(r'\w+', q)
+    return ' '.join(f'"{token}"*' for token in tokens)
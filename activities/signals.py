@@ -0,0 +1,169 @@
+from django.contrib.auth.models import User
+from django.db import connections
+from django.db.models.fields.files import FieldFile
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from users.models import UserProfile
+
+from .cache import bump_version
+from .conditional import FEED, ROOMS, room_namespace
+from .inbox import fan_out
+from .likebuffer import likes_flushed
+from .models import Message, MessageLike, Room, RoomLike, Topic
+from .realtime import publish_room_event
+from .roomstats import message_posted, participants_added, recount_room_activity
+from .search import fts_table_exists, install_room_fts
+
+
+def ensure_room_fts(sender, using, **kwargs):
+    connection = connections[using]
+    if connection.vendor == 'sqlite' and fts_table_exists(connection):
+        install_room_fts(connection)
+
+
+# Sidebar caches (see templatetags.activity_tags). Topic names show up in
+# both the topics list and the activity stream; room names only in the latter.
+
+@receiver([post_save, post_delete], sender=Topic)
+def invalidate_topics(sender, **kwargs):
+    bump_version('topics')
+    bump_version('activity')
+
+
+@receiver([post_save, post_delete], sender=Room)
+@receiver([post_save, post_delete], sender=Message)
+def invalidate_activity(sender, **kwargs):
+    bump_version('activity')
+
+
+# Page validators (see activities.conditional). Message creates and deletes
+# show up in the room row's last_message_id and message_count.
+
+@receiver([post_save, post_delete], sender=Room)
+def invalidate_rooms(sender, **kwargs):
+    bump_version(ROOMS)
+
+
+# Usernames and photos show up on every page's room cards, messages and
+# activity. Saves that only touch other columns (last_login on every login)
+# are skipped without a query.
+
+def _changed(sender, instance, field, update_fields):
+    if update_fields is not None and field not in update_fields:
+        return False
+    value = getattr(instance, field)
+    if isinstance(value, FieldFile):
+        if value and not value._committed:
+            return True
+        value = value.name or ''
+    if instance._state.adding:
+        return bool(value)
+    return sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first() != value
+
+
+@receiver(pre_save, sender=User)
+def check_username(sender, instance, update_fields=None, raw=False, **kwargs):
+    # Nobody has seen a new user's name yet
+    instance._shown_changed = not raw and not instance._state.adding and _changed(sender, instance, 'username', update_fields)
+
+
+@receiver(pre_save, sender=UserProfile)
+def check_photo(sender, instance, update_fields=None, raw=False, **kwargs):
+    instance._shown_changed = not raw and _changed(sender, instance, 'photo', update_fields)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=UserProfile)
+def invalidate_people(sender, instance, **kwargs):
+    if getattr(instance, '_shown_changed', False):
+        instance._shown_changed = False
+        for namespace in (ROOMS, FEED, 'activity'):
+            bump_version(namespace)
+
+
+@receiver(likes_flushed)
+def invalidate_flushed_likes(sender, target_ids, **kwargs):
+    if sender is RoomLike:
+        bump_version(FEED)
+        rooms = target_ids
+    else:
+        rooms = set(Message.objects.filter(pk__in=target_ids).values_list('room_id', flat=True))
+    for room_id in rooms:
+        bump_version(room_namespace(room_id))
+
+
+# Live room updates (see activities.realtime)
+
+@receiver(post_save, sender=Message)
+def announce_message(sender, instance, created, **kwargs):
+    if created:
+        publish_room_event(instance.room_id, 'message', id=instance.id)
+
+
+@receiver(post_delete, sender=Message)
+def announce_message_deleted(sender, instance, **kwargs):
+    publish_room_event(instance.room_id, 'message-deleted', id=instance.id)
+
+
+@receiver(post_delete, sender=Room)
+def announce_room_deleted(sender, instance, **kwargs):
+    publish_room_event(instance.id, 'room-deleted')
+
+
+# Room activity counters (see activities.roomstats)
+
+@receiver(post_save, sender=Message)
+def count_room_message(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        message_posted(instance)
+
+
+@receiver(post_delete, sender=Message)
+def recount_room_messages(sender, instance, origin=None, **kwargs):
+    # Nothing to count in a room being deleted; a user deletion recounts its rooms at once
+    if not isinstance(origin, (Room, User)):
+        recount_room_activity([instance.room_id])
+
+
+@receiver(m2m_changed, sender=Room.participants.through)
+def count_participants(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear' and reverse:
+        instance._cleared_rooms = set(sender.objects.filter(user=instance).values_list('room_id', flat=True))
+        return
+    if action == 'post_add' and pk_set:
+        # pk_set only holds the rows actually inserted
+        rooms = pk_set if reverse else [instance.pk]
+        participants_added(rooms, 1 if reverse else len(pk_set))
+    elif action in ('post_remove', 'post_clear'):
+        rooms = [instance.pk] if not reverse else (pk_set if action == 'post_remove' else instance._cleared_rooms)
+        recount_room_activity(rooms)
+    else:
+        return
+    bump_version(FEED)
+    for room_id in rooms:
+        bump_version(room_namespace(room_id))
+
+
+@receiver(pre_delete, sender=User)
+def collect_user_rooms(sender, instance, **kwargs):
+    # Their messages and participant rows go with them, without signals of their own
+    instance._activity_rooms = (
+        set(Message.objects.filter(user=instance).values_list('room_id', flat=True))
+        | set(Room.participants.through.objects.filter(user=instance).values_list('room_id', flat=True))
+    )
+
+
+@receiver(post_delete, sender=User)
+def recount_user_rooms(sender, instance, **kwargs):
+    rooms = getattr(instance, '_activity_rooms', set())
+    if rooms:
+        recount_room_activity(rooms)
+
+
+# Per-user inboxes (see activities.inbox), written with the message
+
+@receiver(post_save, sender=Message)
+def fan_out_message(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        fan_out(instance)
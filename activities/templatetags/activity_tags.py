@@ -1,18 +1,42 @@
 from django import template
+from django.template.loader import render_to_string
+from activities.cache import get_or_compute
 from activities.models import Topic, Message
 
 register = template.Library()
 
-@register.inclusion_tag('activities/topics_component.html')
-def topics_list():
-    topics = Topic.objects.all()
-    return {'topics': topics}
+# Cache namespaces, bumped from activities.signals when the data changes
+TOPICS = ('topics',)
+ACTIVITY = ('activity',)
 
-@register.inclusion_tag('activities/activity_component.html')
-def recent_activity():
-    messages = Message.objects.all()[:5]
-    return {'messages': messages}
+
+def topics():
+    return get_or_compute('topics', TOPICS, lambda: list(Topic.objects.all()))
+
+
+def recent_messages(limit=5):
+    return get_or_compute('recent-messages', ACTIVITY, lambda: list(Message.objects.for_activity()[:limit]), limit)
+
+
+@register.simple_tag(takes_context=True)
+def topics_list(context):
+    request = context.get('request')
+    render = lambda: render_to_string('activities/topics_component.html', {'topics': topics()}, request=request)
+    # Updated: ?q= is free text, so a key per value would let anyone fill the
+    # cache; searches render from the cached topics instead
+    if request and request.GET.get('q'):
+        return render()
+    # The unfiltered fragment only varies with login state
+    return get_or_compute('topics-html', TOPICS, render, bool(request and request.user.is_authenticated))
+
+
+@register.simple_tag(takes_context=True)
+def recent_activity(context, limit=5):
+    request = context.get('request')
+    # Updated: rendered from the cached rows on every request, since the
+    # fragment shows how long ago each message was posted
+    return render_to_string('activities/activity_component.html', {'messages': recent_messages(limit)}, request=request)
 
 @register.filter
 def model_name(obj):
-    return obj.__class__.__name__
\ No newline at end of file
+    return obj.__class__.__name__
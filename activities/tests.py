@@ -1,3 +1,1340 @@
-from django.test import TestCase
+import asyncio
+import csv
+import gzip
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import iscoroutinefunction, sync_to_async
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, router
+from django.db.models import QuerySet
+from django.http import Http404, HttpResponse
+from django.template import Context, Template
+from django.test import AsyncClient, RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from connection.routers import STICKY_COOKIE, ReplicaMiddleware
+from connection.staticfiles import serve as serve_static
+from users.models import UserProfile, UserStats
+
+from . import likebuffer
+from .cache import bump_version, get_or_compute
+from .checks import like_buffer_cache
+from .management.commands.sync_replicas import copy_sqlite
+from .inbox import build_inboxes, read_inbox, trim_inboxes
+from .models import InboxEntry, Message, MessageLike, RelatedRoom, Room, RoomLike, Topic, TrendingRoom
+from .pagination import paginate_by_cursor
+from .realtime import LocalBroker, get_broker, room_channel
+from .recommendations import build_related_rooms, cooccurrence, load_interactions, refresh_related_rooms, room_norms
+from .roomstats import recount_room_activity
+from .trending import HALF_LIFE, LIKE_WEIGHT, MESSAGE_WEIGHT, PARTICIPANT_WEIGHT, WINDOW, build_trending
+from .templatetags.activity_tags import recent_messages
+
+
+class LikeCounterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='pass12345')
+        self.topic = Topic.objects.create(name='Python')
+        self.room = Room.objects.create(host=self.user, topic=self.topic, name='Django')
+        self.message = Message.objects.create(user=self.user, room=self.room, body='Hello')
+        self.client.force_login(self.user)
+
+    def test_like_room_toggles_counter(self):
+        response = self.client.post(reverse('like-room', args=[self.room.id]))
+        self.assertEqual(response.json(), {'liked': True, 'like_count': 1})
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.like_count, 1)
+
+        response = self.client.post(reverse('like-room', args=[self.room.id]))
+        self.assertEqual(response.json(), {'liked': False, 'like_count': 0})
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.like_count, 0)
+        self.assertFalse(RoomLike.objects.exists())
+
+    def test_like_message_toggles_counter(self):
+        response = self.client.post(reverse('like-message', args=[self.message.id]))
+        self.assertEqual(response.json(), {'liked': True, 'like_count': 1})
+        self.message.refresh_from_db()
+        self.assertEqual(self.message.like_count, 1)
+
+    def toggle_statements(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url)
+        return response, [
+            q['sql'] for q in queries
+            if q['sql'].startswith(('INSERT INTO "activities_', 'DELETE FROM "activities_', 'UPDATE "activities_'))
+        ]
+
+    def test_toggle_is_three_statements_without_reads(self):
+        response, statements = self.toggle_statements(reverse('like-room', args=[self.room.id]))
+        self.assertEqual(response.json(), {'liked': True, 'like_count': 1})
+        self.assertEqual([sql.split()[0] for sql in statements], ['DELETE', 'INSERT', 'UPDATE'])
+        self.assertIn('RETURNING', statements[-1])
+
+        response, statements = self.toggle_statements(reverse('like-room', args=[self.room.id]))
+        self.assertEqual(response.json(), {'liked': False, 'like_count': 0})
+        self.assertEqual([sql.split()[0] for sql in statements], ['DELETE', 'UPDATE'])
+
+    def test_toggle_without_returning_support(self):
+        with mock.patch('activities.likes.supports_returning', return_value=False):
+            response = self.client.post(reverse('like-message', args=[self.message.id]))
+            self.assertEqual(response.json(), {'liked': True, 'like_count': 1})
+            response = self.client.post(reverse('like-message', args=[self.message.id]))
+            self.assertEqual(response.json(), {'liked': False, 'like_count': 0})
+            self.assertEqual(self.client.post(reverse('like-message', args=[999])).status_code, 404)
+
+    def test_like_missing_target(self):
+        self.assertEqual(self.client.post(reverse('like-room', args=[999])).status_code, 404)
+        self.assertEqual(self.client.post(reverse('like-message', args=[999])).status_code, 404)
+        self.assertFalse(RoomLike.objects.exists() or MessageLike.objects.exists())
+
+    def test_rebuild_like_counts_fixes_drift(self):
+        other = User.objects.create_user(username='bob', password='pass12345')
+        RoomLike.objects.create(user=self.user, room=self.room)
+        RoomLike.objects.create(user=other, room=self.room)
+        MessageLike.objects.create(user=other, message=self.message)
+        Message.objects.filter(pk=self.message.pk).update(like_count=7)
+
+        out = StringIO()
+        call_command('rebuild_like_counts', '--dry-run', stdout=out)
+        self.assertIn('Found 1 drifted room counters and 1 drifted message counters', out.getvalue())
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.like_count, 0)
+
+        call_command('rebuild_like_counts', stdout=StringIO())
+        self.room.refresh_from_db()
+        self.message.refresh_from_db()
+        self.assertEqual(self.room.like_count, 2)
+        self.assertEqual(self.message.like_count, 1)
+
+        Room.objects.update(like_count=0)
+        call_command('rebuild_like_counts', '--full', stdout=StringIO())
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.like_count, 2)
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Each page must issue the same number of queries no matter how many rows
+    it renders: measure with one row, grow the data, and assert the count
+    stays put.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='pass12345')
+        UserProfile.objects.create(user=self.user, photo='profile_photos/1.jpg')
+        self.room = self.add_room(0)
+        self.client.force_login(self.user)
+
+    def add_room(self, i):
+        host = User.objects.create_user(username=f'host{i}')
+        UserProfile.objects.create(user=host, photo=f'profile_photos/{i}.jpg')
+        topic = Topic.objects.create(name=f'Topic {i}')
+        room = Room.objects.create(host=host, topic=topic, name=f'Room {i}')
+        room.participants.add(host, self.user)
+        message = Message.objects.create(user=host, room=room, body=f'Message {i}')
+        Message.objects.create(user=self.user, room=room, body=f'Reply {i}')
+        RoomLike.objects.create(user=self.user, room=room)
+        MessageLike.objects.create(user=self.user, message=message)
+        return room
+
+    def assertConstantQueries(self, url, grow):
+        self.client.get(url)  # warm per-process caches
+        cache.clear()
+        with CaptureQueriesContext(connection) as baseline:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        grow()
+        cache.clear()
+        with self.assertNumQueries(len(baseline)):
+            self.assertEqual(self.client.get(url).status_code, 200)
+
+    def grow_rooms(self):
+        for i in range(1, 6):
+            self.add_room(i)
+
+    def grow_room_messages(self):
+        for i in range(1, 6):
+            host = User.objects.create_user(username=f'poster{i}')
+            Message.objects.create(user=host, room=self.room, body=f'Extra {i}')
+            self.room.participants.add(host)
+
+    def test_home(self):
+        self.assertConstantQueries(reverse('home'), self.grow_rooms)
+
+    def test_home_search(self):
+        self.assertConstantQueries(reverse('home') + '?q=Room', self.grow_rooms)
+
+    def test_room(self):
+        self.assertConstantQueries(reverse('room', args=[self.room.id]), self.grow_room_messages)
+
+    def test_all_activities(self):
+        self.assertConstantQueries(reverse('all-activities'), self.grow_rooms)
+
+    def test_user_profile(self):
+        def grow():
+            for i in range(1, 6):
+                room = self.add_room(i)
+                room.host = self.user
+                room.save()
+        self.assertConstantQueries(reverse('users:user-profile', args=['alice']), grow)
+
+    def test_recent_activity_tag(self):
+        self.grow_rooms()
+        with self.assertNumQueries(1):
+            messages = recent_messages()
+            [(m.user.username, m.room.name, m.room.topic.name) for m in messages]
+
+
+class RoomSearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='pass12345')
+        self.python = Topic.objects.create(name='Python')
+        self.cooking = Topic.objects.create(name='Cooking')
+        self.django = Room.objects.create(host=self.user, topic=self.python, name='Django beginners')
+        self.pasta = Room.objects.create(
+            host=self.user, topic=self.cooking, name='Pasta night', description='Bring your django unchained DVD',
+        )
+        self.bread = Room.objects.create(host=self.user, topic=self.cooking, name='Sourdough')
+
+    def search(self, q):
+        return list(Room.objects.search(q))
+
+    def test_ranks_name_matches_first(self):
+        self.assertEqual(self.search('django'), [self.django, self.pasta])
+
+    def test_prefix_and_topic_matching(self):
+        self.assertCountEqual(self.search('cook'), [self.pasta, self.bread])
+        self.assertEqual(self.search('pyth begin'), [self.django])
+
+    def test_index_follows_writes(self):
+        self.bread.name = 'Rye bread'
+        self.bread.save()
+        self.assertEqual(self.search('rye'), [self.bread])
+        self.assertEqual(self.search('sourdough'), [])
+
+        self.cooking.name = 'Baking'
+        self.cooking.save()
+        self.assertCountEqual(self.search('baking'), [self.pasta, self.bread])
+
+        self.pasta.delete()
+        self.assertEqual(self.search('django'), [self.django])
+
+    def test_user_input_is_not_fts_syntax(self):
+        self.assertEqual(self.search('"django*'), [self.django, self.pasta])
+        self.assertEqual(self.search('django NOT'), [])
+        self.assertEqual(self.search('*'), [])
+
+    def test_icontains_fallback(self):
+        with mock.patch('activities.models.fts_available', return_value=False):
+            self.assertCountEqual(self.search('ough'), [self.bread])
+            self.assertCountEqual(self.search('django'), [self.django, self.pasta])
+
+    def test_rebuild_room_search(self):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM activities_room_fts')
+        self.assertEqual(self.search('django'), [])
+        call_command('rebuild_room_search', stdout=StringIO())
+        self.assertEqual(self.search('django'), [self.django, self.pasta])
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='pass12345')
+        room = Room.objects.create(host=self.user, name='Django')
+        self.messages = [Message.objects.create(user=self.user, room=room, body=f'Message {i}') for i in range(25)]
+        # Half of them share a timestamp, so the id tie-breaker matters
+        Message.objects.filter(id__in=[m.id for m in self.messages[5:18]]).update(created=self.messages[5].created)
+        self.client.force_login(self.user)
+
+    def walk(self, per_page):
+        seen, cursor = [], None
+        while True:
+            page = paginate_by_cursor(Message.objects.all(), cursor, per_page)
+            seen.extend(message.id for message in page)
+            if not page.has_next:
+                return seen
+            cursor = page.next_cursor
+
+    def test_walks_every_row_once_in_order(self):
+        expected = list(Message.objects.order_by('-created', '-id').values_list('id', flat=True))
+        for per_page in (1, 4, 10, 25, 30):
+            self.assertEqual(self.walk(per_page), expected)
+
+    def test_load_more_endpoint(self):
+        response = self.client.get(reverse('all-activities'))
+        cursor = response.context['messages'].next_cursor
+        self.assertEqual(len(response.context['messages']), 10)
+
+        data = self.client.get(reverse('all-activities-more'), {'cursor': cursor}).json()
+        self.assertEqual(data['html'].count('class="message mt-3"'), 10)
+        data = self.client.get(reverse('all-activities-more'), {'cursor': data['next_cursor']}).json()
+        self.assertEqual(data['html'].count('class="message mt-3"'), 5)
+        self.assertIsNone(data['next_cursor'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('all-activities-more'), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+
+class SidebarCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='alice', password='pass12345')
+        self.topic = Topic.objects.create(name='Python')
+        self.room = Room.objects.create(host=self.user, topic=self.topic, name='Django')
+        Message.objects.create(user=self.user, room=self.room, body='Hello')
+        self.request = RequestFactory().get('/')
+        self.request.user = self.user
+
+    def render(self, source):
+        return Template('{% load activity_tags %}' + source).render(Context({'request': self.request}))
+
+    def test_fragments_are_cached(self):
+        topics_html = self.render('{% topics_list %}')
+        activity_html = self.render('{% recent_activity %}')
+        self.assertIn('Python', topics_html)
+        self.assertIn('Hello', activity_html)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.render('{% topics_list %}'), topics_html)
+            self.assertEqual(self.render('{% recent_activity %}'), activity_html)
+
+    def test_searches_are_not_cached(self):
+        self.request = RequestFactory().get('/', {'q': 'Python'})
+        self.request.user = self.user
+        self.assertIn('Python', self.render('{% topics_list %}'))
+        self.assertEqual([key for key in cache._cache if 'topics-html' in key], [])
+
+    def test_activity_times_are_not_cached(self):
+        self.render('{% recent_activity %}')
+        self.assertEqual([key for key in cache._cache if 'recent-activity-html' in key], [])
+        with self.assertNumQueries(0):
+            self.assertIn('Hello', self.render('{% recent_activity %}'))
+
+    def test_writes_invalidate(self):
+        self.render('{% topics_list %}{% recent_activity %}')
+        Topic.objects.create(name='Rust')
+        Message.objects.create(user=self.user, room=self.room, body='Second message')
+        self.assertIn('Rust', self.render('{% topics_list %}'))
+        self.assertIn('Second message', self.render('{% recent_activity %}'))
+
+        self.topic.name = 'Python 3'
+        self.topic.save()
+        self.assertIn('Topic: Python 3', self.render('{% recent_activity %}'))
+
+    def run_concurrently(self, compute, threads=8):
+        results = []
+        workers = [
+            threading.Thread(target=lambda: results.append(get_or_compute('stampede', ('stampede',), compute)))
+            for _ in range(threads)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return results
+
+    def test_only_one_recomputation_after_invalidation(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return len(calls)
+
+        # Cold cache: the others wait for the first computation
+        self.assertEqual(self.run_concurrently(compute), [1] * 8)
+        self.assertEqual(len(calls), 1)
+
+        # After an invalidation the others serve the previous value meanwhile
+        bump_version('stampede')
+        results = self.run_concurrently(compute)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(sorted(set(results)), [1, 2])
+        self.assertEqual(get_or_compute('stampede', ('stampede',), compute), 2)
+
+
+class LikedStateTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='pass12345')
+        self.liked = Room.objects.create(host=self.user, name='Liked')
+        self.other = Room.objects.create(host=self.user, name='Other')
+        self.message = Message.objects.create(user=self.user, room=self.liked, body='Liked message')
+        Message.objects.create(user=self.user, room=self.liked, body='Other message')
+        RoomLike.objects.create(user=self.user, room=self.liked)
+        MessageLike.objects.create(user=self.user, message=self.message)
+
+    def test_home_marks_liked_rooms(self):
+        self.client.force_login(self.user)
+        rooms = {room.name: room.is_liked for room in self.client.get(reverse('home')).context['rooms']}
+        self.assertEqual(rooms, {'Liked': True, 'Other': False})
+
+    def test_room_marks_liked_room_and_messages(self):
+        self.client.force_login(self.user)
+        context = self.client.get(reverse('room', args=[self.liked.id])).context
+        self.assertTrue(context['room'].is_liked)
+        self.assertEqual(
+            {message.body: message.is_liked for message in context['messages']},
+            {'Liked message': True, 'Other message': False},
+        )
+
+    def test_other_users_likes_are_ignored(self):
+        bob = User.objects.create_user(username='bob', password='pass12345')
+        self.client.force_login(bob)
+        rooms = self.client.get(reverse('home')).context['rooms']
+        self.assertFalse(any(room.is_liked for room in rooms))
+
+    def test_anonymous(self):
+        context = self.client.get(reverse('room', args=[self.liked.id])).context
+        self.assertFalse(context['room'].is_liked)
+
+
+class RoomMessageStreamTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='pass12345')
+        self.room = Room.objects.create(host=self.user, name='Django')
+        self.messages = [Message.objects.create(user=self.user, room=self.room, body=f'Message {i}') for i in range(45)]
+        self.client.force_login(self.user)
+
+    def test_first_load_shows_newest_window(self):
+        page = self.client.get(reverse('room', args=[self.room.id])).context['messages']
+        self.assertEqual([m.body for m in page], [f'Message {i}' for i in range(44, 24, -1)])
+        self.assertTrue(page.has_next)
+
+    def test_older_messages(self):
+        page = self.client.get(reverse('room', args=[self.room.id])).context['messages']
+        url = reverse('room-messages', args=[self.room.id])
+        data = self.client.get(url, {'cursor': page.next_cursor}).json()
+        self.assertIn('Message 24', data['html'])
+        self.assertNotIn('Message 25', data['html'])
+        data = self.client.get(url, {'cursor': data['next_cursor']}).json()
+        self.assertIn('Message 0', data['html'])
+        self.assertIsNone(data['next_cursor'])
+
+    def test_messages_since(self):
+        url = reverse('room-messages-since', args=[self.room.id])
+        last_id = self.messages[-1].id
+        self.assertEqual(self.client.get(url, {'after': last_id}).json(), {'html': '', 'last_id': last_id, 'count': 0})
+
+        response = self.client.post(
+            reverse('room', args=[self.room.id]), {'body': 'Brand new'}, HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+        new_id = response.json()['id']
+        data = self.client.get(url, {'after': last_id}).json()
+        self.assertEqual((data['count'], data['last_id']), (1, new_id))
+        self.assertIn('Brand new', data['html'])
+        self.assertTrue(self.room.participants.filter(id=self.user.id).exists())
+
+    def test_messages_since_rejects_bad_ids(self):
+        response = self.client.get(reverse('room-messages-since', args=[self.room.id]), {'after': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ExportDatasetTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='pass12345')
+        self.bob = User.objects.create_user(username='bob', password='pass12345')
+        UserProfile.objects.create(user=self.alice, photo='profile_photos/1.jpg')
+        room = Room.objects.create(host=self.alice, topic=Topic.objects.create(name='Python'), name='Django')
+        room.participants.add(self.alice, self.bob)
+        first = Message.objects.create(user=self.alice, room=room, body='First')
+        Message.objects.create(user=self.bob, room=room, body='Second')
+        MessageLike.objects.create(user=self.alice, message=first)
+        MessageLike.objects.create(user=self.bob, message=first)
+        RoomLike.objects.create(user=self.alice, room=room)
+        RoomLike.objects.create(user=self.bob, room=room)
+        self.directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def read(self, path):
+        with open(path, newline='', encoding='utf-8') as fileobj:
+            return list(csv.DictReader(fileobj))
+
+    def test_flat_export_has_no_cross_product(self):
+        output = self.directory / 'dataset.csv'
+        call_command('export_dataset', output=str(output), stdout=StringIO())
+        rows = self.read(output)
+        # 2 likes on the first message, 1 row for the unliked one, 2 room likes
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(
+            [(r['message_content'], r['message_like_username']) for r in rows[:3]],
+            [('First', 'alice'), ('First', 'bob'), ('Second', '')],
+        )
+        self.assertEqual(rows[0]['participants'], 'alice,bob')
+        self.assertEqual(rows[0]['profile_photo_url_message_user'], '/media/profile_photos/1.jpg')
+        self.assertEqual([r['room_like_username'] for r in rows[3:]], ['alice', 'bob'])
+        self.assertEqual({r['room_name'] for r in rows}, {'Django'})
+
+    def test_flat_export_reads_rooms_per_chunk(self):
+        whole, chunked = self.directory / 'whole.csv', self.directory / 'chunked.csv'
+        call_command('export_dataset', output=str(whole), stdout=StringIO())
+        call_command('export_dataset', output=str(chunked), chunk_size=1, stdout=StringIO())
+        self.assertEqual(self.read(chunked), self.read(whole))
+
+    def export_incremental(self):
+        call_command('export_dataset', incremental=str(self.directory), lag=0, stdout=StringIO())
+
+    def test_incremental_export_and_compaction(self):
+        self.export_incremental()
+        self.assertEqual(len(list((self.directory / 'messages').glob('*.csv'))), 1)
+
+        # Nothing changed: no new partitions
+        self.export_incremental()
+        for table in ('messages', 'users', 'topics', 'room_participants'):
+            self.assertEqual(len(list((self.directory / table).glob('*.csv'))), 1)
+
+        first = Message.objects.get(body='First')
+        first.body = 'First, edited'
+        first.save()
+        Message.objects.create(user=self.bob, room=first.room, body='Third')
+        carol = User.objects.create_user(username='carol', password='pass12345')
+        first.room.participants.add(carol)
+        self.bob.last_login = timezone.now()
+        self.bob.save(update_fields=['last_login'])
+        self.export_incremental()
+        users = sorted((self.directory / 'users').glob('*.csv'))
+        self.assertEqual([r['username'] for r in self.read(users[-1])], ['carol', 'bob'])
+        participants = sorted((self.directory / 'room_participants').glob('*.csv'))
+        self.assertEqual([r['user_id'] for r in self.read(participants[-1])], [str(carol.pk)])
+        partitions = sorted((self.directory / 'messages').glob('*.csv'))
+        self.assertEqual(len(partitions), 2)
+        self.assertEqual([r['body'] for r in self.read(partitions[-1])], ['First, edited', 'Third'])
+        self.assertFalse(list((self.directory / 'room_likes').glob('*.csv'))[1:])
+
+        call_command('compact_exports', str(self.directory), stdout=StringIO())
+        self.assertEqual(list((self.directory / 'messages').glob('*.csv')), [])
+        snapshot = self.read(self.directory / 'snapshot' / 'messages.csv')
+        self.assertEqual([r['body'] for r in snapshot], ['First, edited', 'Second', 'Third'])
+        self.assertEqual(len(self.read(self.directory / 'snapshot' / 'users.csv')), 3)
+
+    def test_incremental_export_reads_watermark_indexes(self):
+        self.export_incremental()
+        with CaptureQueriesContext(connection) as queries:
+            self.export_incremental()
+        self.assertEqual(len(queries), 7)
+        with connection.cursor() as cursor:
+            for query in queries:
+                cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                plan = ' | '.join(row[-1] for row in cursor.fetchall())
+                # Each table is one range of its index, read in order
+                self.assertNotIn('SCAN', plan, query['sql'])
+                self.assertNotIn('TEMP B-TREE', plan, query['sql'])
+                self.assertRegex(plan, r'USING (COVERING )?INDEX \w+_idx|INTEGER PRIMARY KEY', query['sql'])
+
+    def test_normalized_export(self):
+        call_command('export_dataset', normalized=str(self.directory), stdout=StringIO())
+        self.assertEqual(len(self.read(self.directory / 'messages.csv')), 2)
+        self.assertEqual(len(self.read(self.directory / 'message_likes.csv')), 2)
+        self.assertEqual(len(self.read(self.directory / 'room_participants.csv')), 2)
+        users = self.read(self.directory / 'users.csv')
+        self.assertEqual([u['profile_photo_url'] for u in users], ['/media/profile_photos/1.jpg', ''])
+
+
+class GenerateFakeDataTests(TestCase):
+    def generate(self, **options):
+        options = {'users': 20, 'rooms': 10, 'messages': 60, 'likes': 40, 'seed': 7, 'batch_size': 25, **options}
+        call_command('generate_fake_data', reset=True, stdout=StringIO(), **options)
+        return list(Message.objects.order_by('id').values_list('body', 'user__username', 'room__name'))
+
+    def test_generates_requested_volumes(self):
+        self.generate()
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(UserProfile.objects.count(), 20)
+        self.assertEqual(Room.objects.count(), 10)
+        self.assertEqual(Message.objects.count(), 60)
+        self.assertTrue(0 < RoomLike.objects.count() <= 40)
+        self.assertTrue(0 < MessageLike.objects.count() <= 40)
+        self.assertTrue(all(room.participants.exists() for room in Room.objects.all()))
+        # Counters are rebuilt after the bulk inserts
+        for message in Message.objects.all():
+            self.assertEqual(message.like_count, message.likes.count())
+
+    def test_reset_clears_derived_tables(self):
+        self.generate()
+        self.generate(users=5, rooms=3, messages=10)
+        self.assertEqual(User.objects.count(), 5)
+        self.assertEqual(UserStats.objects.count(), 5)
+        self.assertFalse(InboxEntry.objects.exclude(user__in=User.objects.all()).exists())
+        self.assertFalse(TrendingRoom.objects.exclude(room__in=Room.objects.all()).exists())
+        self.assertEqual(Room.participants.through.objects.exclude(room__in=Room.objects.all()).count(), 0)
+
+    def test_seed_is_reproducible(self):
+        self.assertEqual(self.generate(), self.generate())
+        self.assertNotEqual(self.generate(), self.generate(seed=8))
+
+
+class BenchCommandTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='pass12345')
+        self.room = Room.objects.create(host=self.alice, topic=Topic.objects.create(name='Python'), name='Django')
+        self.message = Message.objects.create(user=self.alice, room=self.room, body='Hello')
+        self.directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def bench(self, **options):
+        output = self.directory / 'report.json'
+        call_command('bench', live=True, concurrency=1, warmup=0, output=str(output), stdout=StringIO(), **options)
+        return json.loads(output.read_text())
+
+    def test_replays_trace(self):
+        trace = self.directory / 'trace.jsonl'
+        trace.write_text('\n'.join(json.dumps(line) for line in [
+            {'path': '/'},
+            {'path': f'/room/{self.room.id}', 'user': 'alice'},
+            {'name': 'like-room', 'kwargs': {'pk': self.room.id}, 'method': 'POST', 'user': 'alice'},
+            {'path': '/no-such-page/'},
+        ]))
+        report = self.bench(trace=str(trace))
+        self.assertEqual(report['total']['requests'], 4)
+        self.assertEqual(report['urls']['home']['status'], {'200': 1})
+        self.assertEqual(report['urls']['room']['status'], {'200': 1})
+        self.assertEqual(report['urls']['unresolved']['status'], {'404': 1})
+        self.assertEqual(report['urls']['like-room']['queries_max'], report['urls']['like-room']['queries_mean'])
+        self.assertGreater(report['urls']['home']['queries_mean'], 0)
+        for key in ('p50_ms', 'p95_ms', 'p99_ms', 'throughput_rps', 'sql_ms_mean'):
+            self.assertIn(key, report['total'])
+        self.assertTrue(RoomLike.objects.filter(user=self.alice, room=self.room).exists())
+
+    def test_synthetic_mix(self):
+        report = self.bench(requests=30, mix='home=1,like-message=1')
+        self.assertEqual(set(report['urls']), {'home', 'like-message'})
+        self.assertEqual(report['total']['requests'], 30)
+        self.assertEqual(report['total']['errors'], 0)
+
+
+class RecordingBroker(LocalBroker):
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.published = []
+
+    def publish(self, channel, message):
+        self.published.append((channel, message))
+        super().publish(channel, message)
+
+
+@override_settings(ACTIVITIES_PUBSUB_BACKEND='activities.tests.RecordingBroker')
+class RealtimeTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='pass12345')
+        self.room = Room.objects.create(host=self.alice, topic=Topic.objects.create(name='Python'), name='Django')
+        self.channel = room_channel(self.room.id)
+        get_broker().published.clear()
+
+    def published(self):
+        return [message for channel, message in get_broker().published if channel == self.channel]
+
+    def test_writes_publish_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            message = Message.objects.create(user=self.alice, room=self.room, body='Hello')
+            self.assertEqual(self.published(), [])
+        self.assertEqual(self.published(), [{'event': 'message', 'id': message.id}])
+
+        self.client.force_login(self.alice)
+        message_id = message.id
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('like-message', args=[message_id]))
+            self.client.post(reverse('like-room', args=[self.room.id]))
+            message.delete()
+        self.assertEqual(self.published()[1:], [
+            {'event': 'message-like', 'id': message_id, 'like_count': 1},
+            {'event': 'room-like', 'id': self.room.id, 'like_count': 1},
+            {'event': 'message-deleted', 'id': message_id},
+        ])
+
+    def test_local_broker_delivers_across_threads(self):
+        broker = LocalBroker()
+
+        async def listen():
+            async with broker.listen('room:1') as subscription:
+                threading.Thread(target=broker.publish, args=('room:1', {'event': 'message', 'id': 1})).start()
+                threading.Thread(target=broker.publish, args=('room:2', {'event': 'message', 'id': 2})).start()
+                first = await subscription.get(timeout=2)
+                with self.assertRaises(asyncio.TimeoutError):
+                    await subscription.get(timeout=0.1)
+                return first
+
+        self.assertEqual(asyncio.run(listen()), {'event': 'message', 'id': 1})
+        self.assertEqual(broker._channels, {})
+
+    async def test_event_stream(self):
+        response = await AsyncClient().get(reverse('room-events', args=[self.room.id]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 5000\n\n')
+
+        # The subscription is open once the first chunk is out
+        next_chunk = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0)
+        get_broker().publish(self.channel, {'event': 'room-like', 'id': self.room.id, 'like_count': 3})
+        chunk = await asyncio.wait_for(next_chunk, 2)
+        self.assertEqual(chunk, f'event: room-like\ndata: {{"id": {self.room.id}, "like_count": 3}}\n\n'.encode())
+        await stream.aclose()
+
+    def test_event_stream_needs_asgi(self):
+        self.assertEqual(self.client.get(reverse('room-events', args=[self.room.id])).status_code, 204)
+
+
+@override_settings(ACTIVITIES_LIKE_WRITE_BEHIND=True, ACTIVITIES_LIKE_FLUSH_INTERVAL=None)
+class LikeWriteBehindTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(username='alice', password='pass12345')
+        self.bob = User.objects.create_user(username='bob', password='pass12345')
+        self.room = Room.objects.create(host=self.alice, topic=Topic.objects.create(name='Python'), name='Django')
+        self.message = Message.objects.create(user=self.alice, room=self.room, body='Hello')
+
+    def like(self, user, name, pk):
+        self.client.force_login(user)
+        return self.client.post(reverse(name, args=[pk])).json()
+
+    def test_toggles_are_buffered_and_netted_out(self):
+        self.client.force_login(self.alice)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(reverse('like-room', args=[self.room.id]))
+        self.assertEqual(response.json(), {'liked': True, 'like_count': 1})
+        self.assertFalse(any(q['sql'].startswith(('INSERT', 'DELETE', 'UPDATE')) for q in queries))
+        self.assertFalse(RoomLike.objects.exists())
+
+        self.assertEqual(self.like(self.alice, 'like-room', self.room.id), {'liked': False, 'like_count': 0})
+        self.assertEqual(self.like(self.alice, 'like-room', self.room.id), {'liked': True, 'like_count': 1})
+        self.assertEqual(self.like(self.bob, 'like-message', self.message.id), {'liked': True, 'like_count': 1})
+        self.assertEqual(self.like(self.alice, 'like-message', self.message.id), {'liked': True, 'like_count': 1})
+        self.assertEqual(self.like(self.alice, 'like-message', self.message.id), {'liked': False, 'like_count': 0})
+
+        with CaptureQueriesContext(connection) as queries:
+            likebuffer.flush()
+        self.assertEqual(len([q for q in queries if q['sql'].startswith('INSERT') and 'like" ' in q['sql']]), 2)
+        self.assertEqual(
+            list(RoomLike.objects.values_list('user__username', 'room_id')), [('alice', self.room.id)],
+        )
+        self.assertEqual(list(MessageLike.objects.values_list('user__username', flat=True)), ['bob'])
+        self.room.refresh_from_db()
+        self.message.refresh_from_db()
+        self.assertEqual((self.room.like_count, self.message.like_count), (1, 1))
+
+        # Unlikes are flushed as deletes, and an empty buffer is a no-op
+        self.assertEqual(self.like(self.alice, 'like-room', self.room.id), {'liked': False, 'like_count': 0})
+        likebuffer.flush()
+        self.assertFalse(RoomLike.objects.exists())
+        self.assertEqual(likebuffer.flush(), 0)
+
+    def test_local_memory_cache_is_refused(self):
+        self.assertEqual([warning.id for warning in like_buffer_cache(None)], ['activities.W001'])
+        with self.assertRaises(CommandError):
+            call_command('flush_like_buffer', stdout=StringIO())
+
+    def test_toggle_during_flush_is_kept(self):
+        self.like(self.alice, 'like-room', self.room.id)
+        original = likebuffer.cache.get_many
+
+        def toggle_mid_flush(keys):
+            values = original(keys)
+            if any(':pending:' in key for key in keys) and not hasattr(self, 'toggled'):
+                self.toggled = self.like(self.alice, 'like-room', self.room.id)
+            return values
+
+        with mock.patch.object(likebuffer.cache, 'get_many', side_effect=toggle_mid_flush):
+            likebuffer.flush()
+        self.assertTrue(RoomLike.objects.exists())
+        self.assertEqual(self.toggled, {'liked': False, 'like_count': 0})
+        likebuffer.flush()
+        self.assertFalse(RoomLike.objects.exists())
+
+    def test_flush_between_the_reads_of_a_toggle(self):
+        self.like(self.alice, 'like-room', self.room.id)
+        key = likebuffer._key('pending', 'room', self.alice.pk, self.room.pk)
+        original = QuerySet.first
+
+        def flush_after_row(queryset):
+            row = original(queryset)
+            if not hasattr(self, 'flushed'):
+                # A flush of the first click only, right after the toggle read the row
+                self.flushed = True
+                likebuffer._incr(likebuffer._key('generation'))
+                RoomLike.objects.create(user=self.alice, room=self.room)
+                Room.objects.filter(pk=self.room.pk).update(like_count=1)
+                cache.decr(key)
+                likebuffer._incr(likebuffer._key('generation'))
+            return row
+
+        with mock.patch.object(QuerySet, 'first', autospec=True, side_effect=flush_after_row):
+            toggled = self.like(self.alice, 'like-room', self.room.id)
+        self.assertEqual(toggled, {'liked': False, 'like_count': 0})
+
+    def test_missing_target(self):
+        self.client.force_login(self.alice)
+        self.assertEqual(self.client.post(reverse('like-room', args=[999])).status_code, 404)
+        self.assertFalse(cache.get(likebuffer._key('pending', 'room', self.alice.pk, 999)))
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TestCase):
+    def route(self, request, write=False):
+        seen = {}
+
+        def view(request):
+            seen['before'] = router.db_for_read(Room)
+            if write:
+                seen['write'] = router.db_for_write(Room)
+                seen['after'] = router.db_for_read(Room)
+            return HttpResponse()
+
+        response = ReplicaMiddleware(view)(request)
+        return seen, response
+
+    def test_read_only_requests_use_a_replica(self):
+        seen, response = self.route(RequestFactory().get('/'))
+        self.assertEqual(seen, {'before': 'replica'})
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        seen, response = self.route(RequestFactory().post('/'))
+        self.assertEqual(seen, {'before': 'default'})
+        self.assertIn(STICKY_COOKIE, response.cookies)
+
+        # A GET that writes reads its own write, and pins the client too
+        seen, response = self.route(RequestFactory().get('/'), write=True)
+        self.assertEqual(seen, {'before': 'replica', 'write': 'default', 'after': 'default'})
+        self.assertIn(STICKY_COOKIE, response.cookies)
+
+        request = RequestFactory().get('/')
+        request.COOKIES[STICKY_COOKIE] = '1'
+        self.assertEqual(self.route(request)[0], {'before': 'default'})
+
+    def test_async_stack(self):
+        seen = {}
+
+        def write(request):
+            seen['before'] = router.db_for_read(Room)
+            seen['write'] = router.db_for_write(Room)
+            return HttpResponse()
+
+        async def view(request):
+            response = await sync_to_async(write)(request)
+            seen['after'] = router.db_for_read(Room)
+            return response
+
+        middleware = ReplicaMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        response = asyncio.run(middleware(RequestFactory().get('/')))
+        # The write in the worker thread pins the rest of the request
+        self.assertEqual(seen, {'before': 'replica', 'write': 'default', 'after': 'default'})
+        self.assertIn(STICKY_COOKIE, response.cookies)
+
+    def test_outside_requests_use_the_primary(self):
+        self.assertEqual(router.db_for_read(Room), 'default')
+        self.assertFalse(router.allow_migrate('replica', 'activities'))
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas(self):
+        self.assertEqual(self.route(RequestFactory().get('/'))[0], {'before': 'default'})
+
+    def test_copy_sqlite(self):
+        directory = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, directory)
+        primary, replica = directory / 'primary.sqlite3', directory / 'replica.sqlite3'
+        db = sqlite3.connect(primary)
+        db.execute('CREATE TABLE room (name TEXT)')
+        db.execute("INSERT INTO room VALUES ('Django')")
+        db.commit()
+
+        copy_sqlite(primary, replica)
+        reader = sqlite3.connect(replica)
+        self.assertEqual(reader.execute('SELECT name FROM room').fetchall(), [('Django',)])
+
+        db.execute("INSERT INTO room VALUES ('Flask')")
+        db.commit()
+        copy_sqlite(primary, replica)
+        # Open connections see the sync as well as new ones
+        self.assertEqual(len(reader.execute('SELECT name FROM room').fetchall()), 2)
+        self.assertEqual(len(sqlite3.connect(replica).execute('SELECT name FROM room').fetchall()), 2)
+        reader.close()
+        db.close()
+
+
+class SQLiteProfileTests(TestCase):
+    def test_pragmas_are_applied_to_new_connections(self):
+        with connection.cursor() as cursor:
+            values = {}
+            for pragma in ('synchronous', 'busy_timeout', 'temp_store', 'cache_size'):
+                cursor.execute(f'PRAGMA {pragma}')
+                values[pragma] = cursor.fetchone()[0]
+        # NORMAL = 1, MEMORY = 2
+        self.assertEqual(values, {'synchronous': 1, 'busy_timeout': 5000, 'temp_store': 2, 'cache_size': -20000})
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+        # Stored in the file: opening the database must not rewrite it
+        self.assertNotIn('journal_mode', connection.settings_dict['OPTIONS']['init_command'])
+
+    def test_asgi_does_not_persist_connections(self):
+        script = (
+            'import connection.asgi\n'
+            'from django.db import connection\n'
+            "print(connection.settings_dict['CONN_MAX_AGE'])"
+        )
+        env = {key: value for key, value in os.environ.items() if key != 'CONN_MAX_AGE'}
+        output = subprocess.run(
+            [sys.executable, '-c', script], cwd=settings.BASE_DIR, env=env,
+            capture_output=True, text=True, check=True,
+        ).stdout
+        self.assertEqual(output.strip(), '0')
+
+    def test_enable_wal_refuses_memory_database(self):
+        # The test database lives in memory, which has no WAL to switch to
+        with self.assertRaisesMessage(CommandError, 'stayed in memory mode'):
+            call_command('enable_wal', stdout=StringIO())
+
+
+class StaticPipelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, cls.root)
+        override = override_settings(STATIC_ROOT=cls.root)
+        override.enable()
+        cls.addClassCleanup(override.disable)
+        call_command('collectstatic', interactive=False, verbosity=0)
+        cls.manifest = json.loads((Path(cls.root) / 'staticfiles.json').read_text())['paths']
+
+    def get(self, path, **headers):
+        return serve_static(RequestFactory().get(f'/static/{path}', headers=headers), path)
+
+    def test_collectstatic_writes_hashed_and_gzipped_files(self):
+        hashed = self.manifest['css/style.css']
+        self.assertNotEqual(hashed, 'css/style.css')
+        self.assertTrue((Path(self.root) / f'{hashed}.gz').exists())
+        self.assertTrue((Path(self.root) / 'animations/wink.json.gz').exists())
+        self.assertIn(hashed, Template("{% load static %}{% static 'css/style.css' %}").render(Context()))
+
+    def test_hashed_file_is_immutable_and_negotiated(self):
+        hashed = self.manifest['js/likes.js']
+        response = self.get(hashed, accept_encoding='gzip, deflate')
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+        self.assertEqual(response['Content-Type'], 'text/javascript')
+        body = b''.join(response.streaming_content)
+        self.assertEqual(gzip.decompress(body), (Path(self.root) / hashed).read_bytes())
+
+    def test_plain_name_revalidates_and_identity_without_accept_encoding(self):
+        response = self.get('js/likes.js', accept_encoding='gzip;q=0')
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        self.assertNotIn('Content-Encoding', response)
+        response.close()
+        not_modified = self.get('js/likes.js', if_modified_since=response['Last-Modified'])
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_outside_static_root_is_not_found(self):
+        with self.assertRaises(Http404):
+            self.get('../settings.py')
+        with self.assertRaises(Http404):
+            self.get(self.manifest['css/style.css'] + '.gz')
+
+
+class ConditionalPageTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='alice', password='pass12345')
+        self.topic = Topic.objects.create(name='Python')
+        self.room = Room.objects.create(host=self.user, topic=self.topic, name='Django')
+        self.message = Message.objects.create(user=self.user, room=self.room, body='Hello')
+        self.client.force_login(self.user)
+
+    def revalidate(self, url):
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        self.assertIn('private', first['Cache-Control'])
+        return first['ETag'], self.client.get(url, headers={'if-none-match': first['ETag']})
+
+    def test_unchanged_pages_are_not_modified(self):
+        for url in (reverse('home'), reverse('room', args=[self.room.id]), reverse('all-activities')):
+            etag, response = self.revalidate(url)
+            self.assertEqual(response.status_code, 304, url)
+            self.assertEqual(response['ETag'], etag)
+
+    def test_not_modified_runs_a_single_query_past_the_session(self):
+        url = reverse('room', args=[self.room.id])
+        etag = self.client.get(url)['ETag']
+        # Session and user, then the room row by primary key
+        with self.assertNumQueries(3):
+            response = self.client.get(url, headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 304)
+
+        url = reverse('home')
+        etag = self.client.get(url)['ETag']
+        # Versions come from the cache, so nothing is counted however big the tables are
+        with self.assertNumQueries(2):
+            response = self.client.get(url, headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_in_scope_invalidate(self):
+        url = reverse('room', args=[self.room.id])
+        changes = [
+            lambda: Message.objects.create(user=self.user, room=self.room, body='Again'),
+            lambda: self.client.post(reverse('like-message', args=[self.message.id])),
+            lambda: self.client.post(reverse('like-message', args=[self.message.id])),
+            lambda: self.message.delete(),
+            lambda: Room.objects.create(host=self.user, topic=self.topic, name='Related'),
+            lambda: self.room.participants.add(User.objects.create_user(username='bob')),
+            lambda: build_related_rooms(),
+        ]
+        for change in changes:
+            etag = self.client.get(url)['ETag']
+            change()
+            self.assertEqual(self.client.get(url, headers={'if-none-match': etag}).status_code, 200)
+
+    def test_people_changes_invalidate(self):
+        # Another user's pages show alice's name and photo
+        self.client.force_login(User.objects.create_user(username='bob', password='pass12345'))
+        profile = UserProfile.objects.create(user=self.user)
+        urls = (reverse('home'), reverse('room', args=[self.room.id]), reverse('all-activities'))
+
+        def log_in():
+            self.user.save(update_fields=['last_login'])
+
+        def rename():
+            self.user.username = 'alice2'
+            self.user.save()
+
+        def new_photo():
+            profile.photo = 'profile_photos/1.jpg'
+            profile.save()
+
+        for change, status in ((log_in, 304), (rename, 200), (new_photo, 200)):
+            etags = {url: self.client.get(url)['ETag'] for url in urls}
+            change()
+            for url, etag in etags.items():
+                self.assertEqual(self.client.get(url, headers={'if-none-match': etag}).status_code, status, url)
+
+    def test_other_rooms_messages_keep_room_page_cached(self):
+        other = Room.objects.create(host=self.user, topic=self.topic, name='Other')
+        url = reverse('room', args=[self.room.id])
+        etag = self.client.get(url)['ETag']
+        Message.objects.create(user=self.user, room=other, body='Elsewhere')
+        self.assertEqual(self.client.get(url, headers={'if-none-match': etag}).status_code, 304)
+
+    def test_home_follows_likes_and_trending(self):
+        url = reverse('home')
+        for change in (lambda: self.client.post(reverse('like-room', args=[self.room.id])), build_trending):
+            etag = self.client.get(url)['ETag']
+            change()
+            self.assertEqual(self.client.get(url, headers={'if-none-match': etag}).status_code, 200)
+
+    def test_validator_depends_on_user(self):
+        url = reverse('home')
+        etag = self.client.get(url)['ETag']
+        self.client.logout()
+        self.assertEqual(self.client.get(url, headers={'if-none-match': etag}).status_code, 200)
+
+
+class RelatedRoomsTests(TestCase):
+    def setUp(self):
+        self.users = [User.objects.create_user(username=f'user{i}', password='pass12345') for i in range(3)]
+        python, cooking = Topic.objects.create(name='Python'), Topic.objects.create(name='Cooking')
+        self.django = Room.objects.create(host=self.users[0], topic=python, name='Django')
+        self.flask = Room.objects.create(host=self.users[0], topic=cooking, name='Flask')
+        self.pasta = Room.objects.create(host=self.users[0], topic=cooking, name='Pasta')
+        self.numpy = Room.objects.create(host=self.users[0], topic=python, name='NumPy')
+        for user in self.users[:2]:
+            self.django.participants.add(user)
+            self.flask.participants.add(user)
+        RoomLike.objects.create(user=self.users[2], room=self.django)
+        RoomLike.objects.create(user=self.users[2], room=self.pasta)
+
+    def neighbours(self, room):
+        return list(RelatedRoom.objects.filter(room=room).order_by('rank').values_list('related__name', flat=True))
+
+    def test_cooccurrence_matches_dense_product(self):
+        rng = np.random.default_rng(0)
+        users, rooms = rng.integers(0, 30, 200), rng.integers(0, 12, 200)
+        keys = np.unique(users * 12 + rooms)
+        users, rooms, weights = keys // 12, keys % 12, rng.random(len(keys))
+        dense = np.zeros((30, 12))
+        dense[users, rooms] = weights
+        expected = dense.T @ dense
+        a, b, dots = cooccurrence(users, rooms, weights, 12)
+        np.fill_diagonal(expected, 0)
+        product = np.zeros((12, 12))
+        product[a, b] = dots
+        np.testing.assert_allclose(product, expected)
+
+    def test_build_ranks_co_signals_then_topic(self):
+        self.assertEqual(build_related_rooms(), 4)
+        # A shared like weighs double two shared participants; NumPy only shares the topic
+        self.assertEqual(self.neighbours(self.django), ['Pasta', 'Flask', 'NumPy'])
+        self.assertEqual(self.neighbours(self.numpy), ['Django'])
+
+    def test_room_page_reads_precomputed_neighbours(self):
+        build_related_rooms()
+        response = self.client.get(reverse('room', args=[self.django.id]))
+        self.assertEqual([room.name for room in response.context['related_rooms']], ['Pasta', 'Flask', 'NumPy'])
+
+    def test_refresh_only_touches_changed_rooms(self):
+        earlier = timezone.now() - timedelta(minutes=10)
+        Room.objects.update(updated=earlier)
+        RoomLike.objects.update(created_at=earlier)
+        build_related_rooms()
+        Message.objects.create(user=self.users[2], room=self.numpy, body='Hi')
+        self.numpy.participants.add(self.users[2])
+
+        # NumPy changed; Django and Pasta share a user with it, Flask doesn't
+        self.assertEqual(refresh_related_rooms(), 3)
+        self.assertEqual(set(self.neighbours(self.numpy)), {'Django', 'Pasta'})
+        self.assertIn('NumPy', self.neighbours(self.pasta))
+        self.assertEqual(refresh_related_rooms(), 0)
+
+    def test_incremental_loads_only_the_people_involved(self):
+        # Only user2 is in Pasta; the Django participants stay out
+        users, rooms, _ = load_interactions([self.pasta.id])
+        self.assertEqual(set(users.tolist()), {self.users[2].id})
+        self.assertEqual(set(rooms.tolist()), {self.django.id, self.pasta.id})
+
+        users, rooms, weights = load_interactions()
+        full = np.sqrt(np.bincount(rooms, weights=weights ** 2))
+        norms = room_norms([self.django.id, self.pasta.id, self.numpy.id])
+        self.assertEqual(norms.keys(), {self.django.id, self.pasta.id})
+        for room_id, norm in norms.items():
+            self.assertAlmostEqual(norm, full[room_id])
+
+    def test_loop_builds_in_full_only_once(self):
+        command = 'activities.management.commands.build_related_rooms'
+        # Three runs: the third sleep stops the loop
+        with (
+            mock.patch('activities.management.commands._loop.time.sleep', side_effect=[None, None, StopIteration]),
+            mock.patch(f'{command}.build_related_rooms', return_value=4) as full,
+            mock.patch(f'{command}.refresh_related_rooms', return_value=0) as refresh,
+            self.assertRaises(StopIteration),
+        ):
+            call_command('build_related_rooms', full=True, loop=1, stdout=StringIO())
+        self.assertEqual((full.call_count, refresh.call_count), (1, 2))
+
+    def test_refresh_scores_like_a_full_build(self):
+        build_related_rooms()
+        RoomLike.objects.create(user=self.users[1], room=self.numpy)
+        # NumPy and the rooms of its new liker, recomputed from their people only
+        self.assertEqual(build_related_rooms([self.numpy.id]), 3)
+        rows = lambda: [
+            (room, related, round(score, 9)) for room, related, score in
+            RelatedRoom.objects.exclude(room=self.pasta).order_by('room', 'rank').values_list('room', 'related', 'score')
+        ]
+        refreshed = rows()
+        build_related_rooms()
+        self.assertEqual(refreshed, rows())
+
+
+class TrendingTests(TestCase):
+    def setUp(self):
+        self.now = timezone.now()
+        self.alice = User.objects.create_user(username='alice', password='pass12345')
+        self.bob = User.objects.create_user(username='bob', password='pass12345')
+        topic = Topic.objects.create(name='Python')
+        self.quiet = Room.objects.create(host=self.alice, topic=topic, name='Quiet')
+        self.busy = Room.objects.create(host=self.alice, topic=topic, name='Busy')
+        self.old = Room.objects.create(host=self.alice, topic=topic, name='Old')
+
+    def event(self, model, age, **fields):
+        obj = model.objects.create(**fields)
+        field = 'created' if model is Message else 'created_at'
+        model.objects.filter(pk=obj.pk).update(**{field: self.now - age})
+
+    def test_scores_decay_with_age(self):
+        self.event(Message, timedelta(0), user=self.alice, room=self.busy, body='One')
+        self.event(Message, timedelta(0), user=self.alice, room=self.busy, body='Two')
+        self.event(RoomLike, HALF_LIFE, user=self.bob, room=self.busy)
+        self.event(Message, HALF_LIFE * 2, user=self.bob, room=self.quiet, body='Earlier')
+        self.event(Message, WINDOW + timedelta(hours=1), user=self.bob, room=self.old, body='Ancient')
+
+        self.assertEqual(build_trending(self.now), 2)
+        scores = dict(TrendingRoom.objects.values_list('room__name', 'score'))
+        # Alice joined Busy with her first message; Bob's like is one half-life old
+        self.assertAlmostEqual(scores['Busy'], 2 * MESSAGE_WEIGHT + PARTICIPANT_WEIGHT + LIKE_WEIGHT / 2)
+        self.assertAlmostEqual(scores['Quiet'], (MESSAGE_WEIGHT + PARTICIPANT_WEIGHT) / 4)
+
+    def test_returning_poster_is_not_a_new_participant(self):
+        self.event(Message, WINDOW * 2, user=self.alice, room=self.busy, body='Long ago')
+        self.event(Message, timedelta(0), user=self.alice, room=self.busy, body='Back')
+        build_trending(self.now)
+        self.assertAlmostEqual(TrendingRoom.objects.get(room=self.busy).score, MESSAGE_WEIGHT)
+
+    def test_home_sorts_by_trend(self):
+        self.event(Message, timedelta(0), user=self.alice, room=self.quiet, body='Hi')
+        self.event(RoomLike, timedelta(0), user=self.bob, room=self.busy)
+        self.event(RoomLike, timedelta(0), user=self.alice, room=self.busy)
+        self.event(Message, timedelta(0), user=self.bob, room=self.busy, body='Me too')
+        build_trending()
+        response = self.client.get(reverse('home') + '?sort=trending')
+        self.assertEqual([room.name for room in response.context['rooms']], ['Busy', 'Quiet'])
+        # The header counts the trending rooms shown, not every room
+        self.assertEqual(response.context['room_count'], 2)
+        latest = self.client.get(reverse('home')).context
+        self.assertEqual(len(latest['rooms']), 3)
+        self.assertEqual(latest['room_count'], 3)
+
+
+class RoomActivityTests(TestCase):
+    FIELDS = ('message_count', 'participant_count', 'last_message_id', 'last_message_at')
+
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='pass12345')
+        self.bob = User.objects.create_user(username='bob', password='pass12345')
+        topic = Topic.objects.create(name='Python')
+        self.quiet = Room.objects.create(host=self.alice, topic=topic, name='Quiet')
+        self.busy = Room.objects.create(host=self.alice, topic=topic, name='Busy')
+        self.client.force_login(self.bob)
+
+    def activity(self, room):
+        return Room.objects.filter(pk=room.pk).values(*self.FIELDS).get()
+
+    def assertConsistent(self):
+        maintained = list(Room.objects.order_by('id').values(*self.FIELDS))
+        recount_room_activity()
+        self.assertEqual(maintained, list(Room.objects.order_by('id').values(*self.FIELDS)))
+
+    def test_posting_updates_the_room(self):
+        self.client.post(reverse('room', args=[self.busy.id]), {'body': 'Hello'})
+        self.client.post(reverse('room', args=[self.busy.id]), {'body': 'Again'})
+        last = Message.objects.latest('id')
+        self.assertEqual(self.activity(self.busy), {
+            'message_count': 2, 'participant_count': 1, 'last_message_id': last.id, 'last_message_at': last.created,
+        })
+        self.assertEqual(self.activity(self.quiet)['message_count'], 0)
+        self.assertConsistent()
+
+    def test_deletes_and_removals_recount(self):
+        first = Message.objects.create(user=self.bob, room=self.busy, body='First')
+        last = Message.objects.create(user=self.alice, room=self.busy, body='Last')
+        self.busy.participants.add(self.alice, self.bob)
+        self.bob.participants.add(self.quiet)
+        self.assertEqual(self.activity(self.busy)['participant_count'], 2)
+
+        last.delete()
+        self.assertEqual(self.activity(self.busy)['last_message_id'], first.id)
+        self.busy.participants.remove(self.alice)
+        self.bob.participants.clear()
+        self.assertEqual(self.activity(self.busy)['participant_count'], 0)
+        self.assertEqual(self.activity(self.quiet)['participant_count'], 0)
+        self.assertConsistent()
+
+        self.busy.participants.add(self.bob)
+        self.bob.delete()
+        self.assertEqual(self.activity(self.busy), {
+            'message_count': 0, 'participant_count': 0, 'last_message_id': None, 'last_message_at': None,
+        })
+
+    def test_home_orders_by_last_message_without_counting(self):
+        Message.objects.create(user=self.bob, room=self.quiet, body='Hi')
+        Message.objects.create(user=self.bob, room=self.quiet, body='Hi again')
+        newest = Room.objects.create(host=self.alice, topic=self.quiet.topic, name='Empty')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('home'))
+        self.assertEqual([room.name for room in response.context['rooms']], ['Quiet', newest.name, 'Busy'])
+        self.assertContains(response, '2 messages &middot; 0 participants')
+        # No count correlated with the room rows (the page validator counts whole tables)
+        self.assertFalse([q for q in queries if 'COUNT' in q['sql'] and '"activities_room"."id"' in q['sql']])
+
+    def test_backfill_command(self):
+        Message.objects.create(user=self.bob, room=self.busy, body='Hi')
+        Room.objects.update(message_count=0, last_message_id=None, last_message_at=None)
+        out = StringIO()
+        call_command('backfill_room_activity', stdout=out)
+        self.assertIn('2 rooms', out.getvalue())
+        self.assertEqual(self.activity(self.busy)['message_count'], 1)
+
+
+class InboxTests(TestCase):
+    def setUp(self):
+        self.alice, self.bob, self.carol, self.dave = (
+            User.objects.create_user(username=name, password='pass12345') for name in ('alice', 'bob', 'carol', 'dave')
+        )
+        topic = Topic.objects.create(name='Python')
+        self.django = Room.objects.create(host=self.alice, topic=topic, name='Django')
+        self.pasta = Room.objects.create(host=self.dave, topic=topic, name='Pasta')
+        self.django.participants.add(self.bob)
+        RoomLike.objects.create(user=self.carol, room=self.django)
+        Room.objects.filter(pk=self.django.pk).update(like_count=1)
+
+    def inbox(self, user):
+        return list(InboxEntry.objects.filter(user=user).order_by('created', 'message_id').values_list('message__body', flat=True))
+
+    def post(self, user, room, body):
+        self.client.force_login(user)
+        self.client.post(reverse('room', args=[room.id]), {'body': body})
+        return Message.objects.get(body=body)
+
+    def test_posting_fans_out_to_followers(self):
+        self.post(self.dave, self.django, 'Hello')
+        self.post(self.bob, self.pasta, 'Elsewhere')
+        self.assertEqual(self.inbox(self.alice), ['Hello'])
+        self.assertEqual(self.inbox(self.bob), ['Hello'])
+        self.assertEqual(self.inbox(self.carol), ['Hello'])
+        # Dave joined Django by posting, so he follows it from now on
+        self.assertEqual(self.inbox(self.dave), ['Elsewhere'])
+        self.post(self.bob, self.django, 'Reply')
+        self.assertEqual(self.inbox(self.dave), ['Elsewhere', 'Reply'])
+
+    def test_personal_feed_pages_by_cursor(self):
+        for i in range(12):
+            self.post(self.dave, self.django, f'Message {i}')
+        self.post(self.carol, self.pasta, 'Not followed')
+        self.client.force_login(self.bob)
+        with CaptureQueriesContext(connection) as queries:
+            page = read_inbox(self.bob, per_page=10)
+            [(m.user.username, m.room.name, m.room.topic.name) for m in page]
+        self.assertEqual(len(queries), 2)
+
+        response = self.client.get(reverse('my-activities'))
+        self.assertContains(response, 'Activity in your rooms')
+        self.assertNotContains(response, 'Not followed')
+        more = self.client.get(reverse('my-activities-more'), {'cursor': response.context['messages'].next_cursor}).json()
+        self.assertIsNone(more['next_cursor'])
+        self.assertIn('Message 0', more['html'])
+        self.assertNotIn('Message 2', more['html'])
+
+    @override_settings(ACTIVITIES_INBOX_PULL_THRESHOLD=2)
+    def test_big_rooms_are_pulled_at_read_time(self):
+        fanned = self.post(self.bob, self.pasta, 'Small room')
+        # Django has bob and carol, plus dave after his first post
+        early = self.post(self.dave, self.django, 'Before the threshold')
+        late = self.post(self.dave, self.django, 'After the threshold')
+        self.assertEqual(InboxEntry.objects.filter(message=late).count(), 0)
+        self.assertEqual(self.inbox(self.carol), ['Before the threshold'])
+
+        self.assertEqual(list(read_inbox(self.carol)), [late, early])
+        self.assertEqual(list(read_inbox(self.dave)), [fanned])
+        first = read_inbox(self.carol, per_page=1)
+        self.assertEqual(list(first), [late])
+        self.assertEqual(list(read_inbox(self.carol, first.next_cursor, per_page=1)), [early])
+
+    def test_trim_keeps_the_newest_entries(self):
+        for i in range(3):
+            self.post(self.dave, self.django, f'Message {i}')
+        self.assertEqual(trim_inboxes(cap=2), 3)
+        self.assertEqual(self.inbox(self.bob), ['Message 1', 'Message 2'])
+        out = StringIO()
+        call_command('trim_inboxes', '--cap=1', stdout=out)
+        self.assertIn('Trimmed 3 inbox entries', out.getvalue())
+
+    def test_build_matches_fan_out(self):
+        self.post(self.dave, self.django, 'Hello')
+        self.post(self.bob, self.django, 'Reply')
+        self.post(self.bob, self.pasta, 'Elsewhere')
+        entries = lambda: sorted(InboxEntry.objects.values_list('user', 'message', 'created'))
+        fanned = entries()
+        self.assertEqual(build_inboxes(), len(fanned))
+        self.assertEqual(entries(), fanned)
@@ -0,0 +1,74 @@
+"""
+Trending rooms.
+
+A room's score is the sum of its recent events, each decayed by half every
+``HALF_LIFE``: messages count ``MESSAGE_WEIGHT``, likes ``LIKE_WEIGHT`` and
+people posting in the room for the first time ``PARTICIPANT_WEIGHT`` (posting
+is how people join). Events older than ``WINDOW`` are left out, they would
+add less than 1/16000 each. ``build_trending`` rewrites ``TrendingRoom`` with
+the rooms that scored, which home(?sort=trending) reads through its score
+index; ``python manage.py build_trending --loop SECONDS`` keeps it fresh.
+"""
+from datetime import timedelta
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from .cache import bump_version
+from .conditional import TRENDING
+from .models import Message, RoomLike, TrendingRoom
+
+HALF_LIFE = timedelta(hours=12)
+WINDOW = timedelta(days=7)
+MESSAGE_WEIGHT = 1.0
+LIKE_WEIGHT = 2.0
+PARTICIPANT_WEIGHT = 3.0
+
+
+def recent_events(since):
+    """``(room ids, timestamps, weights)`` of the events since ``since``."""
+    recent_messages = Message.objects.filter(created__gte=since)
+    first_posts = (
+        Message.objects.filter(room__in=recent_messages.values('room'))
+        .values('room', 'user').annotate(first=Min('created')).filter(first__gte=since)
+        .values_list('room', 'first')
+    )
+    sources = (
+        (recent_messages.values_list('room_id', 'created'), MESSAGE_WEIGHT),
+        (RoomLike.objects.filter(created_at__gte=since).values_list('room_id', 'created_at'), LIKE_WEIGHT),
+        (first_posts, PARTICIPANT_WEIGHT),
+    )
+    rooms, timestamps, weights = [], [], []
+    for rows, weight in sources:
+        for room_id, created in rows.iterator():
+            rooms.append(room_id)
+            timestamps.append(created.timestamp())
+            weights.append(weight)
+    return np.array(rooms, dtype=np.int64), np.array(timestamps, dtype=float), np.array(weights, dtype=float)
+
+
+def trending_scores(now=None):
+    """``{room id: score}`` at ``now`` for every room with events in the window."""
+    now = now or timezone.now()
+    rooms, timestamps, weights = recent_events(now - WINDOW)
+    if not len(rooms):
+        return {}
+    decayed = weights * np.exp2(-(now.timestamp() - timestamps) / HALF_LIFE.total_seconds())
+    room_ids, index = np.unique(rooms, return_inverse=True)
+    return dict(zip(room_ids.tolist(), np.bincount(index, weights=decayed).tolist()))
+
+
+def build_trending(now=None):
+    """Rewrite ``TrendingRoom``; returns the number of rooms scored."""
+    now = now or timezone.now()
+    scores = trending_scores(now)
+    with transaction.atomic():
+        TrendingRoom.objects.all().delete()
+        TrendingRoom.objects.bulk_create(
+            (TrendingRoom(room_id=room_id, score=score, computed=now) for room_id, score in scores.items()),
+            batch_size=5000,
+        )
+    bump_version(TRENDING)
+    return len(scores)
@@ -4,6 +4,9 @@ from . import views
 urlpatterns = [
     path('', views.home, name='home'),
     path('room/<int:pk>', views.room, name='room'),
+    path('room/<int:pk>/messages', views.room_messages, name='room-messages'),
+    path('room/<int:pk>/messages/since', views.room_messages_since, name='room-messages-since'),
+    path('room/<int:pk>/events', views.room_events, name='room-events'),
     path('create-room/', views.createRoom, name='create-room'),
     path('update-room/<int:pk>', views.updateRoom, name='update-room'),
     path('delete-room/<int:pk>', views.deleteRoom, name='delete-room'),
@@ -11,4 +14,7 @@ urlpatterns = [
     path('like-room/<int:pk>', views.like_room, name='like-room'),
     path('like-message/<int:pk>', views.like_message, name='like-message'),
     path('all-activities/', views.allActivities, name='all-activities'),
+    path('all-activities/more', views.all_activities_more, name='all-activities-more'),
+    path('my-activities/', views.myActivities, name='my-activities'),
+    path('my-activities/more', views.my_activities_more, name='my-activities-more'),
 ]
\ No newline at end of file
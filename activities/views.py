@@ -1,76 +1,151 @@
-from django.http import JsonResponse
-from django.shortcuts import get_object_or_404, redirect, render
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, get_object_or_404, redirect, render
+from .conditional import activities_scope, conditional_page, home_scope, room_scope
 from .forms import RoomForm
+from .inbox import read_inbox
+from .likes import atoggle_message_like, atoggle_room_like
 from .models import *
+from .pagination import paginate_by_cursor
+from .realtime import room_event_stream
+from django.db import transaction
 from django.db.models import Q
 from django.contrib.auth.decorators import login_required
-from django.core.exceptions import PermissionDenied
-from django.core.paginator import Paginator 
+from django.core.exceptions import BadRequest, PermissionDenied
+from django.template.loader import render_to_string
+from django.urls import reverse
+
+ACTIVITIES_PER_PAGE = 10
+ROOM_MESSAGES_PER_PAGE = 20
+ROOM_PARTICIPANTS_SHOWN = 20
+TRENDING_ROOMS = 50
 
 # Create your views here.
 
 
+@conditional_page(home_scope)
 def home(request):
     q = request.GET.get('q') if request.GET.get('q') != None else ''
+    sort = request.GET.get('sort')
     
-    rooms = Room.objects.filter(
-        Q(topic__name__icontains=q) |
-        Q(name__icontains=q) |
-        Q(description__icontains=q) 
-    ) 
-    room_count = rooms.count()
-    topics = Topic.objects.all()
-    messages = Message.objects.filter(Q(room__topic__name__icontains=q))[:room_count]
-    liked_rooms = set()
-    if request.user.is_authenticated:
-        liked_rooms = set(RoomLike.objects.filter(user=request.user).values_list('room_id', flat=True))
+    rooms = Room.objects.for_feed().search(q)
+    # Added: top rooms by the scores activities.trending materializes, read in index order
+    if sort == 'trending':
+        # Updated: the count is of the trending rooms listed, not of every match
+        rooms = rooms.with_like_state(request.user).filter(trend__isnull=False).order_by('-trend__score')
+        rooms = list(rooms[:TRENDING_ROOMS])
+        room_count = len(rooms)
+    else:
+        room_count = rooms.count()
+        rooms = rooms.with_like_state(request.user)
+        # Added: latest rooms by their last message, straight from the (last_message_at, id) index
+        if not q:
+            rooms = rooms.by_activity()
+    messages = Message.objects.for_activity().filter(Q(room__topic__name__icontains=q))[:room_count]
     
     context = {
         'rooms': rooms, 
         'room_count': room_count, 
-        'topics': topics, 
         'messages': messages,
-        'liked_rooms': liked_rooms,
+        'sort': sort,
     }
 
     return render(request, 'activities/home.html', context)
 
 
+@conditional_page(room_scope)
 def room(request, pk):
-    room = Room.objects.get(id=pk)
-    messages = room.message_set.all().order_by('-created')
-    participants = room.participants.all()
-    liked_rooms = set()
-    liked_messages = set()
-    if request.user.is_authenticated:
-        liked_rooms = set(RoomLike.objects.filter(user=request.user).values_list('room_id', flat=True))
-        liked_messages = set(MessageLike.objects.filter(user=request.user).values_list('message_id', flat=True))
-
-    # Query related rooms with the same topic, excluding the current room
-    related_rooms = Room.objects.filter(topic=room.topic).exclude(id=pk).order_by('-updated')[:5]
+    room = Room.objects.select_related('topic').with_like_state(request.user).get(id=pk)
 
     if request.method == 'POST':
-        message = Message.objects.create(
-            user = request.user,
-            room = room,
-            body = request.POST.get('body'),
-        )
-
-        room.participants.add(request.user)
+        # Updated: one transaction, so the room's counters and last message (activities.roomstats) move with it
+        with transaction.atomic():
+            message = Message.objects.create(
+                user = request.user,
+                room = room,
+                body = request.POST.get('body'),
+            )
+
+            room.participants.add(request.user)
+        # Added: room.js posts in the background and then polls for new messages
+        if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            return JsonResponse({'id': message.id})
         return redirect('room', pk=room.id)
 
+    # Updated: only the newest messages, older ones load through room_messages
+    messages = paginate_by_cursor(_room_messages(request, room), None, ROOM_MESSAGES_PER_PAGE)
+    participants = list(room.participants.all()[:ROOM_PARTICIPANTS_SHOWN + 1])
+
+    # Updated: neighbours precomputed by activities.recommendations, one lookup on (room, rank)
+    related_rooms = list(
+        Room.objects.filter(recommended_in__room=room).order_by('recommended_in__rank').only('id', 'name')
+    )
+    if not related_rooms:
+        # Rooms the last build hasn't seen yet: same topic, excluding the current room
+        related_rooms = Room.objects.filter(topic=room.topic).exclude(id=pk).order_by('-updated')[:5]
+
     context = {
         'room': room,
         'messages': messages, 
-        'participants':participants,
+        'last_message_id': max((message.id for message in messages), default=0),
+        'participants':participants[:ROOM_PARTICIPANTS_SHOWN],
+        'more_participants': room.participant_count - ROOM_PARTICIPANTS_SHOWN if len(participants) > ROOM_PARTICIPANTS_SHOWN else 0,
         'related_rooms':related_rooms,
-        'liked_rooms': liked_rooms,
-        'liked_messages': liked_messages,
     }
 
     return render(request, 'activities/room.html', context)
 
 
+def _room_messages(request, room):
+    return room.message_set.for_room().with_like_state(request.user)
+
+
+def room_messages(request, pk):
+    """Older messages of a room, one cursor page at a time."""
+    room = get_object_or_404(Room, id=pk)
+    page = paginate_by_cursor(_room_messages(request, room), request.GET.get('cursor'), ROOM_MESSAGES_PER_PAGE)
+
+    return JsonResponse({
+        'html': render_to_string('activities/room_messages.html', {'messages': page}, request=request),
+        'next_cursor': page.next_cursor,
+    })
+
+
+async def room_messages_since(request, pk):
+    """Messages posted after ``?after=<message id>``, for cheap polling."""
+    room = await aget_object_or_404(Room, id=pk)
+    try:
+        after = int(request.GET.get('after', 0))
+    except ValueError:
+        raise BadRequest('Invalid message id.')
+    # Resolved up front: the lazy request.user can't hit the database from async code
+    request.user = await request.auser()
+    # Ids only grow, so this is a range scan on the (room_id, id) index
+    queryset = _room_messages(request, room).filter(id__gt=after).order_by('id')[:ROOM_MESSAGES_PER_PAGE]
+    messages = [message async for message in queryset]
+    messages.reverse()
+
+    return JsonResponse({
+        'html': render_to_string('activities/room_messages.html', {'messages': messages}, request=request) if messages else '',
+        'last_id': messages[0].id if messages else after,
+        'count': len(messages),
+    })
+
+
+async def room_events(request, pk):
+    """Server-Sent Events stream of a room's new messages, deletions and like counts."""
+    if not isinstance(request, ASGIRequest):
+        # An endless response would pin a WSGI worker; 204 stops EventSource
+        # from reconnecting and room.js keeps polling instead
+        return HttpResponse(status=204)
+    room = await aget_object_or_404(Room, id=pk)
+    return StreamingHttpResponse(
+        room_event_stream(room.id),
+        content_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
 @login_required(login_url='users:login')
 def createRoom(request):
     form = RoomForm()
@@ -149,50 +224,70 @@ def deleteMessage(request, pk):
     return render(request, 'activities/delete.html', {'obj': message})   
 
 @login_required(login_url='users:login')
+@conditional_page(activities_scope)
 def allActivities(request):
-    messages = Message.objects.all().order_by('-created')
-    # Updated: Added pagination for all activities
-    paginator = Paginator(messages, 10)  # Show 10 messages per page
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    
+    # Updated: keyset pagination, no COUNT(*) or OFFSET however deep the page
+    page = paginate_by_cursor(Message.objects.for_activity(), request.GET.get('cursor'), ACTIVITIES_PER_PAGE)
+
     context = {
-        'messages': page_obj,
+        'messages': page,
     }
-    
+
     return render(request, 'activities/all_activities.html', context)
 
+@login_required(login_url='users:login')
+def all_activities_more(request):
+    page = paginate_by_cursor(Message.objects.for_activity(), request.GET.get('cursor'), ACTIVITIES_PER_PAGE)
+
+    return JsonResponse({
+        'html': render_to_string('activities/activity_items.html', {'messages': page}, request=request),
+        'next_cursor': page.next_cursor,
+    })
+
+# Added: activity in the rooms the user takes part in or liked, read from their inbox
+@login_required(login_url='users:login')
+def myActivities(request):
+    page = read_inbox(request.user, request.GET.get('cursor'), ACTIVITIES_PER_PAGE)
+
+    context = {
+        'messages': page,
+        'title': 'Activity in your rooms',
+        'more_url': reverse('my-activities-more'),
+    }
+
+    return render(request, 'activities/all_activities.html', context)
+
+@login_required(login_url='users:login')
+def my_activities_more(request):
+    page = read_inbox(request.user, request.GET.get('cursor'), ACTIVITIES_PER_PAGE)
+
+    return JsonResponse({
+        'html': render_to_string('activities/activity_items.html', {'messages': page}, request=request),
+        'next_cursor': page.next_cursor,
+    })
+
 # Added: AJAX views for liking/unliking rooms and messages
+# Updated: async, so under ASGI a like doesn't hold a worker thread while it waits on the database
 @login_required(login_url='users:login')
-def like_room(request, pk):
-    room = get_object_or_404(Room, id=pk)
-    liked = RoomLike.objects.filter(user=request.user, room=room).exists()
-    
-    if liked:
-        RoomLike.objects.filter(user=request.user, room=room).delete()
-        liked = False
-    else:
-        RoomLike.objects.create(user=request.user, room=room)
-        liked = True
-    
+async def like_room(request, pk):
+    try:
+        liked, like_count = await atoggle_room_like(await request.auser(), pk)
+    except Room.DoesNotExist:
+        raise Http404('No Room matches the given query.')
+
     return JsonResponse({
         'liked': liked,
-        'like_count': room.likes.count(),
+        'like_count': like_count,
     })
 
 @login_required(login_url='users:login')
-def like_message(request, pk):
-    message = get_object_or_404(Message, id=pk)
-    liked = MessageLike.objects.filter(user=request.user, message=message).exists()
-    
-    if liked:
-        MessageLike.objects.filter(user=request.user, message=message).delete()
-        liked = False
-    else:
-        MessageLike.objects.create(user=request.user, message=message)
-        liked = True
-    
+async def like_message(request, pk):
+    try:
+        liked, like_count = await atoggle_message_like(await request.auser(), pk)
+    except Message.DoesNotExist:
+        raise Http404('No Message matches the given query.')
+
     return JsonResponse({
         'liked': liked,
-        'like_count': message.likes.count(),
+        'like_count': like_count,
     })
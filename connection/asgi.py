@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'connection.settings')
+# Each ASGI request gets a new thread, so persistent connections would pile up
+os.environ.setdefault('CONN_MAX_AGE', '0')
 
 application = get_asgi_application()
@@ -0,0 +1,108 @@
+"""
+Read replicas with sticky-after-write.
+
+Reads go to one of ``DATABASE_REPLICAS`` only inside a request that
+``ReplicaMiddleware`` marked as read-only: a safe method from a client that
+hasn't written recently. Everything else (writes, POSTs, management
+commands, tests) uses ``default``. Once a request writes, its remaining reads
+go to ``default`` and the client gets a cookie keeping it there for
+``REPLICA_STICKY_SECONDS``, so people always see their own changes while the
+replicas catch up.
+"""
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django.conf import settings
+
+STICKY_COOKIE = 'db_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_request = ContextVar('replica_request', default=None)
+
+
+class _RequestState:
+    def __init__(self, replica):
+        self.replica = replica
+        self.wrote = False
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _request.get()
+        return state.replica if state else None
+
+    def db_for_write(self, model, **hints):
+        state = _request.get()
+        if state:
+            state.wrote = True
+            state.replica = None
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {'default', *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Replicas get their schema with the data, from sync_replicas
+        return False if db in replicas() else None
+
+
+class ReplicaMiddleware:
+    """Lets a request read from a replica, and pins recent writers to the primary."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        aliases = replicas()
+        if not aliases:
+            return self.get_response(request)
+
+        state, token = self._start(request, aliases)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request.reset(token)
+        return self._finish(request, state, response)
+
+    async def __acall__(self, request):
+        aliases = replicas()
+        if not aliases:
+            return await self.get_response(request)
+
+        # Sync views run in a copy of this context, so they share the state
+        state, token = self._start(request, aliases)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request.reset(token)
+        return self._finish(request, state, response)
+
+    def _start(self, request, aliases):
+        read_only = request.method in SAFE_METHODS and STICKY_COOKIE not in request.COOKIES
+        state = _RequestState(random.choice(aliases) if read_only else None)
+        return state, _request.set(state)
+
+    def _finish(self, request, state, response):
+        if state.wrote or request.method not in SAFE_METHODS:
+            response.set_cookie(
+                STICKY_COOKIE, '1', max_age=getattr(settings, 'REPLICA_STICKY_SECONDS', 10),
+                httponly=True, samesite='Lax',
+            )
+        return response
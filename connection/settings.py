@@ -22,6 +22,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'connection.routers.ReplicaMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -52,13 +53,85 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'connection.wsgi.application'
 
+# Production SQLite profile. Numbers from `python manage.py bench_sqlite`,
+# which compares it with SQLite's defaults.
+# - journal_mode=WAL: readers and the writer no longer block each other. It is
+#   stored in the database file, so it is switched on once per database with
+#   `python manage.py enable_wal` rather than by every connection, which would
+#   rewrite the file's header the first time any command opened it
+# The rest only last as long as the connection, so every new one applies them:
+# - synchronous=NORMAL: no fsync per commit under WAL, still corruption-safe
+# - busy_timeout: wait up to 5 s for the write lock instead of "database is locked"
+# - mmap_size, cache_size, temp_store: keep hot pages and temp tables in memory
+SQLITE_PRAGMAS = {
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 128 * 1024 * 1024,
+    'cache_size': -20000,  # KiB
+    'temp_store': 'MEMORY',
+}
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+            # Take the write lock at BEGIN, where busy_timeout applies, instead of
+            # failing when a transaction that started by reading tries to write
+            'transaction_mode': 'IMMEDIATE',
+        },
+        # Seconds to reuse a connection across requests (health-checked first).
+        # asgi.py turns it off: there every request runs in a new thread and
+        # persistent connections pile up.
+        'CONN_MAX_AGE': int(os.environ.get('CONN_MAX_AGE', 600)),
+        'CONN_HEALTH_CHECKS': True,
+    }
+}
+
+# Read replicas: aliases in DATABASES holding copies of 'default' that serve
+# the reads of read-only requests, see connection/routers.py. Locally, with a
+# second SQLite file kept fresh by `python manage.py sync_replicas --loop 1`:
+#   DATABASES['replica'] = {
+#       **DATABASES['default'],
+#       'NAME': BASE_DIR / 'db.replica.sqlite3',
+#       'TEST': {'MIRROR': 'default'},
+#   }
+#   DATABASE_REPLICAS = ['replica']
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['connection.routers.ReplicaRouter']
+# How long a client that wrote keeps reading from 'default'
+REPLICA_STICKY_SECONDS = 10
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'connection',
     }
 }
 
+# Lifetime of the cached sidebar fragments, see activities/cache.py
+ACTIVITIES_CACHE_TIMEOUT = 300
+
+# Pub/sub behind the live room updates, see activities/realtime.py. The local
+# broker only reaches clients of the same process; with several ASGI workers use
+# 'activities.realtime.RedisBroker' and ACTIVITIES_PUBSUB_OPTIONS = {'url': ...}
+ACTIVITIES_PUBSUB_BACKEND = 'activities.realtime.LocalBroker'
+ACTIVITIES_PUBSUB_OPTIONS = {}
+
+# Buffer like toggles in the cache and write them in batches, see
+# activities/likebuffer.py. Needs a cache shared by all processes, not the
+# LocMemCache above (system check activities.W001).
+ACTIVITIES_LIKE_WRITE_BEHIND = False
+# Seconds between a buffered toggle and the flush that writes it
+ACTIVITIES_LIKE_FLUSH_INTERVAL = 2
+
+# Per-user activity inboxes, see activities/inbox.py. Entries kept per user
+# (trimmed by manage.py trim_inboxes), and the follower count above which a
+# room's messages are pulled at read time instead of fanned out
+ACTIVITIES_INBOX_CAP = 500
+ACTIVITIES_INBOX_PULL_THRESHOLD = 1000
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -74,6 +147,13 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [BASE_DIR / 'static']
 STATIC_ROOT = BASE_DIR / 'staticfiles'
+# Content-hashed names plus .gz/.br siblings, written by collectstatic
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'connection.staticfiles.CompressedManifestStaticFilesStorage'},
+}
+# Serve STATIC_ROOT from Django even with DEBUG off, when no web server sits in front
+SERVE_STATIC = False
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
@@ -0,0 +1,146 @@
+"""
+Fingerprinted, precompressed static files.
+
+``collectstatic`` writes content-hashed copies (``style.3f2a9c1b7e04.css``)
+plus a manifest, then gzip and, when the ``brotli`` package is installed,
+brotli siblings (``style.3f2a9c1b7e04.css.gz``/``.br``) of every text asset.
+A front-end server can serve those siblings directly; when Django serves
+``STATIC_ROOT`` itself (``DEBUG`` or ``SERVE_STATIC``), ``serve`` picks the
+best encoding the client accepts and marks hashed names as immutable.
+"""
+import gzip
+import mimetypes
+import posixpath
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage, StaticFilesStorage, staticfiles_storage
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.http import FileResponse, Http404, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE = ('.css', '.js', '.json', '.svg', '.map', '.txt', '.html', '.xml')
+# Siblings by preference, best first
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# Unhashed names can change in place, so make clients revalidate them
+REVALIDATE = 'no-cache'
+
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def url(self, name, force=False):
+        if not self.hashed_files:
+            # collectstatic hasn't run with this storage yet: keep serving plain names
+            return StaticFilesStorage.url(self, name)
+        return super().url(name, force)
+
+    def post_process(self, paths, dry_run=False, **options):
+        processed = []
+        for original, hashed, result in super().post_process(paths, dry_run=dry_run, **options):
+            if hashed and not isinstance(result, Exception):
+                processed.extend((original, hashed))
+            yield original, hashed, result
+        if not dry_run:
+            for name in dict.fromkeys(processed):
+                self.compress_file(name)
+
+    def compress_file(self, name):
+        if not name.endswith(COMPRESSIBLE):
+            return
+        with self.open(name) as fileobj:
+            data = fileobj.read()
+        for encoding, suffix in ENCODINGS:
+            if encoding == 'br' and brotli is None:
+                continue
+            compressed = compress(data, encoding)
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            # Not worth a sibling when it barely saves anything
+            if len(compressed) < len(data) * 0.95:
+                self._save(name + suffix, ContentFile(compressed))
+
+    def is_immutable(self, name):
+        if not hasattr(self, '_hashed_names'):
+            self._hashed_names = frozenset(self.hashed_files.values())
+        return name in self._hashed_names
+
+
+def accepted_encodings(header):
+    accepted = set()
+    for part in header.split(','):
+        coding, _, params = part.partition(';')
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                if float(params[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    if '*' in accepted:
+        accepted.update(coding for coding, _ in ENCODINGS)
+    return accepted
+
+
+def is_immutable(path):
+    check = getattr(staticfiles_storage, 'is_immutable', None)
+    return bool(check and check(path))
+
+
+def serve(request, path):
+    """Serve a file from ``STATIC_ROOT`` with its precompressed sibling when the client takes it."""
+    path = posixpath.normpath(path).lstrip('/')
+    try:
+        fullpath = Path(safe_join(settings.STATIC_ROOT, path))
+    except SuspiciousFileOperation:
+        raise Http404('Not found')
+    if not fullpath.is_file() or fullpath.suffix in ('.gz', '.br'):
+        raise Http404('Not found')
+
+    stat = fullpath.stat()
+    compressible = path.endswith(COMPRESSIBLE)
+    headers = {
+        'Cache-Control': IMMUTABLE if is_immutable(path) else REVALIDATE,
+        'Last-Modified': http_date(stat.st_mtime),
+    }
+    if compressible:
+        headers['Vary'] = 'Accept-Encoding'
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime):
+        response = HttpResponseNotModified()
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    content_type, _ = mimetypes.guess_type(path)
+    served, encoding = fullpath, None
+    if compressible:
+        accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        for coding, suffix in ENCODINGS:
+            sibling = fullpath.with_name(fullpath.name + suffix)
+            if coding in accepted and sibling.is_file():
+                served, encoding = sibling, coding
+                break
+
+    response = FileResponse(
+        served.open('rb'), filename=fullpath.name, content_type=content_type or 'application/octet-stream',
+    )
+    for header, value in headers.items():
+        response[header] = value
+    if encoding:
+        response['Content-Encoding'] = encoding
+    return response
+
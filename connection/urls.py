@@ -1,10 +1,15 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
+from connection.staticfiles import serve as serve_static
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('activities.urls')),
     path('accounts/', include('users.urls')),
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT) + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
+] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+
+# Updated: statics get content negotiation and long-lived cache headers when Django serves them
+if settings.DEBUG or settings.SERVE_STATIC:
+    urlpatterns += [re_path(r'^%s(?P<path>.*)$' % settings.STATIC_URL.lstrip('/'), serve_static)]
@@ -0,0 +1,46 @@
+// infinite scroll for the all activities page, pages come from the JSON "load more" endpoint
+document.addEventListener('DOMContentLoaded', function() {
+    const loadMore = document.getElementById('load-more-activities');
+    const list = document.getElementById('activity-list');
+    if (!loadMore || !list) {
+        return;
+    }
+    let loading = false;
+
+    function loadNextPage() {
+        const cursor = loadMore.getAttribute('data-cursor');
+        if (loading || !cursor) {
+            return;
+        }
+        loading = true;
+
+        fetch(`${loadMore.getAttribute('data-url')}?cursor=${encodeURIComponent(cursor)}`, {
+            headers: {'X-Requested-With': 'XMLHttpRequest'},
+        })
+        .then(response => response.json())
+        .then(data => {
+            list.insertAdjacentHTML('beforeend', data.html);
+            if (data.next_cursor) {
+                loadMore.setAttribute('data-cursor', data.next_cursor);
+                loadMore.href = `?cursor=${data.next_cursor}`;
+            } else {
+                loadMore.parentElement.remove();
+                observer.disconnect();
+            }
+        })
+        .catch(error => console.error('Error:', error))
+        .finally(() => { loading = false; });
+    }
+
+    loadMore.addEventListener('click', function(event) {
+        event.preventDefault();
+        loadNextPage();
+    });
+
+    const observer = new IntersectionObserver(entries => {
+        if (entries.some(entry => entry.isIntersecting)) {
+            loadNextPage();
+        }
+    }, {rootMargin: '400px'});
+    observer.observe(loadMore);
+});
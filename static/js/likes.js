@@ -1,38 +1,39 @@
 // handling like/unlike actions via AJAX
 document.addEventListener('DOMContentLoaded', function() {
-    const likeButtons = document.querySelectorAll('.like-btn');
-    
-    likeButtons.forEach(button => {
-        button.addEventListener('click', function() {
-            const type = this.getAttribute('data-type');
-            const id = this.getAttribute('data-id');
-            const url = type === 'room' ? `/like-room/${id}` : `/like-message/${id}`;
+    // delegated, so buttons in messages loaded later (room.js, activities.js) work too
+    document.addEventListener('click', function(event) {
+        const button = event.target.closest('.like-btn');
+        if (!button) {
+            return;
+        }
+        const type = button.getAttribute('data-type');
+        const id = button.getAttribute('data-id');
+        const url = type === 'room' ? `/like-room/${id}` : `/like-message/${id}`;
+        
+        fetch(url, {
+            method: 'POST',
+            headers: {
+                'X-CSRFToken': getCookie('csrftoken'),
+                'Content-Type': 'application/json',
+            },
+        })
+        .then(response => response.json())
+        .then(data => {
+            const heartIcon = button.querySelector('i');
+            const countSpan = button.querySelector('.like-count');
             
-            fetch(url, {
-                method: 'POST',
-                headers: {
-                    'X-CSRFToken': getCookie('csrftoken'),
-                    'Content-Type': 'application/json',
-                },
-            })
-            .then(response => response.json())
-            .then(data => {
-                const heartIcon = this.querySelector('i');
-                const countSpan = this.querySelector('.like-count');
-                
-                if (data.liked) {
-                    this.classList.add('liked');
-                    heartIcon.classList.replace('bi-heart', 'bi-heart-fill');
-                    this.title = 'Unlike';
-                } else {
-                    this.classList.remove('liked');
-                    heartIcon.classList.replace('bi-heart-fill', 'bi-heart');
-                    this.title = 'Like';
-                }
-                countSpan.textContent = data.like_count;
-            })
-            .catch(error => console.error('Error:', error));
-        });
+            if (data.liked) {
+                button.classList.add('liked');
+                heartIcon.classList.replace('bi-heart', 'bi-heart-fill');
+                button.title = 'Unlike';
+            } else {
+                button.classList.remove('liked');
+                heartIcon.classList.replace('bi-heart-fill', 'bi-heart');
+                button.title = 'Like';
+            }
+            countSpan.textContent = data.like_count;
+        })
+        .catch(error => console.error('Error:', error));
     });
 
     // function to get CSRF token
@@ -50,4 +51,4 @@ document.addEventListener('DOMContentLoaded', function() {
         }
         return cookieValue;
     }
-});
\ No newline at end of file
+});
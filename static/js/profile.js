@@ -0,0 +1,48 @@
+// profile tabs: lists of inactive tabs are fetched when the tab is first opened, then paged with "Load more"
+document.addEventListener('DOMContentLoaded', function() {
+    function loadPage(list) {
+        const button = list.querySelector('.profile-list-more');
+        const cursor = button.getAttribute('data-cursor');
+        const first = !list.hasAttribute('data-loaded');
+        if (list.hasAttribute('data-loading') || (!first && !cursor)) {
+            return;
+        }
+        list.setAttribute('data-loading', 'true');
+
+        const url = first ? list.getAttribute('data-url') : `${list.getAttribute('data-url')}?cursor=${encodeURIComponent(cursor)}`;
+        fetch(url, {
+            headers: {'X-Requested-With': 'XMLHttpRequest'},
+        })
+        .then(response => response.json())
+        .then(data => {
+            const items = list.querySelector('.profile-list-items');
+            if (first) {
+                items.innerHTML = '';
+                list.setAttribute('data-loaded', 'true');
+            }
+            items.insertAdjacentHTML('beforeend', data.html);
+            button.setAttribute('data-cursor', data.next_cursor || '');
+            button.parentElement.hidden = !data.next_cursor;
+        })
+        .catch(error => console.error('Error:', error))
+        .finally(() => list.removeAttribute('data-loading'));
+    }
+
+    document.querySelectorAll('#profileTabs [data-bs-toggle="tab"]').forEach(tab => {
+        tab.addEventListener('shown.bs.tab', function() {
+            const pane = document.querySelector(tab.getAttribute('data-bs-target'));
+            pane.querySelectorAll('.profile-list:not([data-loaded])').forEach(loadPage);
+            // keep the open tab on reload
+            const url = new URL(window.location);
+            url.searchParams.set('tab', tab.getAttribute('data-tab'));
+            history.replaceState(null, '', url);
+        });
+    });
+
+    document.addEventListener('click', function(event) {
+        const button = event.target.closest('.profile-list-more');
+        if (button) {
+            loadPage(button.closest('.profile-list'));
+        }
+    });
+});
@@ -0,0 +1,120 @@
+// room page: older messages on demand, live updates (Server-Sent Events, polling as fallback), posting without a page reload
+document.addEventListener('DOMContentLoaded', function() {
+    const list = document.getElementById('room-messages');
+    if (!list) {
+        return;
+    }
+    const olderButton = document.getElementById('load-older-messages');
+    const form = document.getElementById('message-form');
+    const POLL_INTERVAL = 5000;
+    let polling = false;
+    let live = false;
+
+    function getJSON(url) {
+        return fetch(url, {headers: {'X-Requested-With': 'XMLHttpRequest'}}).then(response => response.json());
+    }
+
+    function removePlaceholder() {
+        const placeholder = list.querySelector('.no-msg-p');
+        if (placeholder) {
+            placeholder.remove();
+        }
+    }
+
+    // fetch everything posted after the newest message on the page
+    function pollNewMessages() {
+        if (polling) {
+            return Promise.resolve();
+        }
+        polling = true;
+        const after = list.getAttribute('data-last-id');
+        return getJSON(`${list.getAttribute('data-since-url')}?after=${after}`)
+            .then(data => {
+                if (data.count) {
+                    removePlaceholder();
+                    list.insertAdjacentHTML('afterbegin', data.html);
+                    list.setAttribute('data-last-id', data.last_id);
+                }
+            })
+            .catch(error => console.error('Error:', error))
+            .finally(() => { polling = false; });
+    }
+
+    if (olderButton) {
+        olderButton.addEventListener('click', function() {
+            const cursor = olderButton.getAttribute('data-cursor');
+            getJSON(`${list.getAttribute('data-older-url')}?cursor=${encodeURIComponent(cursor)}`)
+                .then(data => {
+                    list.insertAdjacentHTML('beforeend', data.html);
+                    if (data.next_cursor) {
+                        olderButton.setAttribute('data-cursor', data.next_cursor);
+                    } else {
+                        olderButton.parentElement.remove();
+                    }
+                })
+                .catch(error => console.error('Error:', error));
+        });
+    }
+
+    if (form) {
+        form.addEventListener('submit', function(event) {
+            event.preventDefault();
+            fetch(window.location.pathname, {
+                method: 'POST',
+                body: new FormData(form),
+                headers: {'X-Requested-With': 'XMLHttpRequest'},
+            })
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(`HTTP ${response.status}`);
+                }
+                form.reset();
+                return pollNewMessages();
+            })
+            .catch(error => console.error('Error:', error));
+        });
+    }
+
+    function setLikeCount(type, id, count) {
+        document.querySelectorAll(`.like-btn[data-type="${type}"][data-id="${id}"] .like-count`)
+            .forEach(span => { span.textContent = count; });
+    }
+
+    // pushed updates; the events only carry ids and counts, HTML still comes from the since endpoint
+    if (window.EventSource && list.getAttribute('data-events-url')) {
+        const events = new EventSource(list.getAttribute('data-events-url'));
+        events.addEventListener('open', function() {
+            live = true;
+            // catch up on anything posted while (re)connecting
+            pollNewMessages();
+        });
+        events.addEventListener('error', function() {
+            live = false;
+        });
+        events.addEventListener('message', () => pollNewMessages());
+        events.addEventListener('resync', () => pollNewMessages());
+        events.addEventListener('message-deleted', function(event) {
+            const message = document.getElementById(`message-${JSON.parse(event.data).id}`);
+            if (message) {
+                message.remove();
+            }
+        });
+        events.addEventListener('message-like', function(event) {
+            const data = JSON.parse(event.data);
+            setLikeCount('message', data.id, data.like_count);
+        });
+        events.addEventListener('room-like', function(event) {
+            const data = JSON.parse(event.data);
+            setLikeCount('room', data.id, data.like_count);
+        });
+        events.addEventListener('room-deleted', function() {
+            window.location.href = '/';
+        });
+    }
+
+    setInterval(function() {
+        if (!document.hidden && !live) {
+            pollNewMessages();
+        }
+    }, POLL_INTERVAL);
+});
@@ -0,0 +1,90 @@
+"""
+Profile photo variants.
+
+Every uploaded photo gets square thumbnails at ``SIZES`` in WebP and JPEG,
+stored next to the original under its full name (``profile_photos/3.jpg`` ->
+``profile_photos/3.jpg.96.webp``, ``profile_photos/3.jpg.96.jpg``), so the
+variants of ``3.jpg`` and ``3.png`` never collide. Variants carry no
+EXIF, and an original with EXIF is rewritten without it, so location and
+camera data never leave the server. ``UserProfile.has_variants`` says
+whether the files exist; the ``profile_photo`` template tag falls back to
+the original until they do.
+"""
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+SIZES = (48, 96, 160)
+FORMATS = {'webp': ('WEBP', {'quality': 80, 'method': 6}), 'jpg': ('JPEG', {'quality': 85, 'optimize': True})}
+
+
+def variant_name(name, size, extension):
+    return f'{name}.{size}.{extension}'
+
+
+def variant_names(name):
+    return [variant_name(name, size, extension) for size in SIZES for extension in FORMATS]
+
+
+def pick_size(size):
+    """Smallest variant covering ``size`` CSS pixels, or the largest one."""
+    return next((candidate for candidate in SIZES if candidate >= size), SIZES[-1])
+
+
+def _encode(image, extension):
+    image_format, options = FORMATS[extension]
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, image_format, **options)
+    return ContentFile(buffer.getvalue())
+
+
+def _replace(storage, name, content):
+    # FileSystemStorage never overwrites: it would save under a new random name
+    if storage.exists(name):
+        storage.delete(name)
+    storage.save(name, content)
+
+
+def build_variants(photo):
+    """
+    Write the thumbnails of the ``photo`` FieldFile and strip EXIF from the
+    original. Returns the names written. Raises ``ValueError`` for files
+    Pillow can't read.
+    """
+    storage = photo.storage
+    try:
+        with storage.open(photo.name, 'rb') as fileobj:
+            original = Image.open(fileobj)
+            original.load()
+    except UnidentifiedImageError as error:
+        raise ValueError(f'{photo.name} is not an image') from error
+
+    # Bake the EXIF rotation into the pixels before the metadata goes
+    image = ImageOps.exif_transpose(original)
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+
+    written = []
+    if original.getexif() and original.format in ('JPEG', 'WEBP', 'PNG'):
+        buffer = BytesIO()
+        clean = image.convert('RGB') if original.format == 'JPEG' else image
+        clean.save(buffer, original.format, **({'quality': 95} if original.format != 'PNG' else {}))
+        _replace(storage, photo.name, ContentFile(buffer.getvalue()))
+        written.append(photo.name)
+
+    for size in SIZES:
+        thumbnail = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+        for extension in FORMATS:
+            name = variant_name(photo.name, size, extension)
+            _replace(storage, name, _encode(thumbnail, extension))
+            written.append(name)
+    return written
+
+
+def delete_variants(storage, name):
+    """Remove the thumbnails of the photo stored as ``name``, if any."""
+    for variant in variant_names(name):
+        storage.delete(variant)
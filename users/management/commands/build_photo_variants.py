@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from users.models import UserProfile
+
+
+class Command(BaseCommand):
+    help = "Build the WebP/JPEG thumbnails of existing profile photos (and strip their EXIF)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help="Rebuild photos that already have variants.")
+
+    def handle(self, *args, **options):
+        profiles = UserProfile.objects.exclude(photo='').exclude(photo__isnull=True)
+        if not options['force']:
+            profiles = profiles.filter(has_variants=False)
+
+        built = skipped = 0
+        for profile in profiles.iterator():
+            if not profile.photo.storage.exists(profile.photo.name):
+                self.stderr.write(f"Missing file for {profile}: {profile.photo.name}")
+                skipped += 1
+                continue
+            try:
+                profile.build_variants()
+            except (ValueError, OSError) as error:
+                self.stderr.write(f"Skipped {profile}: {error}")
+                skipped += 1
+                continue
+            built += 1
+        self.stdout.write(self.style.SUCCESS(f"Built variants for {built} photos, skipped {skipped}."))
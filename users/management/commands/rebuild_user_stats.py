@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from users.stats import recount_user_stats
+
+
+class Command(BaseCommand):
+    help = "Recompute every user's profile stats (counts, first room and first message) from scratch."
+
+    def handle(self, *args, **options):
+        count = recount_user_stats()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt stats for {count} users."))
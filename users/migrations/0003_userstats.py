@@ -0,0 +1,29 @@
+# Generated by Django 5.2.3 on 2026-10-18 05:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0010_trendingroom'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0002_userprofile_has_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('rooms_count', models.PositiveIntegerField(default=0)),
+                ('messages_count', models.PositiveIntegerField(default=0)),
+                ('likes_given', models.PositiveIntegerField(default=0)),
+                ('likes_received', models.PositiveIntegerField(default=0)),
+                ('first_message', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='activities.message')),
+                ('first_room', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='activities.room')),
+            ],
+        ),
+    ]
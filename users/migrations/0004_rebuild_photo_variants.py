@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def reset_variants(apps, schema_editor):
+    # Variants are now named after the full file name; build_photo_variants rebuilds them
+    UserProfile = apps.get_model('users', 'UserProfile')
+    UserProfile.objects.filter(has_variants=True).update(has_variants=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_userstats'),
+    ]
+
+    operations = [
+        migrations.RunPython(reset_variants, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.3 on 2026-10-18 06:28
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_changed(apps, schema_editor):
+    # What the export watermark used to compare, so existing users aren't exported again
+    User = apps.get_model('auth', 'User')
+    UserStats = apps.get_model('users', 'UserStats')
+    users = User.objects.filter(pk=OuterRef('user')).values(changed=Coalesce('last_login', 'date_joined'))
+    UserStats.objects.update(changed=Subquery(users[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('activities', '0015_export_watermark_indexes'),
+        ('users', '0004_rebuild_photo_variants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='changed',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='userstats',
+            index=models.Index(fields=['changed', 'user'], name='userstats_changed_user_idx'),
+        ),
+        migrations.RunPython(backfill_changed, migrations.RunPython.noop),
+    ]
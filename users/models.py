@@ -1,9 +1,64 @@
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth.models import User
 
+from .images import build_variants, delete_variants
+
 class UserProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='profile')
     photo = models.ImageField(upload_to='profile_photos/', null=True, blank=True)
+    # Added: set once users.images has written the thumbnails of the current photo
+    has_variants = models.BooleanField(default=False, editable=False)
 
     def __str__(self):
         return f"{self.user.username}'s profile"
+
+    def save(self, *args, **kwargs):
+        # Updated: a freshly uploaded photo isn't committed to storage until super().save()
+        uploaded = bool(self.photo) and not self.photo._committed
+        previous = None
+        if uploaded or not self.photo:
+            self.has_variants = False
+            if self.pk:
+                previous = UserProfile.objects.filter(pk=self.pk).values_list('photo', flat=True).first()
+        super().save(*args, **kwargs)
+        # Updated: the thumbnails of a replaced or removed photo would never be served again
+        if previous and previous != self.photo.name:
+            delete_variants(self.photo.storage, previous)
+        if uploaded:
+            try:
+                self.build_variants()
+            except (ValueError, OSError):
+                # The original stays usable; build_photo_variants can retry later
+                pass
+
+    def build_variants(self):
+        build_variants(self.photo)
+        self.has_variants = True
+        UserProfile.objects.filter(pk=self.pk).update(has_variants=True)
+
+
+class UserStats(models.Model):
+    """
+    Profile header numbers, kept current by users.signals so the profile
+    reads them from this one row. ``users.stats.recount_user_stats`` rebuilds
+    rows from scratch.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    first_room = models.ForeignKey('activities.Room', on_delete=models.SET_NULL, null=True, related_name='+')
+    first_message = models.ForeignKey('activities.Message', on_delete=models.SET_NULL, null=True, related_name='+')
+    rooms_count = models.PositiveIntegerField(default=0)
+    messages_count = models.PositiveIntegerField(default=0)
+    likes_given = models.PositiveIntegerField(default=0)
+    likes_received = models.PositiveIntegerField(default=0)
+    # Last change to what the dataset export holds of the user (name, photo,
+    # login), its incremental watermark; set by users.signals
+    changed = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['changed', 'user'], name='userstats_changed_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}'s stats"
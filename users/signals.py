@@ -0,0 +1,107 @@
+from django.contrib.auth.models import User
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from activities.likebuffer import likes_flushed
+from activities.likes import like_toggled
+from activities.models import Message, MessageLike, Room, RoomLike
+
+from .models import UserProfile, UserStats
+from .stats import recount_user_stats
+
+# Profile stats (see users.stats). Creations and likes adjust the counters in
+# place; deletions can cascade into likes, so they recount everyone involved.
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.bulk_create([UserStats(user=instance)], ignore_conflicts=True)
+
+
+# Export watermark: a login, a rename or a new photo re-exports the user
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=UserProfile)
+def touch_user_stats(sender, instance, created, raw=False, **kwargs):
+    # A new user gets the row with the time; a new profile only matters with a photo
+    if raw or (created and (sender is User or not instance.photo)):
+        return
+    user_id = instance.pk if sender is User else instance.user_id
+    UserStats.objects.filter(user_id=user_id).update(changed=timezone.now())
+
+
+@receiver(post_save, sender=Room)
+def count_room(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and instance.host_id:
+        UserStats.objects.filter(user_id=instance.host_id).update(
+            rooms_count=F('rooms_count') + 1, first_room=Coalesce('first_room', Value(instance.pk)),
+        )
+
+
+@receiver(post_save, sender=Message)
+def count_message(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.filter(user_id=instance.user_id).update(
+            messages_count=F('messages_count') + 1, first_message=Coalesce('first_message', Value(instance.pk)),
+        )
+
+
+@receiver(like_toggled)
+def count_like(sender, user_id, owner_id, delta, **kwargs):
+    UserStats.objects.filter(user_id__in=[user_id, owner_id]).update(
+        likes_given=F('likes_given') + Case(When(user_id=user_id, then=Value(delta)), default=Value(0)),
+        likes_received=F('likes_received') + Case(When(user_id=owner_id, then=Value(delta)), default=Value(0)),
+    )
+
+
+@receiver(likes_flushed)
+def recount_flushed_likes(sender, user_ids, target_ids, **kwargs):
+    target_model, owner = (Room, 'host') if sender is RoomLike else (Message, 'user')
+    owners = set(target_model.objects.filter(pk__in=target_ids).values_list(owner, flat=True))
+    recount_user_stats(set(user_ids) | (owners - {None}))
+
+
+def _room_likers(**lookup):
+    return set(RoomLike.objects.filter(**lookup).values_list('user_id', flat=True))
+
+
+def _message_likers(**lookup):
+    return set(MessageLike.objects.filter(**lookup).values_list('user_id', flat=True))
+
+
+@receiver(pre_delete, sender=Room)
+def collect_room_users(sender, instance, **kwargs):
+    instance._stats_users = (
+        {instance.host_id}
+        | set(instance.message_set.values_list('user_id', flat=True))
+        | _room_likers(room=instance)
+        | _message_likers(message__room=instance)
+    )
+
+
+@receiver(pre_delete, sender=Message)
+def collect_message_users(sender, instance, origin=None, **kwargs):
+    # A room or user deletion recounts for all of its messages at once
+    if not isinstance(origin, (Room, User)):
+        instance._stats_users = {instance.user_id} | _message_likers(message=instance)
+
+
+@receiver(pre_delete, sender=User)
+def collect_user_users(sender, instance, **kwargs):
+    # Owners of what they liked, and people whose likes go with their messages
+    instance._stats_users = (
+        set(Room.objects.filter(likes__user=instance).values_list('host_id', flat=True))
+        | set(Message.objects.filter(likes__user=instance).values_list('user_id', flat=True))
+        | _message_likers(message__user=instance)
+    ) - {instance.pk}
+
+
+@receiver(post_delete, sender=Room)
+@receiver(post_delete, sender=Message)
+@receiver(post_delete, sender=User)
+def recount_after_delete(sender, instance, **kwargs):
+    users = getattr(instance, '_stats_users', set()) - {None}
+    if users:
+        recount_user_stats(users)
@@ -0,0 +1,64 @@
+"""
+Per-user profile statistics.
+
+``UserStats`` rows are created with the user and kept current by
+``users.signals``: creations bump the counters with ``F()`` updates, likes
+arrive through the ``like_toggled`` and ``likes_flushed`` signals of
+``activities.likes``/``activities.likebuffer``, and deletions (rare, and
+able to cascade into likes) recount the users involved. Users created in
+bulk, without signals, get their row computed the first time it's needed.
+"""
+from django.contrib.auth.models import User
+from django.db.models import OuterRef, Subquery
+
+from activities.aggregates import count_per
+from activities.models import Message, MessageLike, Room, RoomLike
+
+from .models import UserStats
+
+FIELDS = ['first_room', 'first_message', 'rooms_count', 'messages_count', 'likes_given', 'likes_received']
+
+
+def _first(queryset, lookup):
+    return Subquery(queryset.filter(**{lookup: OuterRef('pk')}).order_by('created', 'id').values('id')[:1])
+
+
+def recount_user_stats(user_ids=None):
+    """Recompute the stats of ``user_ids`` (every user when None) in one query and upsert them."""
+    users = User.objects.all() if user_ids is None else User.objects.filter(pk__in=user_ids)
+    rows = users.annotate(
+        first_room_id=_first(Room.objects, 'host'),
+        first_message_id=_first(Message.objects, 'user'),
+        rooms_count=count_per(Room.objects, 'host'),
+        messages_count=count_per(Message.objects, 'user'),
+        room_likes_given=count_per(RoomLike.objects, 'user'),
+        message_likes_given=count_per(MessageLike.objects, 'user'),
+        room_likes_received=count_per(RoomLike.objects, 'room__host'),
+        message_likes_received=count_per(MessageLike.objects, 'message__user'),
+    ).values_list(
+        'pk', 'first_room_id', 'first_message_id', 'rooms_count', 'messages_count',
+        'room_likes_given', 'message_likes_given', 'room_likes_received', 'message_likes_received',
+    )
+    stats = [
+        UserStats(
+            user_id=pk, first_room_id=first_room, first_message_id=first_message,
+            rooms_count=rooms, messages_count=messages,
+            likes_given=room_given + message_given, likes_received=room_received + message_received,
+        )
+        for pk, first_room, first_message, rooms, messages, room_given, message_given, room_received, message_received
+        in rows.iterator()
+    ]
+    UserStats.objects.bulk_create(
+        stats, batch_size=1000, update_conflicts=True, unique_fields=['user'], update_fields=FIELDS,
+    )
+    return len(stats)
+
+
+def get_user_stats(user):
+    """``user``'s stats row with the first room and message, computing it when missing."""
+    queryset = UserStats.objects.select_related('first_room', 'first_message__room')
+    stats = queryset.filter(user=user).first()
+    if stats is None:
+        recount_user_stats([user.pk])
+        stats = queryset.get(user=user)
+    return stats
@@ -0,0 +1,41 @@
+from django import template
+from django.utils.html import format_html
+
+from users.images import SIZES, pick_size, variant_name
+
+register = template.Library()
+
+
+def variant_url(photo, size, extension):
+    return photo.storage.url(variant_name(photo.name, size, extension))
+
+
+def srcset(photo, size, extension):
+    # 1x and 2x candidates; both collapse to the largest variant on big avatars
+    one, two = pick_size(size), pick_size(size * 2)
+    candidates = [f'{variant_url(photo, one, extension)} {one}w']
+    if two != one:
+        candidates.append(f'{variant_url(photo, two, extension)} {two}w')
+    return ', '.join(candidates)
+
+
+@register.simple_tag
+def profile_photo(profile, size, alt='', css_class=''):
+    """
+    Renders ``profile.photo`` at ``size`` CSS pixels as a ``<picture>`` with
+    WebP and JPEG thumbnails, or as the original until they have been built.
+    """
+    photo = profile.photo
+    if not profile.has_variants:
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" width="{}" height="{}" style="width: {}px; height: {}px;" loading="lazy" decoding="async">',
+            photo.url, alt, css_class, size, size, size, size,
+        )
+    sizes = f'{size}px'
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" alt="{}" class="{}" width="{}" height="{}" style="width: {}px; height: {}px;" loading="lazy" decoding="async"></picture>',
+        srcset(photo, size, 'webp'), sizes,
+        variant_url(photo, pick_size(size), 'jpg'), srcset(photo, size, 'jpg'), sizes,
+        alt, css_class, size, size, size, size,
+    )
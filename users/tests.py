@@ -1,3 +1,252 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from pathlib import Path
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from activities.likebuffer import flush
+from activities.likes import toggle_message_like, toggle_room_like
+from activities.models import Message, Room, Topic
+
+from .images import SIZES, variant_name, variant_names
+from .models import UserProfile, UserStats
+from .stats import FIELDS, recount_user_stats
+from .views import PROFILE_ITEMS_PER_PAGE
+
+
+def jpeg_with_exif(size=(400, 300)):
+    image = Image.new('RGB', size, 'red')
+    exif = Image.Exif()
+    exif[0x010F] = 'Camera Maker'
+    exif[0x0112] = 6  # rotated 90 degrees
+    buffer = BytesIO()
+    image.save(buffer, 'JPEG', exif=exif)
+    return buffer.getvalue()
+
+
+class PhotoVariantTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        override = override_settings(MEDIA_ROOT=self.media)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = User.objects.create_user('alice', password='pw')
+
+    def upload(self):
+        profile = UserProfile.objects.create(user=self.user)
+        profile.photo = SimpleUploadedFile('me.jpg', jpeg_with_exif(), content_type='image/jpeg')
+        profile.save()
+        return profile
+
+    def test_upload_builds_variants_without_exif(self):
+        profile = self.upload()
+        profile.refresh_from_db()
+        self.assertTrue(profile.has_variants)
+        for size in SIZES:
+            for extension, image_format in (('webp', 'WEBP'), ('jpg', 'JPEG')):
+                with Image.open(Path(self.media) / variant_name(profile.photo.name, size, extension)) as image:
+                    self.assertEqual(image.format, image_format)
+                    self.assertEqual(image.size, (size, size))
+                    self.assertFalse(image.getexif())
+        with Image.open(profile.photo.path) as original:
+            self.assertFalse(original.getexif())
+            # The EXIF orientation was applied before it was dropped
+            self.assertEqual(original.size, (300, 400))
+
+    def test_new_photo_resets_flag_until_built(self):
+        profile = self.upload()
+        profile.photo = None
+        profile.save()
+        self.assertFalse(UserProfile.objects.get(pk=profile.pk).has_variants)
+
+    def test_new_photo_deletes_old_variants(self):
+        profile = self.upload()
+        old = [Path(self.media) / name for name in variant_names(profile.photo.name)]
+        self.assertTrue(all(path.exists() for path in old))
+        profile.photo = SimpleUploadedFile('me.png', jpeg_with_exif(), content_type='image/jpeg')
+        profile.save()
+        self.assertFalse(any(path.exists() for path in old))
+        self.assertTrue((Path(self.media) / variant_name(profile.photo.name, 48, 'webp')).exists())
+
+    def test_variants_keep_the_extension(self):
+        self.assertNotEqual(variant_name('profile_photos/3.jpg', 48, 'webp'), variant_name('profile_photos/3.png', 48, 'webp'))
+
+    def test_tag_renders_picture_with_srcset(self):
+        profile = self.upload()
+        html = Template('{% load photo_tags %}{% profile_photo profile 45 alt="Alice" %}').render(Context({'profile': profile}))
+        self.assertIn('<picture>', html)
+        self.assertIn('type="image/webp"', html)
+        self.assertIn(f"{variant_name(profile.photo.url, 48, 'webp')} 48w", html)
+        self.assertIn(f"{variant_name(profile.photo.url, 96, 'jpg')} 96w", html)
+        self.assertIn('width="45"', html)
+
+    def test_tag_falls_back_to_original(self):
+        profile = self.upload()
+        UserProfile.objects.filter(pk=profile.pk).update(has_variants=False)
+        profile.refresh_from_db()
+        html = Template('{% load photo_tags %}{% profile_photo profile 80 %}').render(Context({'profile': profile}))
+        self.assertNotIn('<picture>', html)
+        self.assertIn(f'src="{profile.photo.url}"', html)
+
+    def test_backfill_command(self):
+        directory = Path(self.media) / 'profile_photos'
+        directory.mkdir()
+        (directory / 'old.jpg').write_bytes(jpeg_with_exif())
+        UserProfile.objects.create(user=self.user, photo='profile_photos/old.jpg')
+        missing = User.objects.create_user('bob', password='pw')
+        UserProfile.objects.create(user=missing, photo='profile_photos/gone.jpg')
+
+        out, err = StringIO(), StringIO()
+        call_command('build_photo_variants', stdout=out, stderr=err)
+        self.assertIn('Built variants for 1 photos, skipped 1', out.getvalue())
+        self.assertIn('gone.jpg', err.getvalue())
+        self.assertTrue((directory / 'old.jpg.160.webp').exists())
+        self.assertTrue(UserProfile.objects.get(user=self.user).has_variants)
+
+
+class UserStatsTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', password='pw')
+        self.bob = User.objects.create_user('bob', password='pw')
+        self.topic = Topic.objects.create(name='Python')
+
+    def stats(self, user):
+        return UserStats.objects.filter(user=user).values(*FIELDS).get()
+
+    def assertConsistent(self):
+        maintained = {stats.pop('user'): stats for stats in UserStats.objects.values('user', *FIELDS)}
+        recount_user_stats()
+        recounted = {stats.pop('user'): stats for stats in UserStats.objects.values('user', *FIELDS)}
+        self.assertEqual(maintained, recounted)
+
+    def test_counters_follow_creates_likes_and_deletes(self):
+        room = Room.objects.create(host=self.alice, topic=self.topic, name='Django')
+        later = Room.objects.create(host=self.alice, topic=self.topic, name='Later')
+        first = Message.objects.create(user=self.bob, room=room, body='First')
+        second = Message.objects.create(user=self.bob, room=room, body='Second')
+        toggle_room_like(self.bob, room.id)
+        toggle_message_like(self.alice, first.id)
+        toggle_message_like(self.bob, second.id)
+        self.assertEqual(self.stats(self.alice), {
+            'first_room': room.id, 'first_message': None, 'rooms_count': 2, 'messages_count': 0,
+            'likes_given': 1, 'likes_received': 1,
+        })
+        self.assertEqual(self.stats(self.bob), {
+            'first_room': None, 'first_message': first.id, 'rooms_count': 0, 'messages_count': 2,
+            'likes_given': 2, 'likes_received': 2,
+        })
+        self.assertConsistent()
+
+        toggle_message_like(self.bob, second.id)
+        first.delete()
+        self.assertEqual(self.stats(self.bob)['first_message'], second.id)
+        self.assertEqual(self.stats(self.alice)['likes_given'], 0)
+        self.assertConsistent()
+
+        room.delete()
+        self.assertEqual(self.stats(self.alice)['first_room'], later.id)
+        self.assertEqual(self.stats(self.bob), {
+            'first_room': None, 'first_message': None, 'rooms_count': 0, 'messages_count': 0,
+            'likes_given': 0, 'likes_received': 0,
+        })
+        self.assertConsistent()
+
+    def test_deleting_a_user_recounts_the_people_they_liked(self):
+        room = Room.objects.create(host=self.alice, topic=self.topic, name='Django')
+        toggle_room_like(self.bob, room.id)
+        self.bob.delete()
+        self.assertEqual(self.stats(self.alice)['likes_received'], 0)
+
+    @override_settings(ACTIVITIES_LIKE_WRITE_BEHIND=True, ACTIVITIES_LIKE_FLUSH_INTERVAL=None)
+    def test_write_behind_flush_recounts(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        room = Room.objects.create(host=self.alice, topic=self.topic, name='Django')
+        toggle_room_like(self.bob, room.id)
+        self.assertEqual(self.stats(self.bob)['likes_given'], 0)
+        flush()
+        self.assertEqual(self.stats(self.bob)['likes_given'], 1)
+        self.assertEqual(self.stats(self.alice)['likes_received'], 1)
+
+    def test_missing_row_is_computed_for_the_profile(self):
+        Room.objects.create(host=self.alice, topic=self.topic, name='Django')
+        UserStats.objects.all().delete()
+        self.client.force_login(self.bob)
+        response = self.client.get(reverse('users:user-profile', args=['alice']))
+        self.assertEqual(response.context['stats'].rooms_count, 1)
+        self.assertContains(response, '1 room,')
+
+    def test_profile_header_comes_with_the_user_row(self):
+        Room.objects.create(host=self.alice, topic=self.topic, name='Django')
+        self.client.force_login(self.bob)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('users:user-profile', args=['alice']))
+        self.assertEqual(response.context['first_room'].name, 'Django')
+        self.assertFalse([q for q in queries if 'users_userstats' in q['sql'] and 'auth_user' not in q['sql']])
+        self.assertFalse([q for q in queries if 'DISTINCT' in q['sql']])
+
+
+class ProfileTabsTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice', password='pw')
+        self.bob = User.objects.create_user('bob', password='pw')
+        topic = Topic.objects.create(name='Python')
+        self.room = Room.objects.create(host=self.alice, topic=topic, name='Django')
+        self.messages = [
+            Message.objects.create(user=self.alice, room=self.room, body=f'Message {i}')
+            for i in range(PROFILE_ITEMS_PER_PAGE + 2)
+        ]
+        toggle_room_like(self.alice, self.room.id)
+        toggle_message_like(self.alice, self.messages[0].id)
+        self.client.force_login(self.bob)
+
+    def fragment(self, name, cursor=None):
+        url = reverse('users:profile-list', args=['alice', name])
+        return self.client.get(url, {'cursor': cursor} if cursor else {})
+
+    def test_only_the_active_tab_is_rendered(self):
+        response = self.client.get(reverse('users:user-profile', args=['alice']))
+        pages = response.context['pages']
+        self.assertEqual([room.name for room in pages['rooms']], ['Django'])
+        self.assertIsNone(pages['liked_rooms'])
+        self.assertIsNone(pages['activity'])
+        self.assertNotContains(response, 'Message 1')
+
+        response = self.client.get(reverse('users:user-profile', args=['alice']), {'tab': 'activity'})
+        self.assertIsNone(response.context['pages']['rooms'])
+        self.assertEqual(len(response.context['pages']['activity']), PROFILE_ITEMS_PER_PAGE)
+        self.assertContains(response, f'Message {PROFILE_ITEMS_PER_PAGE + 1}')
+
+    def test_fragments_page_by_cursor(self):
+        first = self.fragment('activity').json()
+        self.assertIsNotNone(first['next_cursor'])
+        second = self.fragment('activity', first['next_cursor']).json()
+        self.assertIsNone(second['next_cursor'])
+        bodies = [f'Message {i}' for i in range(len(self.messages))]
+        self.assertEqual(sum(f'>{body}<' in first['html'] + second['html'] for body in bodies), len(bodies))
+        self.assertNotIn('>Message 0<', first['html'])
+
+    def test_liked_fragments(self):
+        self.assertIn('Django</a> (Room, liked on', self.fragment('liked_rooms').json()['html'])
+        self.assertIn('Message 0</a> (Message in Django', self.fragment('liked_messages').json()['html'])
+
+    def test_fragment_queries_do_not_grow_with_the_page(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.fragment('activity')
+        self.assertLessEqual(len([q for q in queries if 'activities_' in q['sql']]), 1)
+
+    def test_unknown_list_and_anonymous_requests(self):
+        self.assertEqual(self.fragment('password').status_code, 404)
+        self.client.logout()
+        self.assertEqual(self.fragment('rooms').status_code, 302)
@@ -8,4 +8,5 @@ urlpatterns = [
     path('logout/', views.logoutUser, name='logout'),
     path('register/', views.registerPage, name='register'),
     path('profile/<str:username>', views.userProfile, name='user-profile'),
+    path('profile/<str:username>/<slug:name>', views.profile_list, name='profile-list'),
 ]
\ No newline at end of file
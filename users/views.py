@@ -1,13 +1,25 @@
-from django.shortcuts import redirect, render
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
 from django.contrib import messages
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
-from activities.models import Room, Topic
 from users.forms import CustomPasswordChangeForm, UserProfileForm, UsernameChangeForm
 from users.models import UserProfile
+from users.stats import get_user_stats
 from django.contrib.auth.hashers import check_password
+from activities.pagination import paginate_by_cursor
+
+PROFILE_ITEMS_PER_PAGE = 10
+# Lists shown in each profile tab; only the active tab is rendered with the page
+PROFILE_TABS = {
+    'rooms': ('rooms',),
+    'likes': ('liked_rooms', 'liked_messages'),
+    'activity': ('activity',),
+}
+PROFILE_LISTS = {name for names in PROFILE_TABS.values() for name in names}
 
 # Create your views here.
 
@@ -63,18 +75,21 @@ def registerPage(request):
 @login_required(login_url='users:login')
 def userProfile(request, username):
     try:
-        user = User.objects.get(username=username)
+        # Updated: the header (profile, stats, first room and message) comes with the user row
+        user = User.objects.select_related(
+            'profile', 'stats__first_room', 'stats__first_message__room',
+        ).get(username=username)
     except User.DoesNotExist:
         messages.error(request, 'User not found')
         return redirect('home')
 
-    # Ensure UserProfile exists
-    user_profile, created = UserProfile.objects.get_or_create(user=user)
-    rooms = user.room_set.all()
-    user_messages  = user.message_set.order_by('-created')
-    topics = Room.objects.values('topic__name').distinct()
-    first_room = user.room_set.order_by('created').first()
-    first_message = user.message_set.order_by('created').first()
+    # Ensure UserProfile and UserStats exist
+    user_profile = getattr(user, 'profile', None) or UserProfile.objects.create(user=user)
+    stats = getattr(user, 'stats', None) or get_user_stats(user)
+    # Updated: first page of the active tab only, profile.js fetches the others when opened
+    tab = request.GET.get('tab') if request.GET.get('tab') in PROFILE_TABS else 'rooms'
+    pages = dict.fromkeys(PROFILE_LISTS)
+    pages.update((name, _profile_page(request, user, name)) for name in PROFILE_TABS[tab])
 
     profile_form = UserProfileForm(instance=user_profile)
     username_form = UsernameChangeForm(instance=user)
@@ -120,15 +135,42 @@ def userProfile(request, username):
 
     context = {
         'user': user,
-        'rooms': rooms,
-        'user_messages': user_messages,
-        'topics': topics,
+        'tab': tab,
+        'pages': pages,
         'user_profile': user_profile,
         'profile_form': profile_form,
         'username_form': username_form,
         'password_form': password_form,
         'join_date': user.date_joined,
-        'first_room': first_room,
-        'first_message': first_message,
+        'stats': stats,
+        'first_room': stats.first_room,
+        'first_message': stats.first_message,
     }
-    return render(request, 'users/profile.html', context)
\ No newline at end of file
+    return render(request, 'users/profile.html', context)
+
+
+def _profile_page(request, user, name, cursor=None):
+    """One cursor page of a profile list, with everything its items touch."""
+    if name == 'rooms':
+        queryset, field = user.room_set.for_feed().with_like_state(request.user), 'created'
+    elif name == 'liked_rooms':
+        queryset, field = user.roomlike_set.select_related('room'), 'created_at'
+    elif name == 'liked_messages':
+        queryset, field = user.messagelike_set.select_related('message__room'), 'created_at'
+    else:
+        queryset, field = user.message_set.for_activity(), 'created'
+    return paginate_by_cursor(queryset, cursor, PROFILE_ITEMS_PER_PAGE, field)
+
+
+@login_required(login_url='users:login')
+def profile_list(request, username, name):
+    """A page of one profile list as an HTML fragment, for profile.js."""
+    if name not in PROFILE_LISTS:
+        raise Http404('Unknown list')
+    user = get_object_or_404(User, username=username)
+    page = _profile_page(request, user, name, request.GET.get('cursor'))
+
+    return JsonResponse({
+        'html': render_to_string('users/profile_list_items.html', {'name': name, 'page': page}, request=request),
+        'next_cursor': page.next_cursor,
+    })